@@ -0,0 +1,85 @@
+# Function: Synthetic data for the benchmarks, always the same for a given seed so runs can be compared with each other.
+# Key Responsibilities:
+    # make_records(count, shape, seed): a list of record dicts shaped like a users table ("narrow") or a table with a
+    # few bigger text/blob columns ("wide").
+    # make_varints(count, seed): ints spread over every varint length (1 to 9 bytes).
+    # make_pages(count, seed): full LEAF pages of serialized records, make_internal_pages(count, seed): full INTERNAL
+    # pages of (key, child page id) entries.
+
+# Interaction: Used by run_benchmarks.py, builds its pages with page.Page and its records with RecordSerializer.
+
+import random
+from page import Page, PageType
+from record_serializer import RecordSerializer
+
+SHAPES = {
+    "narrow": ["id", "name", "email", "age", "score", "active"],
+    "wide": ["id", "name", "email", "age", "score", "active", "bio", "avatar", "tags"],
+}
+
+FIRST_NAMES = ["ada", "alan", "grace", "linus", "barbara", "ken", "dennis", "margaret", "edsger", "donald"]
+DOMAINS = ["example.com", "mail.org", "db.dev"]
+
+
+def columns_of(shape: str) -> list[str]:
+    return SHAPES[shape]
+
+
+def make_records(count: int, shape: str = "narrow", seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        name = rng.choice(FIRST_NAMES)
+        record = {
+            "id": i,
+            "name": f"{name}-{rng.randrange(100000)}",
+            "email": f"{name}{i}@{rng.choice(DOMAINS)}",
+            # small ints, the common case for flags/ages/counters
+            "age": rng.randrange(18, 90),
+            "score": round(rng.uniform(0, 1000), 3),
+            "active": rng.random() < 0.8,
+        }
+        if shape == "wide":
+            record["bio"] = " ".join(rng.choice(FIRST_NAMES) for _ in range(rng.randrange(10, 60)))
+            record["avatar"] = rng.randbytes(rng.randrange(64, 512))
+            # some NULLs too
+            record["tags"] = None if rng.random() < 0.3 else ",".join(rng.sample(FIRST_NAMES, 3))
+        records.append(record)
+    return records
+
+
+def make_varints(count: int, seed: int = 0) -> list[int]:
+    rng = random.Random(seed)
+    # pick a bit length first, otherwise nearly every value would be a 9 byte one
+    return [rng.getrandbits(rng.randrange(1, 64)) for _ in range(count)]
+
+
+def make_pages(count: int, seed: int = 0) -> list[Page]:
+    serializer = RecordSerializer()
+    records = iter(make_records(count * 200, "narrow", seed))
+    pages = []
+    for page_id in range(count):
+        page = Page(page_id=page_id, page_type=PageType.LEAF)
+        for record in records:
+            data = serializer.serialize(record)
+            if not page.has_space(data):
+                break
+            page.add_value(data)
+        pages.append(page)
+    return pages
+
+
+def make_internal_pages(count: int, seed: int = 0) -> list[Page]:
+    rng = random.Random(seed)
+    pages = []
+    for page_id in range(count):
+        page = Page(page_id=page_id, page_type=PageType.INTERNAL)
+        key = rng.randrange(1 << 32)
+        while True:
+            entry = (b"key-%012d" % key, rng.randrange(1 << 20))
+            if not page.has_space(entry):
+                break
+            page.add_value(entry)
+            key += rng.randrange(1, 1000)
+        pages.append(page)
+    return pages
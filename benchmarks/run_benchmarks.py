@@ -0,0 +1,375 @@
+# Function: Throughput benchmarks for simpledb, with a stored baseline so a slowdown fails the run.
+# Key Responsibilities:
+    # micro benchmarks: RecordSerializer.serialize/deserialize, encode_varint/decode_varint, Page.to_bytes/from_bytes,
+    # Pager.get_page on cached pages (hit path) and on pages it has to read (miss path)
+    # end to end: RecordStore insert, point lookups and full scans at several data sizes
+    # every result goes to a JSON file (ops/sec per benchmark), compare() checks it against the baseline
+
+# Usage (from the repo root):
+    # python benchmarks/run_benchmarks.py                      run everything, compare with benchmarks/baseline.json
+    # python benchmarks/run_benchmarks.py --quick              smaller sizes, shorter runs (CI)
+    # python benchmarks/run_benchmarks.py --only serializer    benchmarks whose name contains "serializer"
+    # python benchmarks/run_benchmarks.py --save-baseline      make this run the new baseline
+# Exit code 1 when a benchmark got slower than the baseline by more than --tolerance (default 30%).
+# Timings are machine dependent: refresh the baseline (--save-baseline) on the machine that runs the comparison.
+
+# Interaction: Synthetic data from datagen.py, the code under test from src/.
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from constants import PAGE_SIZE
+from page import Page, PageType
+from pager import Pager
+from record_serializer import RecordSerializer
+from record_store import RecordStore
+from datagen import columns_of, make_records, make_varints, make_pages, make_internal_pages
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "results.json")
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+QUICK_SIZES = [1_000, 10_000]
+# allowed slowdown before a benchmark counts as a regression (0.3 = 30% fewer ops/sec than the baseline)
+DEFAULT_TOLERANCE = 0.3
+RESULTS_VERSION = 1
+# every benchmark is run until this many seconds were timed (short ones are too noisy otherwise), within MAX_RUNS runs
+DEFAULT_MIN_TIME = 1.0
+QUICK_MIN_TIME = 0.3
+MAX_RUNS = 50
+
+# name -> factory(size, workdir) -> (ops, run, teardown): run() is the timed part, ops how many operations one run does,
+# teardown (or None) closes what the setup opened. The factory does the setup (data, files) outside the clock and is
+# called again for every repeat.
+BENCHMARKS = {}
+# names of the benchmarks that are run once per data size (the others run at a fixed size)
+SIZED = set()
+
+
+def benchmark(name, sized=False):
+    def register(factory):
+        BENCHMARKS[name] = factory
+        if sized:
+            SIZED.add(name)
+        return factory
+    return register
+
+
+# ---------------------------------------------------------------- micro benchmarks
+
+MICRO_SIZE = 5_000
+
+
+@benchmark("serializer.serialize")
+def bench_serialize(size, workdir):
+    serializer = RecordSerializer()
+    records = make_records(size, "narrow")
+
+    def run():
+        for record in records:
+            serializer.serialize(record)
+    return size, run, None
+
+
+@benchmark("serializer.deserialize")
+def bench_deserialize(size, workdir):
+    serializer = RecordSerializer()
+    columns = columns_of("narrow")
+    data = [serializer.serialize(record) for record in make_records(size, "narrow")]
+
+    def run():
+        for value in data:
+            serializer.deserialize(value, columns)
+    return size, run, None
+
+
+@benchmark("serializer.serialize_wide")
+def bench_serialize_wide(size, workdir):
+    serializer = RecordSerializer()
+    records = make_records(size, "wide")
+
+    def run():
+        for record in records:
+            serializer.serialize(record)
+    return size, run, None
+
+
+@benchmark("codec.deserialize_many")
+def bench_codec_deserialize_many(size, workdir):
+    codec = RecordSerializer().codec(columns_of("narrow"))
+    data = codec.serialize_many(make_records(size, "narrow"))
+
+    def run():
+        codec.deserialize_many(data)
+    return size, run, None
+
+
+@benchmark("varint.encode")
+def bench_varint_encode(size, workdir):
+    values = make_varints(size)
+    encode = RecordSerializer.encode_varint
+
+    def run():
+        for value in values:
+            encode(value)
+    return size, run, None
+
+
+@benchmark("varint.decode")
+def bench_varint_decode(size, workdir):
+    encoded = [RecordSerializer.encode_varint(value) for value in make_varints(size)]
+    decode = RecordSerializer.decode_varint
+
+    def run():
+        for data in encoded:
+            decode(data)
+    return size, run, None
+
+
+# leaf pages are their own image (to_bytes is a view), internal pages get encoded on the first call and keep that
+# image until they change, the pages are new for every repeat so every run times the first (full) encode
+@benchmark("page.to_bytes")
+def bench_page_to_bytes(size, workdir):
+    pages = make_pages(size // 100) + make_internal_pages(size // 100)
+
+    def run():
+        for page in pages:
+            page.to_bytes()
+    return len(pages), run, None
+
+
+@benchmark("page.from_bytes")
+def bench_page_from_bytes(size, workdir):
+    pages = make_pages(size // 100) + make_internal_pages(size // 100)
+    images = [bytes(page.to_bytes()) for page in pages]
+
+    def run():
+        for page_id, image in enumerate(images):
+            # .values decodes every record slot of a leaf, .entries every (prefix-compressed) key of an internal page:
+            # internal pages load lazily, without it the run would only time the header parse
+            page = Page.from_bytes(page_id, image)
+            if page.page_type != PageType.INTERNAL:
+                page.values
+            else:
+                page.entries
+    return len(images), run, None
+
+
+@benchmark("pager.get_page_hit")
+def bench_pager_hit(size, workdir):
+    num_pages = 64
+    pager = _filled_pager(workdir, num_pages, cache_pages=num_pages + 1)
+    for page_id in range(num_pages):
+        pager.get_page(page_id)
+    rng = random.Random(1)
+    page_ids = [rng.randrange(num_pages) for _ in range(size)]
+
+    def run():
+        for page_id in page_ids:
+            pager.get_page(page_id)
+    return size, run, pager.close
+
+
+@benchmark("pager.get_page_miss")
+def bench_pager_miss(size, workdir):
+    num_pages = 512
+    # a 1 page pool: every lookup of another page evicts the last one and reads from the file
+    pager = _filled_pager(workdir, num_pages, cache_pages=1)
+    rng = random.Random(2)
+    page_ids = [rng.randrange(num_pages) for _ in range(size // 5)]
+
+    def run():
+        for page_id in page_ids:
+            pager.get_page(page_id)
+    return len(page_ids), run, pager.close
+
+
+def _filled_pager(workdir, num_pages, cache_pages):
+    path = os.path.join(workdir, "pager.db")
+    pager = Pager(path, max_cache_size=64 * PAGE_SIZE)
+    for page in make_pages(num_pages):
+        page = Page.from_bytes(pager.allocate_new_page(PageType.LEAF).page_id, page.to_bytes())
+        pager.install_page(page)
+    pager.close()
+    return Pager(path, max_cache_size=cache_pages * PAGE_SIZE)
+
+
+# ---------------------------------------------------------------- end to end
+
+@benchmark("store.insert", sized=True)
+def bench_store_insert(size, workdir):
+    pager = Pager(os.path.join(workdir, "insert.db"))
+    store = RecordStore.create(pager, columns_of("narrow"))
+    records = make_records(size, "narrow")
+
+    def run():
+        for record in records:
+            store.insert(record)
+        # the inserts aren't done until they're on disk
+        pager.close()
+    return size, run, None
+
+
+@benchmark("store.point_lookup", sized=True)
+def bench_store_lookup(size, workdir):
+    store, rids = _filled_store(workdir, size)
+    rng = random.Random(3)
+    lookups = [rids[rng.randrange(size)] for _ in range(min(size, 20_000))]
+
+    def run():
+        for rid in lookups:
+            store.fetch(rid)
+    return len(lookups), run, store.pager.close
+
+
+@benchmark("store.scan", sized=True)
+def bench_store_scan(size, workdir):
+    store, _ = _filled_store(workdir, size)
+
+    def run():
+        for _ in store.scan():
+            pass
+    return size, run, store.pager.close
+
+
+# same scan, but only two columns of ~1% of the rows are wanted (filter and projection run on the serialized rows)
+@benchmark("store.scan_filtered", sized=True)
+def bench_store_scan_filtered(size, workdir):
+    store, _ = _filled_store(workdir, size)
+
+    def run():
+        for _ in store.scan(columns=["id", "score"], where=("age", "==", 42)):
+            pass
+    return size, run, store.pager.close
+
+
+# a store of size records on disk, reopened with a cache of a quarter of its pages (so lookups hit and miss)
+def _filled_store(workdir, size):
+    path = os.path.join(workdir, "store.db")
+    pager = Pager(path)
+    store = RecordStore.create(pager, columns_of("narrow"))
+    rids = [store.insert(record) for record in make_records(size, "narrow")]
+    meta_page_id = store.meta_page_id
+    num_pages = pager.num_pages
+    pager.close()
+    pager = Pager(path, max_cache_size=max(8, num_pages // 4) * PAGE_SIZE)
+    return RecordStore(pager, meta_page_id, columns_of("narrow")), rids
+
+
+# ---------------------------------------------------------------- running
+
+# best of at least repeat runs (more until min_time seconds were timed): the fastest run is the one with the least
+# noise from the rest of the machine
+def measure(factory, size, repeat, min_time=0.0):
+    best = None
+    runs = 0
+    timed = 0.0
+    while runs < repeat or (timed < min_time and runs < MAX_RUNS):
+        with tempfile.TemporaryDirectory() as workdir:
+            ops, run, teardown = factory(size, workdir)
+            try:
+                start = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - start
+            finally:
+                if teardown is not None:
+                    teardown()
+        runs += 1
+        timed += elapsed
+        if best is None or elapsed < best[1]:
+            best = (ops, elapsed)
+    ops, elapsed = best
+    return {"ops": ops, "seconds": elapsed, "ops_per_sec": ops / elapsed if elapsed > 0 else float("inf")}
+
+
+def run_all(sizes, repeat, only=None, log=print, min_time=0.0):
+    results = {}
+    for name, factory in BENCHMARKS.items():
+        for size in (sizes if name in SIZED else [MICRO_SIZE]):
+            key = f"{name}[{size}]" if name in SIZED else name
+            if only and not any(part in key for part in only):
+                continue
+            results[key] = measure(factory, size, repeat, min_time)
+            log(f"{key:<32} {results[key]['ops_per_sec']:>14,.0f} ops/s")
+    return {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+# (regressions, lines of the report): a regression is a benchmark running at less than (1 - tolerance) of its baseline
+# speed. Benchmarks only one of the two files has are reported but never fail the run.
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE):
+    regressions = []
+    lines = []
+    current = results["results"]
+    previous = baseline["results"]
+    for key in sorted(set(current) | set(previous)):
+        if key not in previous:
+            lines.append(f"{key:<32} new (no baseline)")
+            continue
+        if key not in current:
+            lines.append(f"{key:<32} not run")
+            continue
+        ratio = current[key]["ops_per_sec"] / previous[key]["ops_per_sec"]
+        status = "ok"
+        if ratio < 1 - tolerance:
+            status = "REGRESSION"
+            regressions.append(key)
+        lines.append(f"{key:<32} {ratio:>7.2f}x baseline  {status}")
+    return regressions, lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="simpledb throughput benchmarks")
+    parser.add_argument("--quick", action="store_true", help="smaller data sizes and shorter runs")
+    parser.add_argument("--sizes", type=int, nargs="+", help="data sizes of the end to end benchmarks")
+    parser.add_argument("--repeat", type=int, help="runs per benchmark at least, the fastest one counts")
+    parser.add_argument("--min-time", type=float, help="seconds of timed runs per benchmark at least")
+    parser.add_argument("--only", nargs="+", help="only benchmarks whose name contains one of these")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where the results JSON goes")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown, 0.3 = 30%%")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    repeat = args.repeat or 3
+    min_time = args.min_time if args.min_time is not None else (QUICK_MIN_TIME if args.quick else DEFAULT_MIN_TIME)
+    results = run_all(sizes, repeat, args.only, min_time=min_time)
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}, run with --save-baseline to make one")
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    regressions, lines = compare(results, baseline, args.tolerance)
+    print()
+    print("\n".join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,472 @@
+# Function: B+tree index on top of the Pager, maps bytes keys to bytes values with O(log n) page reads per lookup.
+# Key Responsibilities:
+    # search(key) -> value | None: walk from the root to the one leaf that can hold key.
+    # insert(key, value): add (or overwrite) a key, splitting full nodes on the way back up.
+    # delete(key): remove a key, merging or redistributing nodes that fall under the fill threshold.
+    # range_scan(start, end): yield (key, value) pairs in key order by following the leaf sibling links.
+    # bulk_load(pager, items): build a whole tree bottom-up from sorted input, streaming the pages straight to the file.
+
+# Layout:
+    # leaf nodes are LEAF pages: one slot per entry (2-byte key length | key | value), slots kept sorted by key,
+    # next_page_id links every leaf to its right sibling.
+    # internal nodes are INTERNAL pages: (key, child_page_id) entries sorted by key. The first entry's key is always b""
+    # (minus infinity), so child i holds every key in [entries[i].key, entries[i + 1].key).
+    # separators pushed up from the leaves are the shortest keys that still tell the two halves apart, and internal
+    # pages store the prefix their keys share once (page.py), so long similar keys still give a high fanout.
+    # the root page id lives in a META page (slot 0) so it survives splits and reopening: BTree(pager, meta_page_id).
+
+# Interaction: Every page held across another Pager call is pinned, otherwise the buffer pool could evict it mid-split.
+
+import struct
+from constants import PAGE_SIZE
+from page import Page, PageType, LEAF_HEADER, INTERNAL_HEADER, SLOT, NO_PAGE
+from page import CHILD_POINTER, SUFFIX_END, internal_size, internal_page_size, common_prefix, common_prefix_length
+from pager import SyncPolicy
+
+ENTRY_KEY_LENGTH = struct.Struct(">H")
+ROOT_POINTER = struct.Struct(">I")
+
+# entries are capped so every node holds several of them (and a single entry always counts as an underfull node)
+MAX_ENTRY_SIZE = PAGE_SIZE // 8
+# nodes (other than the root) using fewer bytes than this get merged with or refilled from a sibling
+MIN_FILL = PAGE_SIZE // 4
+
+
+# leaf entry helpers: 2-byte key length | key | value
+def encode_entry(key: bytes, value: bytes) -> bytes:
+    return ENTRY_KEY_LENGTH.pack(len(key)) + key + value
+
+def entry_key(entry) -> bytes:
+    (key_length,) = ENTRY_KEY_LENGTH.unpack_from(entry, 0)
+    return bytes(entry[2:2 + key_length])
+
+def entry_value(entry) -> bytes:
+    (key_length,) = ENTRY_KEY_LENGTH.unpack_from(entry, 0)
+    return bytes(entry[2 + key_length:])
+
+
+# where to cut a list of items so both halves carry about the same number of bytes (each half gets at least one item)
+def split_point(sizes: list) -> int:
+    half = sum(sizes) / 2
+    running = 0
+    for index, size in enumerate(sizes):
+        running += size
+        if running >= half:
+            return min(max(index + 1, 1), len(sizes) - 1)
+    return len(sizes) - 1
+
+
+# shortest key s with left < s <= right, enough to separate two neighbouring leaves (left < right)
+def shortest_separator(left: bytes, right: bytes) -> bytes:
+    return right[:common_prefix_length(left, right) + 1]
+
+
+# where to split the entries of an internal node (entries[cut] moves up): close to the middle by bytes, but both
+# halves have to fit on a page after compression, and which keys end up together changes what they share
+def internal_split_point(entries: list) -> int:
+    shared = len(common_prefix([key for key, _ in entries[1:]]))
+    balanced = split_point([CHILD_POINTER.size + SUFFIX_END.size + max(len(key) - shared, 0) for key, _ in entries])
+    for cut in sorted(range(1, len(entries)), key=lambda cut: abs(cut - balanced)):
+        if internal_page_size(entries[:cut]) <= PAGE_SIZE and internal_page_size([(b"", entries[cut][1])] + entries[cut + 1:]) <= PAGE_SIZE:
+            return cut
+    raise ValueError("Internal node entries don't fit on two pages")
+
+
+class BTree:
+
+    def __init__(self, pager, meta_page_id: int):
+        self.pager = pager
+        self.meta_page_id = meta_page_id
+        meta = pager.get_page(meta_page_id)
+        if meta.page_type != PageType.META or meta.slot_count == 0:
+            raise ValueError(f"Page {meta_page_id} is not a B+tree meta page")
+        (self.root_page_id,) = ROOT_POINTER.unpack(meta.get_value(0))
+
+    # make a new empty tree (a meta page + an empty root leaf) and return it
+    @classmethod
+    def create(cls, pager) -> "BTree":
+        root = pager.allocate_new_page(PageType.LEAF)
+        meta = pager.allocate_new_page(PageType.META)
+        meta.add_value(ROOT_POINTER.pack(root.page_id))
+        return cls(pager, meta.page_id)
+
+    # Build a tree from (key, value) pairs sorted by strictly increasing key, without going through the buffer pool:
+    # leaves are filled to fill_factor and written as they fill up, then every internal level is built from the
+    # level below, and all of it is streamed to the end of the file batch_pages at a time with append_bytes.
+    # Nothing else may allocate pages on this pager while the load runs. The pager has to be clean (commit and checkpoint
+    # first, the load doesn't do it for you), and a load that fails (e.g. keys out of order) gives its pages back.
+    @classmethod
+    def bulk_load(cls, pager, items, fill_factor: float = 0.9, batch_pages: int = 256) -> "BTree":
+        if not 0 < fill_factor <= 1:
+            raise ValueError("fill_factor must be in (0, 1]")
+        writer = PageStreamWriter(pager, batch_pages)
+        try:
+            return cls._bulk_load(pager, items, fill_factor, writer)
+        except BaseException:
+            # bad input (or anything else) halfway through: the pages reserved so far go back
+            writer.abort()
+            raise
+
+    @classmethod
+    def _bulk_load(cls, pager, items, fill_factor, writer) -> "BTree":
+        leaf_target = LEAF_HEADER.size + int(fill_factor * (PAGE_SIZE - LEAF_HEADER.size))
+
+        # (separator, page id) of every node on the level being built (separator: a key that splits it from the node before)
+        level = []
+        # the leaf being filled and the finished one before it (held back so the last two can be evened out)
+        leaf = None
+        previous_leaf = None
+        previous_key = None
+        for key, value in items:
+            key, value = bytes(key), bytes(value)
+            if previous_key is not None and key <= previous_key:
+                raise ValueError("bulk_load needs keys in strictly increasing order")
+            entry = encode_entry(key, value)
+            if len(entry) > MAX_ENTRY_SIZE:
+                raise ValueError(f"Entry too big for simpledb B+tree ({len(entry)} > {MAX_ENTRY_SIZE} bytes)")
+
+            if leaf is None or (leaf.slot_count and leaf.current_size + len(entry) + SLOT.size > leaf_target):
+                new_leaf = Page(page_id=writer.reserve(), page_type=PageType.LEAF)
+                if leaf is not None:
+                    leaf.next_page_id = new_leaf.page_id
+                    if previous_leaf is not None:
+                        writer.write(previous_leaf)
+                    previous_leaf = leaf
+                leaf = new_leaf
+                level.append((key if previous_key is None else shortest_separator(previous_key, key), leaf.page_id))
+            leaf.add_value(entry)
+            previous_key = key
+
+        if leaf is None:
+            # no input: the tree is a single empty leaf
+            leaf = Page(page_id=writer.reserve(), page_type=PageType.LEAF)
+            level.append((b"", leaf.page_id))
+        elif previous_leaf is not None and leaf.current_size < MIN_FILL:
+            # don't leave a nearly empty last leaf, share the last two leaves' entries out evenly
+            entries = [bytes(previous_leaf.get_value(i)) for i in range(previous_leaf.slot_count)]
+            entries += [bytes(leaf.get_value(i)) for i in range(leaf.slot_count)]
+            cut = split_point([len(e) + SLOT.size for e in entries])
+            cls._refill(previous_leaf, entries[:cut])
+            cls._refill(leaf, entries[cut:])
+            level[-1] = (shortest_separator(entry_key(entries[cut - 1]), entry_key(entries[cut])), leaf.page_id)
+        if previous_leaf is not None:
+            writer.write(previous_leaf)
+        writer.write(leaf)
+
+        # internal levels, bottom-up until a single node (the root) is left
+        internal_target = INTERNAL_HEADER.size + int(fill_factor * (PAGE_SIZE - INTERNAL_HEADER.size))
+        while len(level) > 1:
+            groups = [[]]
+            # what the current group's node stores: every key but its first one (that one moves up)
+            key_bytes, prefix = 0, b""
+            for key, child in level:
+                group = groups[-1]
+                if group:
+                    new_prefix = key if len(group) == 1 else prefix[:common_prefix_length(prefix, key)]
+                    if len(group) >= 2 and internal_size(0, len(group) + 1, key_bytes + len(key), len(new_prefix)) > internal_target:
+                        groups.append([])
+                        key_bytes, prefix = 0, b""
+                    else:
+                        key_bytes, prefix = key_bytes + len(key), new_prefix
+                groups[-1].append((key, child))
+            # a lone last child would make an underfull node, borrow from the group before it
+            if len(groups) > 1 and len(groups[-1]) < 2:
+                groups[-1].insert(0, groups[-2].pop())
+
+            parents = []
+            for group in groups:
+                node = Page(page_id=writer.reserve(), page_type=PageType.INTERNAL)
+                # the node's first child gets the minus-infinity key, its real key moves up as the node's separator
+                node.add_value((b"", group[0][1]))
+                for key, child in group[1:]:
+                    node.add_value((key, child))
+                writer.write(node)
+                parents.append((group[0][0], node.page_id))
+            level = parents
+
+        meta = Page(page_id=writer.reserve(), page_type=PageType.META)
+        meta.add_value(ROOT_POINTER.pack(level[0][1]))
+        writer.write(meta)
+        writer.close()
+        return cls(pager, meta.page_id)
+
+    # ---------------------------------------------------------------- reads
+
+    def search(self, key: bytes) -> bytes | None:
+        leaf = self.pager.get_page(self.root_page_id)
+        while leaf.page_type == PageType.INTERNAL:
+            leaf = self.pager.get_page(leaf.child_at(leaf.child_index(key)))
+        index, found = self._leaf_position(leaf, key)
+        return entry_value(leaf.get_value(index)) if found else None
+
+    # every (key, value) with start <= key < end in key order (None = unbounded)
+    def range_scan(self, start: bytes | None = None, end: bytes | None = None):
+        first = b"" if start is None else start
+        leaf = self.pager.get_page(self.root_page_id)
+        while leaf.page_type == PageType.INTERNAL:
+            leaf = self.pager.get_page(leaf.child_at(leaf.child_index(first)))
+        index, _ = self._leaf_position(leaf, first)
+
+        while True:
+            while index < leaf.slot_count:
+                entry = leaf.get_value(index)
+                key = entry_key(entry)
+                if end is not None and key >= end:
+                    return
+                yield key, entry_value(entry)
+                index += 1
+            if leaf.next_page_id == NO_PAGE:
+                return
+            leaf = self.pager.get_page(leaf.next_page_id)
+            index = 0
+
+    # ---------------------------------------------------------------- writes
+
+    # insert key -> value, an existing key gets its value replaced
+    def insert(self, key: bytes, value: bytes):
+        key, value = bytes(key), bytes(value)
+        entry = encode_entry(key, value)
+        if len(entry) > MAX_ENTRY_SIZE:
+            raise ValueError(f"Entry too big for simpledb B+tree ({len(entry)} > {MAX_ENTRY_SIZE} bytes)")
+
+        pinned = []
+        try:
+            leaf, path = self._descend(key, pinned)
+            index, found = self._leaf_position(leaf, key)
+            if found:
+                leaf.remove_value_at(index)
+            if leaf.has_space(entry):
+                leaf.insert_value_at(index, entry)
+                return
+
+            # full leaf: split the entries (new one included) across this leaf and a new right sibling
+            entries = [bytes(leaf.get_value(i)) for i in range(leaf.slot_count)]
+            entries.insert(index, entry)
+            cut = split_point([len(e) for e in entries])
+            right = self._new_page(PageType.LEAF, pinned)
+            self._refill(leaf, entries[:cut])
+            self._refill(right, entries[cut:])
+            right.next_page_id = leaf.next_page_id
+            leaf.next_page_id = right.page_id
+            separator = shortest_separator(entry_key(entries[cut - 1]), entry_key(entries[cut]))
+            self._insert_into_parent(path, leaf, separator, right, pinned)
+        finally:
+            self._unpin_all(pinned)
+
+    # remove key, raises KeyError if it isn't there
+    def delete(self, key: bytes):
+        key = bytes(key)
+        pinned, dead = [], []
+        try:
+            leaf, path = self._descend(key, pinned)
+            index, found = self._leaf_position(leaf, key)
+            if not found:
+                raise KeyError(key)
+            leaf.remove_value_at(index)
+            self._rebalance(leaf, path, pinned, dead)
+        finally:
+            self._unpin_all(pinned)
+        # pages merged away or an old root, nothing points at them anymore (only unpinned pages can be freed)
+        for page_id in dead:
+            self.pager.free_page(page_id)
+
+    # hang a freshly split right node off the parent of left (separated by key), splitting parents as needed
+    def _insert_into_parent(self, path, left, key, right, pinned):
+        if not path:
+            # the root split: the tree grows one level
+            root = self._new_page(PageType.INTERNAL, pinned)
+            root.add_value((b"", left.page_id))
+            root.add_value((key, right.page_id))
+            self._set_root(root.page_id)
+            return
+
+        parent, index = path.pop()
+        new_entry = (key, right.page_id)
+        if parent.has_space(new_entry):
+            parent.insert_value_at(index + 1, new_entry)
+            return
+
+        entries = list(parent.entries)
+        entries.insert(index + 1, new_entry)
+        cut = internal_split_point(entries)
+        # the first key of the right half moves up, the right node's first child gets the minus-infinity key
+        up_key, first_child = entries[cut]
+        sibling = self._new_page(PageType.INTERNAL, pinned)
+        self._refill(parent, entries[:cut])
+        self._refill(sibling, [(b"", first_child)] + entries[cut + 1:])
+        self._insert_into_parent(path, parent, up_key, sibling, pinned)
+
+    # fix up node after a delete: merge it with a sibling if both fit in one page, otherwise even them out,
+    # pages that drop out of the tree go to dead
+    def _rebalance(self, node, path, pinned, dead):
+        if not path:
+            # an internal root with a single child is pointless, the child becomes the root
+            if node.page_type == PageType.INTERNAL and node.entry_count == 1:
+                self._set_root(node.child_at(0))
+                dead.append(node.page_id)
+            return
+        if node.current_size >= MIN_FILL:
+            return
+
+        parent, index = path[-1]
+        if parent.entry_count < 2:
+            # no sibling to work with, let the parent level sort itself out
+            self._rebalance(parent, path[:-1], pinned, dead)
+            return
+
+        # work on (left, right) neighbours, separator_index is right's entry in the parent
+        if index > 0:
+            left, right, separator_index = self._pin(parent.child_at(index - 1), pinned), node, index
+        else:
+            left, right, separator_index = node, self._pin(parent.child_at(1), pinned), 1
+        separator, _ = parent.get_value(separator_index)
+
+        if node.page_type == PageType.INTERNAL:
+            # pull the separator down so the combined list is a valid internal node again
+            entries = left.entries + [(separator, right.entries[0][1])] + right.entries[1:]
+            fits = internal_page_size(entries) <= PAGE_SIZE
+        else:
+            entries = [bytes(left.get_value(i)) for i in range(left.slot_count)] + [bytes(right.get_value(i)) for i in range(right.slot_count)]
+            sizes = [len(e) + 4 for e in entries]
+            fits = LEAF_HEADER.size + sum(sizes) <= PAGE_SIZE
+
+        if fits:
+            # merge right into left and drop right from the parent, right's page goes back to the pager
+            self._refill(left, entries)
+            if node.page_type != PageType.INTERNAL:
+                left.next_page_id = right.next_page_id
+            parent.remove_value_at(separator_index)
+            dead.append(right.page_id)
+            self._rebalance(parent, path[:-1], pinned, dead)
+            return
+
+        # too much for one page: share the entries out evenly and give the parent the new separator
+        if node.page_type == PageType.INTERNAL:
+            cut = internal_split_point(entries)
+            new_separator, first_child = entries[cut]
+            self._refill(left, entries[:cut])
+            self._refill(right, [(b"", first_child)] + entries[cut + 1:])
+        else:
+            cut = split_point(sizes)
+            new_separator = shortest_separator(entry_key(entries[cut - 1]), entry_key(entries[cut]))
+            self._refill(left, entries[:cut])
+            self._refill(right, entries[cut:])
+        parent.remove_value_at(separator_index)
+        parent.insert_value_at(separator_index, (new_separator, right.page_id))
+
+    # ---------------------------------------------------------------- helpers
+
+    # binary search a leaf: (index of the first entry with entry key >= key, whether it is exactly key)
+    @staticmethod
+    def _leaf_position(leaf, key: bytes):
+        low, high = 0, leaf.slot_count
+        while low < high:
+            middle = (low + high) // 2
+            if entry_key(leaf.get_value(middle)) < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = low < leaf.slot_count and entry_key(leaf.get_value(low)) == key
+        return low, found
+
+    # walk to the leaf for key pinning every node on the way, path = [(internal page, child index), ...] root first
+    def _descend(self, key, pinned):
+        path = []
+        page = self._pin(self.root_page_id, pinned)
+        while page.page_type == PageType.INTERNAL:
+            index = page.child_index(key)
+            path.append((page, index))
+            page = self._pin(page.child_at(index), pinned)
+        return page, path
+
+    def _pin(self, page_id, pinned):
+        page = self.pager.pin(page_id)
+        pinned.append(page)
+        return page
+
+    def _new_page(self, page_type, pinned):
+        page = self.pager.allocate_new_page(page_type)
+        return self._pin(page.page_id, pinned)
+
+    def _unpin_all(self, pinned):
+        for page in pinned:
+            self.pager.unpin(page.page_id, dirty=page.dirty)
+
+    # replace everything on a node with entries (already encoded leaf entries or (key, child) tuples)
+    @staticmethod
+    def _refill(page, entries):
+        page.clear()
+        for entry in entries:
+            page.add_value(entry)
+
+    def _set_root(self, page_id):
+        meta = self.pager.get_page(self.meta_page_id)
+        meta.delete_value(0)
+        meta.add_value(ROOT_POINTER.pack(page_id))
+        self.pager.mark_dirty(self.meta_page_id)
+        self.root_page_id = page_id
+
+
+# Writes pages at the end of the pager's file in page id order, batch_pages at a time with one append_bytes each,
+# without putting them in the buffer pool. Page ids come from Pager.reserve_page so the pager knows about them.
+class PageStreamWriter:
+
+    def __init__(self, pager, batch_pages: int = 256):
+        self.pager = pager
+        self.batch_pages = batch_pages
+        # everything the pager allocated so far has to be in the file first, otherwise our pages land in the wrong place.
+        # Committing (and checkpointing) the caller's changes to get there is up to the caller
+        unwritten = pager.unwritten_pages()
+        if unwritten:
+            raise ValueError(f"{unwritten} pages aren't in the main file yet, commit and checkpoint before streaming pages")
+        if pager.file_handler.file_size != pager.num_pages * PAGE_SIZE:
+            raise ValueError("Database file size doesn't match its page count, can't append pages")
+        self.first_page_id = self.next_page_id = pager.num_pages
+        # pages before flushed_end are in the file
+        self.flushed_end = self.first_page_id
+        self.reserved = []
+        self.buffer = bytearray()
+
+    def reserve(self) -> int:
+        page_id = self.pager.reserve_page()
+        self.reserved.append(page_id)
+        return page_id
+
+    # pages have to come in page id order (each one lands right after the previous one)
+    def write(self, page):
+        if page.page_id != self.next_page_id:
+            raise ValueError(f"Page {page.page_id} written out of order, expected {self.next_page_id}")
+        self.buffer += page.to_bytes()
+        self.next_page_id += 1
+        if len(self.buffer) >= self.batch_pages * PAGE_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.pager.file_handler.append_bytes(self.buffer)
+            self.buffer = bytearray()
+            self.flushed_end = self.next_page_id
+
+    def close(self):
+        self.flush()
+        if self.pager.sync_policy != SyncPolicy.NONE:
+            self.pager.file_handler.sync()
+
+    # give back every page reserved so far: the file and the page count go back to where they were when nobody else
+    # allocated meanwhile, otherwise the pages not written yet get blank images and all of them go to the free list
+    def abort(self):
+        self.buffer = bytearray()
+        pager = self.pager
+        with pager.lock:
+            if self.reserved == list(range(self.first_page_id, pager.num_pages)):
+                pager.num_pages = self.first_page_id
+                pager.file_handler.truncate(self.first_page_id * PAGE_SIZE)
+            else:
+                blank = Page(page_id=0, page_type=PageType.LEAF).to_bytes()
+                for page_id in self.reserved:
+                    if page_id >= self.flushed_end:
+                        pager.file_handler.write_bytes(page_id * PAGE_SIZE, blank)
+                for page_id in self.reserved:
+                    pager.free_page(page_id)
+        self.reserved = []
+
@@ -0,0 +1,356 @@
+# Function: Transparent page compression: the database file keeps every page compressed in a slot just big enough for
+# it, a page-location map says where each page is. Everything above the file handler (Pager, write-ahead log
+# checkpoints, ScanCursor, snapshots, the bulk loader) keeps seeing 4KB pages at page_id * PAGE_SIZE.
+# Key Responsibilities:
+    # ZlibCodec (stdlib zlib) / any codec with name, compress(bytes) -> bytes and decompress(bytes) -> bytes.
+    # CompressedFileHandler(file_path, codec): a FileHandler over the packed file, used by Pager(..., compression=...).
+    # Reads decompress, writes compress, so the buffer pool only ever holds decompressed pages.
+    # set_compression(page_id, False): keep that page uncompressed (hot tables, see RecordStore.create(compress=False)).
+    # has_page_map(file_path): whether a database file is a compressed one (Pager opens those without being told).
+
+# Layout:
+    # <db>: the slots, back to back. A slot is a multiple of SLOT_UNIT bytes and holds one page image, compressed or not
+    # (pages that don't get at least SLOT_UNIT smaller are stored as is, in a PAGE_SIZE slot).
+    # <db>-map: MAP_HEADER (magic | page size | codec name) then one MAP_ENTRY per page id:
+    # slot offset | stored length | slot size | flags. Slot size 0 = the page was never written (reads as zeros).
+    # Free slots aren't stored anywhere: opening the map finds the gaps between the slots in use.
+# A rewritten page always moves to a free slot (best fit, neighbouring free slots are merged) or the end of the file,
+# the slot the map on disk points at is never written over. The map entry is written right after the new slot, the old
+# slot waits for the next sync() (data file first, then the map) before it's handed out again: after a crash the map
+# on disk points at the old slot, still intact, or at the new one, synced before the map was. Once MAX_PENDING bytes
+# wait, a write does that sync itself so the file doesn't keep growing.
+
+# Interaction: Built on FileHandler (the physical reads/writes, and their metrics, are the packed bytes). Created by the
+# Pager, parallel_scan workers open it read-only with the same codec.
+
+import os
+import struct
+import threading
+import zlib
+from constants import PAGE_SIZE
+from file_handler import FileHandler
+
+MAP_SUFFIX = "-map"
+MAP_MAGIC = b"SDBMAP01"
+# magic | page size | codec name (zero padded)
+MAP_HEADER = struct.Struct(">8sI16s")
+# slot offset | stored length | slot size | flags
+MAP_ENTRY = struct.Struct(">QHHB")
+# the stored bytes are compressed (otherwise it's the page image as is)
+COMPRESSED = 0x01
+# never compress this page
+KEEP_RAW = 0x02
+# slots are allocated in steps of this many bytes
+SLOT_UNIT = 256
+# bytes of old slots waiting for a sync before the writer syncs (and gets them back) itself
+MAX_PENDING = 256 * PAGE_SIZE
+
+
+class ZlibCodec:
+    name = "zlib"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compress(self, data) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data) -> bytes:
+        return zlib.decompress(data)
+
+
+# codecs a compressed file can name in its map
+CODECS = {"zlib": ZlibCodec()}
+
+
+# a codec for Pager(compression=...): a name from CODECS or a codec object
+def resolve_codec(compression):
+    if isinstance(compression, str):
+        if compression not in CODECS:
+            raise ValueError(f"Unknown compression codec {compression!r}")
+        return CODECS[compression]
+    return compression
+
+
+def has_page_map(file_path) -> bool:
+    return os.path.exists(file_path + MAP_SUFFIX)
+
+
+def slot_size(length: int) -> int:
+    return -(-length // SLOT_UNIT) * SLOT_UNIT
+
+
+class CompressedFileHandler(FileHandler):
+    zero_copy = False
+
+    def __init__(self, file_path, codec=None, read_only=False):
+        map_exists = has_page_map(file_path)
+        if not map_exists and (read_only or (os.path.exists(file_path) and os.path.getsize(file_path) > 0)):
+            raise ValueError(f"{file_path} is not a compressed database (no {MAP_SUFFIX} file)")
+        super().__init__(file_path, read_only)
+        self.map_file = FileHandler(file_path + MAP_SUFFIX, read_only)
+        # guards the map and the free slots, and keeps a slot from being reused while somebody reads it
+        self.lock = threading.RLock()
+
+        codec = resolve_codec(codec)
+        if map_exists:
+            magic, page_size, name = MAP_HEADER.unpack(self.map_file.read_bytes(0, MAP_HEADER.size))
+            name = name.rstrip(b"\x00").decode("ascii")
+            if magic != MAP_MAGIC:
+                raise ValueError(f"{file_path}{MAP_SUFFIX} is not a simpledb page map")
+            if page_size != PAGE_SIZE:
+                raise ValueError(f"Page map page size {page_size} doesn't match simpledb's page size {PAGE_SIZE}")
+            if codec is None:
+                codec = resolve_codec(name)
+            elif codec.name != name:
+                raise ValueError(f"{file_path} is compressed with {name!r}, not {codec.name!r}")
+        else:
+            codec = codec if codec is not None else CODECS["zlib"]
+            self.map_file.write_bytes(0, MAP_HEADER.pack(MAP_MAGIC, PAGE_SIZE, codec.name.encode("ascii")))
+        self.codec = codec
+
+        # page_id -> (slot offset, stored length, slot size, flags)
+        raw = self.map_file.read_bytes(MAP_HEADER.size, self.map_file.file_size - MAP_HEADER.size)
+        self.entries = list(MAP_ENTRY.iter_unpack(raw[:len(raw) - len(raw) % MAP_ENTRY.size]))
+        self._rebuild_free_slots()
+
+    # page count (the logical file ends after the last page that was written), the free space between the slots in use
+    # and the end of the slots
+    def _rebuild_free_slots(self):
+        self.page_count = 0
+        used = []
+        for page_id, (offset, _, size, _) in enumerate(self.entries):
+            if size:
+                self.page_count = page_id + 1
+                used.append((offset, size))
+        used.sort()
+        # free space in extents of neighbouring free slots: offset -> size, end -> offset, size -> {offsets}
+        self.free = {}
+        self.free_ends = {}
+        self.free_sizes = {}
+        # old slots the map on disk may still point at: [(offset, size), ...] and their bytes
+        self.pending = []
+        self.pending_bytes = 0
+        self.end = 0
+        for offset, size in used:
+            if offset > self.end:
+                self._add_free(self.end, offset - self.end)
+            self.end = max(self.end, offset + size)
+
+    # ---------------------------------------------------------------- logical file
+
+    @property
+    def file_size(self):
+        return self.page_count * PAGE_SIZE
+
+    # bytes the packed file takes on disk
+    @property
+    def stored_size(self):
+        return super().file_size
+
+    def read_bytes(self, offset: int, number_of_bytes_to_read: int):
+        end = min(offset + number_of_bytes_to_read, self.file_size)
+        if end <= offset:
+            return b""
+        first_page = offset // PAGE_SIZE
+        data = b"".join(self._read_pages(first_page, -(-end // PAGE_SIZE)))
+        start = offset - first_page * PAGE_SIZE
+        return data[start:start + end - offset]
+
+    def read_into(self, offset: int, buffer) -> int:
+        data = self.read_bytes(offset, len(buffer))
+        memoryview(buffer)[:len(data)] = data
+        return len(data)
+
+    # where the pages are is up to the map, nothing to tell the OS
+    def advise_sequential(self, offset: int, length: int):
+        pass
+
+    def write_bytes(self, offset: int, bytes_to_write: bytes):
+        self.write_vectored(offset, [bytes_to_write])
+
+    # whole pages only, offset on a page boundary
+    def write_vectored(self, offset: int, buffers: list):
+        data = b"".join(buffers)
+        if offset % PAGE_SIZE or len(data) % PAGE_SIZE:
+            raise ValueError("Compressed files are written in whole pages")
+        first_page = offset // PAGE_SIZE
+        self._write_pages(first_page, [data[start:start + PAGE_SIZE] for start in range(0, len(data), PAGE_SIZE)])
+
+    def append_bytes(self, bytes_to_append: bytes):
+        with self.append_lock:
+            self.write_vectored(self.file_size, [bytes_to_append])
+
+    def truncate(self, size: int):
+        if size % PAGE_SIZE:
+            raise ValueError("Compressed files are cut on page boundaries")
+        self.sync()
+        with self.lock:
+            del self.entries[size // PAGE_SIZE:]
+            self._rebuild_free_slots()
+            self.map_file.truncate(MAP_HEADER.size + len(self.entries) * MAP_ENTRY.size)
+            super().truncate(self.end)
+
+    # data first, then the map: the map on disk never points at slots that aren't on disk yet. After that nothing on
+    # disk points at the old slots anymore, they're free
+    def sync(self):
+        with self.lock:
+            pending, self.pending, self.pending_bytes = self.pending, [], 0
+        super().sync()
+        self.map_file.sync()
+        with self.lock:
+            for offset, size in pending:
+                self._release(offset, size)
+
+    def close(self):
+        self.map_file.close()
+        super().close()
+
+    # enabled False: store page_id as is from now on, True/None: compress it again (freed pages go back to None)
+    def set_compression(self, page_id: int, enabled):
+        with self.lock:
+            offset, length, size, flags = self._entry(page_id)
+            flags = flags & ~KEEP_RAW if enabled is not False else flags | KEEP_RAW
+            self._set_entries(page_id, [(offset, length, size, flags)])
+
+    # ---------------------------------------------------------------- pages
+
+    # decompressed images of pages [first_page, end_page), neighbouring slots are read together
+    def _read_pages(self, first_page, end_page):
+        with self.lock:
+            entries = [self._entry(page_id) for page_id in range(first_page, end_page)]
+            blobs = []
+            run_start = run_end = None
+            run = []
+            for offset, length, size, flags in entries + [(None, 0, 0, 0)]:
+                if run and (offset is None or not size or offset != run_end):
+                    chunk = super().read_bytes(run_start, run_end - run_start)
+                    for entry_offset, entry_length, entry_flags, index in run:
+                        blobs[index] = (chunk[entry_offset - run_start:entry_offset - run_start + entry_length], entry_flags)
+                    run = []
+                if offset is None:
+                    break
+                blobs.append(None)
+                if size:
+                    if not run:
+                        run_start = offset
+                    run.append((offset, length, flags, len(blobs) - 1))
+                    run_end = offset + size
+
+        images = []
+        for blob in blobs:
+            if blob is None:
+                # never written (a hole in a plain file)
+                images.append(bytes(PAGE_SIZE))
+                continue
+            stored, flags = blob
+            image = self.codec.decompress(stored) if flags & COMPRESSED else bytes(stored)
+            if len(image) != PAGE_SIZE:
+                raise ValueError(f"Corrupt compressed page in {self.file_path}")
+            images.append(image)
+        return images
+
+    def _write_pages(self, first_page, images):
+        with self.lock:
+            flags = [self._entry(first_page + index)[3] for index in range(len(images))]
+        # compress without holding the lock
+        blobs = []
+        for image, page_flags in zip(images, flags):
+            stored = None if page_flags & KEEP_RAW else self.codec.compress(image)
+            if stored is not None and slot_size(len(stored)) < PAGE_SIZE:
+                blobs.append((stored, page_flags | COMPRESSED))
+            else:
+                blobs.append((bytes(image), page_flags & ~COMPRESSED))
+
+        with self.lock:
+            released = []
+            writes = []
+            new_entries = []
+            for index, (stored, page_flags) in enumerate(blobs):
+                old_offset, _, old_size, _ = self._entry(first_page + index)
+                size = slot_size(len(stored))
+                # never over the old slot: a write torn by a crash must not take the page the map on disk points at
+                offset = self._allocate(size)
+                if old_size:
+                    released.append((old_offset, old_size))
+                writes.append((offset, stored + bytes(size - len(stored))))
+                new_entries.append((offset, len(stored), size, page_flags))
+
+            # slots next to each other go out in one write
+            writes.sort()
+            run_start, run = None, []
+            for offset, slot in writes + [(None, b"")]:
+                if run and (offset is None or offset != run_start + sum(map(len, run))):
+                    super().write_vectored(run_start, run)
+                    run = []
+                if offset is None:
+                    break
+                if not run:
+                    run_start = offset
+                run.append(slot)
+            self._set_entries(first_page, new_entries)
+            self.page_count = max(self.page_count, first_page + len(images))
+            # the map on disk may still point at the old slots until the next sync
+            self.pending.extend(released)
+            self.pending_bytes += sum(size for _, size in released)
+            must_sync = self.pending_bytes > MAX_PENDING
+        if must_sync:
+            self.sync()
+
+    def _entry(self, page_id):
+        return self.entries[page_id] if page_id < len(self.entries) else (0, 0, 0, 0)
+
+    # update the map entries from page_id on, in memory and in the map file (entries skipped over read back as zeros)
+    def _set_entries(self, page_id, entries):
+        while len(self.entries) < page_id:
+            self.entries.append((0, 0, 0, 0))
+        self.entries[page_id:page_id + len(entries)] = entries
+        data = b"".join(MAP_ENTRY.pack(*entry) for entry in entries)
+        self.map_file.write_bytes(MAP_HEADER.size + page_id * MAP_ENTRY.size, data)
+
+    # a slot of size bytes: the smallest free extent up to a page that fits, a bigger one, or a new one at the end of
+    # the file. What's left of the extent stays free
+    def _allocate(self, size):
+        for candidate in range(size, PAGE_SIZE + 1, SLOT_UNIT):
+            if candidate in self.free_sizes:
+                break
+        else:
+            candidate = next((candidate for candidate in self.free_sizes if candidate > size), None)
+        if candidate is None:
+            offset = self.end
+            self.end += size
+            return offset
+        offset = next(iter(self.free_sizes[candidate]))
+        self._take_free(offset)
+        if candidate > size:
+            # the extent's neighbours are in use, nothing to merge the rest with
+            self._add_free(offset + size, candidate - size)
+        return offset
+
+    # give a slot back, merged with the free extents right before and after it (or the end of the file)
+    def _release(self, offset, size):
+        if offset in self.free_ends:
+            start = self.free_ends[offset]
+            size += self._take_free(start)
+            offset = start
+        if offset + size in self.free:
+            size += self._take_free(offset + size)
+        if offset + size == self.end:
+            self.end = offset
+        else:
+            self._add_free(offset, size)
+
+    def _add_free(self, offset, size):
+        self.free[offset] = size
+        self.free_ends[offset + size] = offset
+        self.free_sizes.setdefault(size, set()).add(offset)
+
+    # remove the free extent at offset, returns its size
+    def _take_free(self, offset):
+        size = self.free.pop(offset)
+        del self.free_ends[offset + size]
+        offsets = self.free_sizes[size]
+        offsets.discard(offset)
+        if not offsets:
+            del self.free_sizes[size]
+        return size
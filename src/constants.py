@@ -1,4 +1,8 @@
-SERIAL_RECORD_INT = 4 # Treat all ints as 4-byte (SQLite:Value is a big-endian 32-bit twos-complement integer)
+SERIAL_RECORD_INT = 4 # big-endian 32-bit twos-complement integer (ints use the smallest int type that fits, see record_serializer.encode_int)
 SERIAL_RECORD_NULL = 0
 SERIAL_RECORD_FLOAT = 7
+SERIAL_RECORD_ZERO = 8 # the integer 0, no body bytes
+SERIAL_RECORD_ONE = 9 # the integer 1, no body bytes
+SERIAL_RECORD_FALSE = 10 # booleans, no body bytes (SQLite keeps 10 and 11 for internal use, we use them for bools)
+SERIAL_RECORD_TRUE = 11
 PAGE_SIZE = 4096
\ No newline at end of file
@@ -0,0 +1,94 @@
+# Function: Decide which cached page the Pager should drop when the buffer pool is full.
+# Key Responsibilities:
+    # insert(page_id): start tracking a page that just entered the cache.
+    # record_access(page_id): note that a cached page was used again (cache hit).
+    # remove(page_id): stop tracking a page that left the cache.
+    # choose_victim(can_evict) -> page_id | None: pick a page to drop, skipping pages that can_evict rejects (pinned pages).
+
+# Interaction: The Pager owns the cache dict and the pin counts, the policy only keeps the bookkeeping it needs to rank pages.
+# Any object with these four methods can be handed to Pager(eviction_policy=...).
+
+from collections import OrderedDict
+
+
+class ClockPolicy:
+    # CLOCK (second chance): every page has a reference bit that is set on access.
+    # The hand sweeps the ring, clearing bits, and evicts the first page whose bit is already clear.
+
+    def __init__(self):
+        # the OrderedDict is our ring: the first key is where the hand currently points, rotating = move_to_end
+        self.ring = OrderedDict()
+
+    def insert(self, page_id):
+        # new pages start with the bit set so they survive at least one sweep
+        self.ring[page_id] = True
+
+    def record_access(self, page_id):
+        if page_id in self.ring:
+            self.ring[page_id] = True
+
+    def remove(self, page_id):
+        self.ring.pop(page_id, None)
+
+    def choose_victim(self, can_evict):
+        # two full sweeps are enough: the first one clears every bit, the second one must find a clear bit unless everything is pinned
+        for _ in range(2 * len(self.ring)):
+            page_id, referenced = next(iter(self.ring.items()))
+            # advance the hand past this page
+            self.ring.move_to_end(page_id)
+            if not can_evict(page_id):
+                continue
+            if referenced:
+                # second chance: clear the bit and keep sweeping
+                self.ring[page_id] = False
+                continue
+            return page_id
+        return None
+
+
+class LRUKPolicy:
+    # LRU-K: rank pages by the time of their K-th most recent access (the "backward K-distance").
+    # Pages touched fewer than K times have an infinite distance and are evicted first (oldest first among them),
+    # so a page read once by a big scan can't push out a page that is used over and over.
+
+    def __init__(self, k: int = 2):
+        if k < 1:
+            raise ValueError("LRU-K needs k >= 1")
+        self.k = k
+        # logical clock, bumped on every access so timestamps are unique and cheap
+        self.clock = 0
+        # page_id -> list of the last k access timestamps (oldest first)
+        self.history = {}
+
+    def _touch(self, page_id):
+        self.clock += 1
+        accesses = self.history.setdefault(page_id, [])
+        accesses.append(self.clock)
+        # only the last k accesses matter
+        if len(accesses) > self.k:
+            del accesses[0]
+
+    def insert(self, page_id):
+        self._touch(page_id)
+
+    def record_access(self, page_id):
+        if page_id in self.history:
+            self._touch(page_id)
+
+    def remove(self, page_id):
+        self.history.pop(page_id, None)
+
+    def choose_victim(self, can_evict):
+        victim = None
+        victim_rank = None
+        for page_id, accesses in self.history.items():
+            if not can_evict(page_id):
+                continue
+            # (0, ...) sorts before (1, ...) so pages with < k accesses always lose first
+            if len(accesses) < self.k:
+                rank = (0, accesses[-1])
+            else:
+                rank = (1, accesses[0])
+            if victim_rank is None or rank < victim_rank:
+                victim, victim_rank = page_id, rank
+        return victim
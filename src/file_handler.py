@@ -1,49 +1,232 @@
 # Key Responsibilities:
     # Opening and closing the database file.
-    # Reading a specified number of bytes from a given offset.
+    # Reading a specified number of bytes from a given offset (or into a caller's buffer, read_into).
     # Writing a specified number of bytes to a given offset.
-    # Appending bytes to the end of the file.
+    # All reads and writes are positional (pread/pwrite), so any number of threads can share one FileHandler.
+    # Appending bytes to the end of the file (and cutting it short, truncate).
     # Reporting the current size of the file.
+    # metrics (a metrics.Metrics, set by the Pager, None = off): file.read / file.write latency and bytes.
 
 import os
+import mmap
+import threading
+from time import perf_counter
+
+# how many buffers a single pwritev call accepts (sysconf says -1 when there is no fixed limit, 1024 is what Linux uses)
+IOV_MAX = 1024
+if hasattr(os, "sysconf") and "SC_IOV_MAX" in os.sysconf_names and os.sysconf("SC_IOV_MAX") > 0:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
 
 class FileHandler:
-    
-    def __init__(self,file_path):
+    # read_bytes hands out fresh bytes objects, so callers can keep them as long as they like
+    zero_copy = False
+    metrics = None
+
+    def __init__(self,file_path, read_only=False):
         self.file_path = file_path
+        # read_only: open an existing file for reading only (scan workers in other processes), writes fail
+        self.read_only = read_only
 
         # create the file in the init call so that you can refer to it later. Everytime you instantiate FileHandler you will be working with an open file anyway
-        if not os.path.exists(self.file_path):
-            self.file = open(file_path,'w+b')
+        # unbuffered: every write goes straight to the OS, so there is nothing to flush and vectored/mmap I/O never sees stale bytes
+        if read_only:
+            self.file = open(file_path, 'rb', buffering=0)
+        elif not os.path.exists(self.file_path):
+            self.file = open(file_path,'w+b', buffering=0)
         else:
-            self.file = open(file_path, 'r+b')
+            self.file = open(file_path, 'r+b', buffering=0)
+        # every read/write is positional (pread/pwrite), only appends need a lock
+        self.append_lock = threading.Lock()
       
     def close(self):
         # FileHanlder.close()
         self.file.close()
 
     # given a specific offset, write bytes to that offset in the file
+    # positional (pwrite): no shared file position, so threads can read/write different offsets at the same time
     def write_bytes(self,offset:int,bytes_to_write:bytes):
-        self.file.seek(offset)
-        self.file.write(bytes_to_write)
-        self.file.flush()
+        metrics = self.metrics
+        start = perf_counter() if metrics is not None else 0.0
+        fd = self.file.fileno()
+        view = memoryview(bytes_to_write)
+        size = view.nbytes
+        while view:
+            written = os.pwrite(fd, view, offset)
+            offset += written
+            view = view[written:]
+        if metrics is not None:
+            metrics.record("file.write", perf_counter() - start, size)
+
+    # write several buffers back to back starting at offset with as few syscalls as possible (one pwritev per IOV_MAX buffers)
+    def write_vectored(self, offset: int, buffers: list):
+        if not hasattr(os, "pwritev"):
+            # platforms without pwritev still get a single big write
+            self.write_bytes(offset, b''.join(buffers))
+            return
+        metrics = self.metrics
+        start = perf_counter() if metrics is not None else 0.0
+        fd = self.file.fileno()
+        buffers = [memoryview(buffer) for buffer in buffers]
+        size = sum(buffer.nbytes for buffer in buffers)
+        while buffers:
+            batch = buffers[:IOV_MAX]
+            written = os.pwritev(fd, batch, offset)
+            offset += written
+            # pwritev may stop early, drop what went out and retry from the first unwritten byte
+            while written > 0:
+                if written >= len(buffers[0]):
+                    written -= len(buffers[0])
+                    buffers.pop(0)
+                else:
+                    buffers[0] = buffers[0][written:]
+                    written = 0
+        if metrics is not None:
+            metrics.record("file.write", perf_counter() - start, size)
+
+    # read straight into a caller's buffer (bytearray/memoryview) starting at offset, returns how many bytes came in
+    # (fewer than len(buffer) at the end of the file). Big sequential reads reuse one buffer instead of allocating per read
+    def read_into(self, offset: int, buffer) -> int:
+        metrics = self.metrics
+        start = perf_counter() if metrics is not None else 0.0
+        buffer = memoryview(buffer)
+        fd = self.file.fileno()
+        total = 0
+        while total < len(buffer):
+            if hasattr(os, "preadv"):
+                got = os.preadv(fd, [buffer[total:]], offset + total)
+            else:
+                chunk = os.pread(fd, len(buffer) - total, offset + total)
+                buffer[total:total + len(chunk)] = chunk
+                got = len(chunk)
+            if not got:
+                break
+            total += got
+        if metrics is not None:
+            metrics.record("file.read", perf_counter() - start, total)
+        return total
+
+    # tell the OS we're about to read this range front to back (bigger kernel readahead), only a hint
+    def advise_sequential(self, offset: int, length: int):
+        if hasattr(os, "posix_fadvise") and length > 0:
+            os.posix_fadvise(self.file.fileno(), offset, length, os.POSIX_FADV_SEQUENTIAL)
+
+    # cut the file down to size bytes
+    def truncate(self, size: int):
+        os.ftruncate(self.file.fileno(), size)
+
+    # push everything written so far to stable storage (data only, metadata like mtime can lag behind)
+    def sync(self):
+        if hasattr(os, "fdatasync"):
+            os.fdatasync(self.file.fileno())
+        else:
+            os.fsync(self.file.fileno())
 
     # given a specific offset, read from that offset in the file
+    # positional (pread) like write_bytes, and pread releases the GIL so reads on several threads overlap
     def read_bytes(self,offset:int,number_of_bytes_to_read:int):
-        self.file.seek(offset)
-        read_bytes = self.file.read(number_of_bytes_to_read)
+        metrics = self.metrics
+        if metrics is None:
+            return os.pread(self.file.fileno(), number_of_bytes_to_read, offset)
+        start = perf_counter()
+        read_bytes = os.pread(self.file.fileno(), number_of_bytes_to_read, offset)
+        metrics.record("file.read", perf_counter() - start, len(read_bytes))
         return read_bytes
 
     def append_bytes(self,bytes_to_append:bytes):
-        self.file.seek(0,os.SEEK_END)
-        self.file.write(bytes_to_append)
-        self.file.flush()
+        # "where is the end" + the write have to happen together, or two appenders would write to the same offset
+        with self.append_lock:
+            self.write_bytes(os.fstat(self.file.fileno()).st_size, bytes_to_append)
     
     @property
     def file_size(self):
-        self.file.seek(0,os.SEEK_END)
-        return self.file.tell()
+        return os.fstat(self.file.fileno()).st_size
+
 
+# Same interface as FileHandler, but reads come out of a read-only memory map of the file.
+# read_bytes returns a memoryview into the mapping (no syscall, no copy) and file_size is tracked in memory.
+# Writes still go through the regular file object, the kernel shares the page cache so the map sees them right away.
+# Lifetime of a view handed out by read_bytes: the mapping stays alive as long as any view does (a remap or close
+# leaves the old map to the garbage collector), but a view shows whatever is in the file *now* and a region cut off by
+# truncate must never be read again (SIGBUS). So whoever holds views copies them out before their region is
+# overwritten or cut off: the Pager does that for its pages (Page.detach) before writing them, when it frees them and
+# when truncate drops them. A page is only stable while it's in the buffer pool (pin it to keep it there), and views
+# taken from a page (Page.get_value) are views of the map too.
+class MmapFileHandler(FileHandler):
+    zero_copy = True
 
+    def __init__(self, file_path, read_only=False):
+        super().__init__(file_path, read_only)
+        self.size = os.fstat(self.file.fileno()).st_size
+        # guards size and the current map (writers grow the size while readers may be remapping)
+        self.map_lock = threading.Lock()
+        self.map = None
+        self.view = None
+        self.mapped_size = 0
+        self._remap()
 
+    def _remap(self):
+        # mmap can't map an empty file, reads just come back empty until something is written
+        if self.size == 0:
+            return
+        # don't close the old map: views handed out earlier keep it alive and it gets unmapped once they are gone
+        self.map = mmap.mmap(self.file.fileno(), self.size, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.mapped_size = self.size
 
+    def close(self):
+        self.view = None
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                # somebody still holds a view into the map, the garbage collector unmaps it once they drop it
+                pass
+            self.map = None
+        super().close()
+
+    def write_bytes(self, offset: int, bytes_to_write: bytes):
+        super().write_bytes(offset, bytes_to_write)
+        self._grow(offset + len(bytes_to_write))
+
+    # given a specific offset, return a view of the mapped file (remap first if the file grew past the mapping)
+    def read_bytes(self, offset: int, number_of_bytes_to_read: int):
+        metrics = self.metrics
+        start = perf_counter() if metrics is not None else 0.0
+        with self.map_lock:
+            if offset + number_of_bytes_to_read > self.mapped_size and self.size > self.mapped_size:
+                self._remap()
+            view = self.view
+        if view is None:
+            return memoryview(b'')
+        # slicing a memoryview never copies, reading past the end just gets cut short like file.read
+        view = view[offset:offset + number_of_bytes_to_read]
+        if metrics is not None:
+            metrics.record("file.read", perf_counter() - start, len(view))
+        return view
+
+    def write_vectored(self, offset: int, buffers: list):
+        super().write_vectored(offset, buffers)
+        self._grow(offset + sum(len(buffer) for buffer in buffers))
+
+    def append_bytes(self, bytes_to_append: bytes):
+        super().append_bytes(bytes_to_append)
+        # the append went wherever the end was, the file itself knows the new size
+        self._grow(os.fstat(self.file.fileno()).st_size)
+
+    def truncate(self, size: int):
+        super().truncate(size)
+        with self.map_lock:
+            self.size = size
+            # map again (the old map stays alive for views handed out earlier, nothing may touch the cut off part)
+            self.map = None
+            self.view = None
+            self.mapped_size = 0
+            self._remap()
+
+    def _grow(self, end: int):
+        with self.map_lock:
+            self.size = max(self.size, end)
+
+    @property
+    def file_size(self):
+        return self.size
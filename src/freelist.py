@@ -0,0 +1,128 @@
+# Function: Keeps track of pages nobody uses anymore so Pager.allocate_new_page can hand them out again
+# instead of always growing the file.
+# Key Responsibilities:
+    # push(page_id) / pop() -> lowest free page id (or None) / lowest(): reusing the lowest ids first keeps the end of the file
+    # free, which is what Pager.truncate can cut off.
+    # save(): write the list into trunk pages and point the superblock at them, the Pager calls it on flush/commit.
+    # the trunk chain is read back the first time the list is used, not on open (opening stays one header read).
+
+# On disk:
+    # the superblock (page 0, see superblock.py) holds the first trunk page id and the number of free pages
+    # (files created before the header page existed have none: their free list only lives in memory)
+    # trunk pages are free pages themselves (META layout): slot 0 = FREELIST_MAGIC, slot 1 = packed 4-byte page ids,
+    # next_page_id links to the next trunk. A freed page is never written to, only its id goes into a trunk.
+    # The list is rewritten from scratch on every save, so whichever free pages are trunks right now can still be
+    # allocated in the meantime.
+
+# Interaction: Owned by the Pager (pager.free_list), every method runs under the pager's lock.
+
+import heapq
+import struct
+from constants import PAGE_SIZE
+from page import Page, PageType, LEAF_HEADER, SLOT, NO_PAGE
+
+FREELIST_MAGIC = b"SDBFREE1"
+PAGE_ID = struct.Struct(">I")
+# page ids per trunk page (what's left next to the header, two slots and the magic)
+TRUNK_CAPACITY = (PAGE_SIZE - LEAF_HEADER.size - 2 * SLOT.size - len(FREELIST_MAGIC)) // PAGE_ID.size
+
+
+class FreeList:
+
+    def __init__(self, pager):
+        self.pager = pager
+        # min-heap of free page ids + a set for membership tests (popped ids are removed from both)
+        self.heap = []
+        self.ids = set()
+        # the in-memory list differs from what's in the file
+        self.changed = False
+        # the trunk chain hasn't been read yet (see _load)
+        self.loaded = False
+
+    # read the trunk chain the superblock points to, every method below calls this first
+    def _load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        superblock = self.pager.superblock
+        if superblock is None:
+            return
+        trunk_id = superblock.free_list_head
+        seen = set()
+        while trunk_id != NO_PAGE:
+            # a broken chain (e.g. a crash right after a truncate) only loses free pages, never used ones
+            if trunk_id in seen or trunk_id >= self.pager.num_pages:
+                break
+            trunk = self.pager.get_page(trunk_id)
+            if trunk.page_type != PageType.META or trunk.slot_count < 2 or bytes(trunk.get_value(0)) != FREELIST_MAGIC:
+                break
+            seen.add(trunk_id)
+            self._add(trunk_id)
+            for (page_id,) in PAGE_ID.iter_unpack(trunk.get_value(1)):
+                self._add(page_id)
+            trunk_id = trunk.next_page_id
+
+    def __len__(self):
+        self._load()
+        return len(self.ids)
+
+    def __contains__(self, page_id):
+        self._load()
+        return page_id in self.ids
+
+    def push(self, page_id: int):
+        self._load()
+        self._add(page_id)
+        self.changed = True
+
+    # lowest free page id, None when there is none
+    def pop(self):
+        self._load()
+        while self.heap:
+            page_id = heapq.heappop(self.heap)
+            if page_id in self.ids:
+                self.ids.remove(page_id)
+                self.changed = True
+                return page_id
+        return None
+
+    # lowest free page id without taking it, None when there is none
+    def lowest(self):
+        self._load()
+        while self.heap and self.heap[0] not in self.ids:
+            heapq.heappop(self.heap)
+        return self.heap[0] if self.heap else None
+
+    # forget every free page at or after end (the file is being cut there)
+    def drop_from(self, end: int):
+        self._load()
+        self.ids = {page_id for page_id in self.ids if page_id < end}
+        self.heap = sorted(self.ids)
+        self.changed = True
+
+    def _add(self, page_id):
+        if page_id not in self.ids:
+            self.ids.add(page_id)
+            heapq.heappush(self.heap, page_id)
+
+    # write the list to trunk pages and point the superblock at them (nothing to do if it didn't change).
+    # The Pager writes the superblock out right after this, with the trunks
+    def save(self):
+        superblock = self.pager.superblock
+        if not self.changed or superblock is None:
+            return
+        ids = sorted(self.ids)
+        # k trunks hold the other len(ids) - k ids
+        trunk_count = -(-len(ids) // (TRUNK_CAPACITY + 1))
+        trunks, listed = ids[:trunk_count], ids[trunk_count:]
+        for index, trunk_id in enumerate(trunks):
+            trunk = Page(page_id=trunk_id, page_type=PageType.META)
+            trunk.add_value(FREELIST_MAGIC)
+            chunk = listed[index * TRUNK_CAPACITY:(index + 1) * TRUNK_CAPACITY]
+            trunk.add_value(struct.pack(f">{len(chunk)}I", *chunk))
+            trunk.next_page_id = trunks[index + 1] if index + 1 < len(trunks) else NO_PAGE
+            self.pager.install_page(trunk)
+
+        superblock.free_list_head = trunks[0] if trunks else NO_PAGE
+        superblock.free_count = len(ids)
+        self.changed = False
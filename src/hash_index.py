@@ -0,0 +1,293 @@
+# Function: Extendible hash index on top of the Pager, maps bytes keys to record ids (page_id, row_id) for exact-key
+# lookups that cost one bucket page read (a B+tree needs one per level).
+# Key Responsibilities:
+    # search(key) -> (page_id, row_id) | None: hash the key, the directory (kept in memory) names the bucket page.
+    # insert(key, rid): add (or overwrite) a key. A full bucket is split in two (one more hash bit decides which half
+    # an entry goes to), the directory doubles when the bucket already uses every bit it has. Only the entries of the
+    # split bucket move, nothing else is rehashed.
+    # delete(key): remove a key (raises KeyError). Buckets are never merged back, empty overflow pages are freed.
+    # items(): every (key, rid), in no particular order.
+
+# Layout:
+    # META page (the index's page id): slot 0 = HASH_MAGIC | global depth | number of keys, slot 1 = the page ids of the
+    # directory pages.
+    # directory pages (META): one value each, DIRECTORY_PER_PAGE bucket page ids. Entry i of the directory is the bucket
+    # for the keys whose hash ends in the global depth low bits of i. Doubling appends a copy of the directory, so
+    # existing directory pages never move.
+    # bucket pages (HASH_BUCKET): slot 0 = local depth, then (2-byte key length | key | page id | row id) entries sorted
+    # by key (binary search). When a bucket can't split anymore (MAX_GLOBAL_DEPTH) it gets overflow pages of the same
+    # layout through next_page_id.
+
+# Interaction: Pages held across other Pager calls are pinned (same as BTree). Keys are hashed with BLAKE2b so the same
+# key lands in the same bucket in every process (Python's hash() of bytes changes from run to run).
+
+import hashlib
+import struct
+from constants import PAGE_SIZE
+from page import PageType, LEAF_HEADER, SLOT, NO_PAGE
+from btree import encode_entry, entry_key, entry_value
+
+HASH_MAGIC = b"SDBHASH1"
+# global depth | number of keys
+HASH_FIELDS = struct.Struct(">BQ")
+PAGE_ID = struct.Struct(">I")
+RID = struct.Struct(">IH")
+BUCKET_HEADER = struct.Struct(">B")
+# bucket page ids per directory page
+DIRECTORY_PER_PAGE = (PAGE_SIZE - LEAF_HEADER.size - SLOT.size) // PAGE_ID.size
+# directory pages the meta page can list (its second value) caps the directory size
+MAX_DIRECTORY_PAGES = (PAGE_SIZE - LEAF_HEADER.size - 2 * SLOT.size - len(HASH_MAGIC) - HASH_FIELDS.size) // PAGE_ID.size
+MAX_GLOBAL_DEPTH = (MAX_DIRECTORY_PAGES * DIRECTORY_PER_PAGE).bit_length() - 1
+# keys are capped so every bucket holds plenty of them
+MAX_KEY_SIZE = PAGE_SIZE // 8
+
+
+def hash_key(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+class HashIndex:
+
+    def __init__(self, pager, meta_page_id: int):
+        self.pager = pager
+        self.meta_page_id = meta_page_id
+        meta = pager.get_page(meta_page_id)
+        if meta.page_type != PageType.META or meta.slot_count < 2 or bytes(meta.get_value(0)[:len(HASH_MAGIC)]) != HASH_MAGIC:
+            raise ValueError(f"Page {meta_page_id} is not a hash index meta page")
+        self.global_depth, self.count = HASH_FIELDS.unpack_from(meta.get_value(0), len(HASH_MAGIC))
+        self.directory_page_ids = [page_id for (page_id,) in PAGE_ID.iter_unpack(meta.get_value(1))]
+        # the whole directory lives in memory, a lookup only reads its bucket
+        self.directory = []
+        for page_id in self.directory_page_ids:
+            self.directory.extend(page_id for (page_id,) in PAGE_ID.iter_unpack(pager.get_page(page_id).get_value(0)))
+        del self.directory[1 << self.global_depth:]
+
+    # make a new empty index (meta page, one directory page, one bucket) and return it
+    @classmethod
+    def create(cls, pager) -> "HashIndex":
+        bucket = pager.allocate_new_page(PageType.HASH_BUCKET)
+        bucket.add_value(BUCKET_HEADER.pack(0))
+        directory_page = pager.allocate_new_page(PageType.META)
+        directory_page.add_value(PAGE_ID.pack(bucket.page_id))
+        meta = pager.allocate_new_page(PageType.META)
+        meta.add_value(HASH_MAGIC + HASH_FIELDS.pack(0, 0))
+        meta.add_value(PAGE_ID.pack(directory_page.page_id))
+        return cls(pager, meta.page_id)
+
+    def __len__(self):
+        return self.count
+
+    # ---------------------------------------------------------------- reads
+
+    def search(self, key: bytes) -> tuple | None:
+        key = bytes(key)
+        page = self.pager.get_page(self.directory[hash_key(key) & ((1 << self.global_depth) - 1)])
+        while True:
+            index, found = self._position(page, key)
+            if found:
+                return RID.unpack(entry_value(page.get_value(index)))
+            if page.next_page_id == NO_PAGE:
+                return None
+            page = self.pager.get_page(page.next_page_id)
+
+    def items(self):
+        for bucket_id in sorted(set(self.directory)):
+            page_id = bucket_id
+            while page_id != NO_PAGE:
+                page = self.pager.get_page(page_id)
+                # copy the entries out before the next get_page can evict the page
+                entries = [bytes(page.get_value(index)) for index in range(1, page.slot_count)]
+                page_id = page.next_page_id
+                for entry in entries:
+                    yield entry_key(entry), RID.unpack(entry_value(entry))
+
+    # ---------------------------------------------------------------- writes
+
+    # insert key -> rid, an existing key gets its rid replaced
+    def insert(self, key: bytes, rid: tuple):
+        key = bytes(key)
+        if len(key) > MAX_KEY_SIZE:
+            raise ValueError(f"Key too big for simpledb hash index ({len(key)} > {MAX_KEY_SIZE} bytes)")
+        entry = encode_entry(key, RID.pack(*rid))
+        hashed = hash_key(key)
+        while True:
+            pinned = []
+            try:
+                chain = self._pin_chain(self.directory[hashed & ((1 << self.global_depth) - 1)], pinned)
+                positions = []
+                for page in chain:
+                    index, found = self._position(page, key)
+                    if found:
+                        # same key, same size entry: patched in place
+                        page.update_value(index, entry)
+                        return
+                    positions.append(index)
+                for page, index in zip(chain, positions):
+                    if page.has_space(entry):
+                        page.insert_value_at(index, entry)
+                        self._count_keys(1)
+                        return
+
+                local_depth = self._local_depth(chain[0])
+                if local_depth < MAX_GLOBAL_DEPTH:
+                    if local_depth == self.global_depth:
+                        self._double_directory()
+                    self._split(chain, hashed, local_depth, pinned)
+                    # try again, the key's bucket has room now (or gets split again)
+                    continue
+
+                # every hash bit is in use: chain an overflow page
+                overflow = self._new_page(local_depth, pinned)
+                chain[-1].next_page_id = overflow.page_id
+                overflow.insert_value_at(1, entry)
+                self._count_keys(1)
+                return
+            finally:
+                self._unpin_all(pinned)
+
+    # remove key, raises KeyError if it isn't there
+    def delete(self, key: bytes):
+        key = bytes(key)
+        pinned = []
+        try:
+            chain = self._pin_chain(self.directory[hash_key(key) & ((1 << self.global_depth) - 1)], pinned)
+            for position, page in enumerate(chain):
+                index, found = self._position(page, key)
+                if not found:
+                    continue
+                page.remove_value_at(index)
+                self._count_keys(-1)
+                freed = None
+                if position > 0 and page.slot_count == 1:
+                    # an empty overflow page: unlink it
+                    chain[position - 1].next_page_id = page.next_page_id
+                    freed = page.page_id
+                break
+            else:
+                raise KeyError(key)
+        finally:
+            self._unpin_all(pinned)
+        if freed is not None:
+            self.pager.free_page(freed)
+
+    # split a full bucket (chain = its pages) on hash bit local_depth: the keys with that bit set move to a new bucket
+    def _split(self, chain, hashed, local_depth, pinned):
+        entries = [bytes(page.get_value(index)) for page in chain for index in range(1, page.slot_count)]
+        bit = 1 << local_depth
+        stay = [entry for entry in entries if not hash_key(entry_key(entry)) & bit]
+        move = [entry for entry in entries if hash_key(entry_key(entry)) & bit]
+
+        new_bucket = self._new_page(local_depth + 1, pinned)
+        spare = self._fill_chain(chain, stay, local_depth + 1, pinned)
+        self._fill_chain([new_bucket], move, local_depth + 1, pinned)
+
+        # every directory entry that ends in the split bucket's bits plus the new bit now points at the new bucket
+        first = (hashed & (bit - 1)) | bit
+        changed = range(first, len(self.directory), bit << 1)
+        for index in changed:
+            self.directory[index] = new_bucket.page_id
+        self._save_directory({index // DIRECTORY_PER_PAGE for index in changed})
+
+        for page in spare:
+            pinned.remove(page)
+            self.pager.unpin(page.page_id, dirty=page.dirty)
+            self.pager.free_page(page.page_id)
+
+    # rewrite a chain with entries (sorted), growing it with overflow pages as needed; returns the pages left over
+    def _fill_chain(self, chain, entries, local_depth, pinned):
+        entries.sort(key=entry_key)
+        chain = list(chain)
+        used = 0
+        page = None
+        for entry in entries:
+            if page is None or not page.has_space(entry):
+                if used < len(chain):
+                    page = chain[used]
+                    page.clear()
+                    page.add_value(BUCKET_HEADER.pack(local_depth))
+                else:
+                    previous = page
+                    page = self._new_page(local_depth, pinned)
+                    previous.next_page_id = page.page_id
+                    chain.append(page)
+                used += 1
+            page.add_value(entry)
+        if used == 0:
+            chain[0].clear()
+            chain[0].add_value(BUCKET_HEADER.pack(local_depth))
+            used = 1
+        chain[used - 1].next_page_id = NO_PAGE
+        return chain[used:]
+
+    def _double_directory(self):
+        if self.global_depth >= MAX_GLOBAL_DEPTH:
+            raise ValueError("Hash index directory is at its maximum size")
+        old_size = len(self.directory)
+        self.directory.extend(self.directory)
+        self.global_depth += 1
+        # new directory pages for the second half (if it doesn't fit on the last page)
+        needed = -(-len(self.directory) // DIRECTORY_PER_PAGE)
+        while len(self.directory_page_ids) < needed:
+            page = self.pager.allocate_new_page(PageType.META)
+            page.add_value(b"")
+            self.pager.mark_dirty(page.page_id)
+            self.directory_page_ids.append(page.page_id)
+        meta = self.pager.get_page(self.meta_page_id)
+        meta.update_value(1, b"".join(PAGE_ID.pack(page_id) for page_id in self.directory_page_ids))
+        self._save_header(meta)
+        self._save_directory(range(old_size // DIRECTORY_PER_PAGE, needed))
+
+    # write the given directory pages (by position) back from the in-memory directory
+    def _save_directory(self, positions):
+        for position in positions:
+            chunk = self.directory[position * DIRECTORY_PER_PAGE:(position + 1) * DIRECTORY_PER_PAGE]
+            page = self.pager.get_page(self.directory_page_ids[position])
+            page.update_value(0, struct.pack(f">{len(chunk)}I", *chunk))
+            self.pager.mark_dirty(page.page_id)
+
+    def _count_keys(self, delta):
+        self.count += delta
+        self._save_header(self.pager.get_page(self.meta_page_id))
+
+    def _save_header(self, meta):
+        # same size value: patched in place
+        meta.update_value(0, HASH_MAGIC + HASH_FIELDS.pack(self.global_depth, self.count))
+        self.pager.mark_dirty(self.meta_page_id)
+
+    # ---------------------------------------------------------------- helpers
+
+    # binary search a bucket page: (index of the first entry with entry key >= key, whether it is exactly key)
+    @staticmethod
+    def _position(page, key: bytes):
+        low, high = 1, page.slot_count
+        while low < high:
+            middle = (low + high) // 2
+            if entry_key(page.get_value(middle)) < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = low < page.slot_count and entry_key(page.get_value(low)) == key
+        return low, found
+
+    @staticmethod
+    def _local_depth(bucket) -> int:
+        return BUCKET_HEADER.unpack(bucket.get_value(0))[0]
+
+    def _pin_chain(self, page_id, pinned):
+        chain = []
+        while page_id != NO_PAGE:
+            page = self.pager.pin(page_id)
+            pinned.append(page)
+            chain.append(page)
+            page_id = page.next_page_id
+        return chain
+
+    def _new_page(self, local_depth, pinned):
+        page = self.pager.pin(self.pager.allocate_new_page(PageType.HASH_BUCKET).page_id)
+        pinned.append(page)
+        page.add_value(BUCKET_HEADER.pack(local_depth))
+        return page
+
+    def _unpin_all(self, pinned):
+        for page in pinned:
+            self.pager.unpin(page.page_id, dirty=page.dirty)
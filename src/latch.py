@@ -0,0 +1,62 @@
+# Function: Reader-writer latch (short-term lock on an in-memory structure like a page, not a transaction lock).
+# Key Responsibilities:
+    # any number of readers at once, or a single writer
+    # writers don't starve: once a writer is waiting, new readers queue up behind it
+    # read() / write() context managers: with page.latch.read(): ...
+# Not reentrant: a thread holding the latch must not acquire it again (a reader upgrading to writer deadlocks).
+
+# Interaction: Every Page carries one (Page.latch), Pager.reading/Pager.writing pin a page and hold its latch.
+
+import threading
+from contextlib import contextmanager
+
+
+class RWLatch:
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        # threads currently reading, whether someone is writing, and writers waiting for their turn
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    def acquire_read(self):
+        with self.condition:
+            while self.writer or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+
+    def release_read(self):
+        with self.condition:
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writer or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+
+    def release_write(self):
+        with self.condition:
+            self.writer = False
+            self.condition.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
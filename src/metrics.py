@@ -0,0 +1,114 @@
+# Function: Counters and latency histograms for the storage layers, so we can see what the database is doing while it runs
+# (cache hit rate, pages and bytes read/written per second, read latencies, time spent decoding pages and records).
+# Key Responsibilities:
+    # record(name, seconds, size): one timed event (a page read, a flush, a record decode...), counted, added to the
+    # latency histogram of that name and to the name + ".bytes" counter when it moved size bytes.
+    # count(name, amount): plain counter (cache hits, pages flushed...).
+    # snapshot() -> dict: every counter, counters per second since the start (or the last reset) and the latency
+    # percentiles of every event, ready to dump as JSON or feed to a dashboard.
+    # add_tracer(callback): callback(name, seconds, size) is called for every event, for tracing/profiling hooks.
+# Off by default: Pager(metrics=Metrics()) / RecordSerializer(metrics=...) turn it on. Without one the instrumented code
+# only does an "is None" check, the clock isn't even read.
+
+# Event names: pager.hit (count), pager.miss, pager.write_page, pager.flush_all (+ pager.pages_flushed), page.decode,
+# file.read, file.write, serializer.serialize, serializer.deserialize (+ _many for the batch versions)
+
+# Interaction: Filled by the Pager (which hands it to its FileHandlers and the RecordStore's serializer).
+
+import threading
+import time
+
+# latency buckets are powers of two in nanoseconds: bucket b holds [2**(b-1), 2**b) ns, up to ~290 years
+BUCKETS = 64
+
+
+class Histogram:
+
+    def __init__(self):
+        self.buckets = [0] * (BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.buckets[min(int(seconds * 1e9).bit_length(), BUCKETS)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    # upper bound (seconds) of the bucket the q-th fraction of the events falls in (never more than the real max)
+    def percentile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        wanted = q * self.count
+        seen = 0
+        for bucket, events in enumerate(self.buckets):
+            seen += events
+            if seen >= wanted and events:
+                return min((1 << bucket) / 1e9, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_us": self.total / self.count * 1e6 if self.count else 0.0,
+            "p50_us": self.percentile(0.5) * 1e6,
+            "p90_us": self.percentile(0.9) * 1e6,
+            "p99_us": self.percentile(0.99) * 1e6,
+            "max_us": self.max * 1e6,
+        }
+
+
+class Metrics:
+
+    def __init__(self):
+        # several threads report at once (pager I/O pool, scans), the maps are only touched under this lock
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.tracers = []
+        self.started = time.monotonic()
+
+    def add_tracer(self, callback):
+        self.tracers.append(callback)
+
+    def remove_tracer(self, callback):
+        self.tracers.remove(callback)
+
+    def count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, name: str, seconds: float, size: int = None):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+            if size is not None:
+                key = name + ".bytes"
+                self.counters[key] = self.counters.get(key, 0) + size
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+        for tracer in self.tracers:
+            tracer(name, seconds, size)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            counters = dict(self.counters)
+            latency = {name: histogram.summary() for name, histogram in self.histograms.items()}
+        return {
+            "elapsed_s": elapsed,
+            "counters": counters,
+            "per_second": {name: value / elapsed for name, value in counters.items()} if elapsed > 0 else {},
+            "latency": latency,
+        }
+
+    # start over (tracers stay)
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+            self.started = time.monotonic()
@@ -0,0 +1,101 @@
+# Function: Snapshot reads: a reader sees the database exactly as it was at one commit, however long it takes and
+# whatever writers commit in the meantime, without latches and without blocking them.
+# Key Responsibilities:
+    # Snapshot(pager) / pager.snapshot(): start a snapshot at the last commit (WAL mode only).
+    # get_page(page_id) / get_page_async: the page as of the snapshot (read-only, never modify a page it hands out).
+    # num_pages: the page count of the snapshot (from its version of the header page), newer pages don't exist for it.
+    # newer_page(page_id): what ScanCursor asks for, so ScanCursor(snapshot) / RecordStore.at_snapshot(snapshot).scan()
+    # stream a consistent table.
+    # close() (or with pager.snapshot() as snapshot: ...): let checkpoints reclaim the versions it kept alive.
+
+# Versions: the write-ahead log keeps every committed image of a page as a version stamped with its commit's timestamp
+# (wal.py). Writers keep modifying the one cached Page per id and committing as usual, a snapshot never looks at the
+# buffer pool: it takes the newest logged version at or before its timestamp, or the main file when there is none.
+# Garbage collection is the checkpoint: it only copies versions up to the oldest open snapshot into the main file
+# (so the file never shows a snapshot something newer), and once the last snapshot needing the log is closed the log
+# is copied and reset like without snapshots. A long snapshot therefore makes the log grow instead of blocking anybody.
+
+# Interaction: Built on the Pager's WriteAheadLog and FileHandler, read by ScanCursor and RecordStore like a pager.
+
+import asyncio
+from collections import OrderedDict
+from constants import PAGE_SIZE
+from page import Page, PageType
+from superblock import Superblock, HEADER_PAGE_ID
+
+# pages a snapshot keeps decoded for repeated get_page calls (they never change, so any number of hits are safe)
+DEFAULT_SNAPSHOT_CACHE = 64
+
+
+class Snapshot:
+
+    def __init__(self, pager, cache_pages: int = DEFAULT_SNAPSHOT_CACHE):
+        if pager.wal is None:
+            raise ValueError("Snapshots need a write-ahead log (Pager(..., wal=True))")
+        self.pager = pager
+        self.wal = pager.wal
+        self.file_handler = pager.file_handler
+        self.metrics = pager.metrics
+        self.cache_pages = cache_pages
+        self.cache = OrderedDict()
+        self.ts = self.wal.acquire_snapshot()
+        self.closed = False
+
+        # the page count is whatever the header page said at that commit (files without one: what the pager has now)
+        self.num_pages = pager.num_pages
+        superblock = Superblock.read(self.get_page(HEADER_PAGE_ID)) if pager.superblock is not None else None
+        if superblock is not None and superblock.page_count is not None:
+            self.num_pages = superblock.page_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.cache.clear()
+            self.wal.release_snapshot(self.ts)
+
+    # the page as of the snapshot (pages past its end come back blank, like Pager.get_page)
+    def get_page(self, page_id):
+        if self.closed:
+            raise ValueError("Snapshot is closed")
+        page = self.cache.get(page_id)
+        if page is not None:
+            self.cache.move_to_end(page_id)
+            return page
+
+        page = self.newer_page(page_id)
+        if page is None:
+            raw = self.file_handler.read_bytes(page_id * PAGE_SIZE, PAGE_SIZE) if page_id < self.num_pages else b""
+            if not raw:
+                page = Page(page_id=page_id, page_type=PageType.LEAF)
+            else:
+                page = Page.from_bytes(page_id=page_id, raw=raw)
+                # a view of the mapped file: keep our own copy
+                if self.file_handler.zero_copy:
+                    page.detach()
+
+        self.cache[page_id] = page
+        if len(self.cache) > self.cache_pages:
+            self.cache.popitem(last=False)
+        return page
+
+    async def get_page_async(self, page_id):
+        return await asyncio.get_running_loop().run_in_executor(self.io_executor(), self.get_page, page_id)
+
+    # the logged version the snapshot sees, None when the main file is the right one.
+    # Ask this before reading the file: a checkpoint may copy that version into the file and drop it from the log
+    # right after, but it never puts anything newer there while the snapshot is open
+    def newer_page(self, page_id):
+        # fast path: nothing logged for the page (whatever gets logged from now on is newer than the snapshot)
+        if page_id not in self.wal.versions:
+            return None
+        image = self.wal.read_version(page_id, self.ts)
+        return None if image is None else Page.from_bytes(page_id=page_id, raw=image)
+
+    def io_executor(self):
+        return self.pager.io_executor()
@@ -0,0 +1,335 @@
+# Function: ORDER BY and GROUP BY over any number of records, using a fixed amount of memory whatever the input size.
+# Key Responsibilities:
+    # external_sort(records, order_by, memory_limit) -> records in order: sorts memory_limit bytes of records at a time,
+    # writes each sorted run to a temporary page file and k-way merges the runs with a heap (more passes when there
+    # are more runs than fan_in). order_by = ["name", ("age", "desc")], NULLs first ascending and last descending like SQLite.
+    # Stable: records with equal keys keep their input order.
+    # hash_aggregate(records, group_by, aggregates, memory_limit) -> one record per group: groups are aggregated in a
+    # dict until it holds memory_limit bytes, rows of groups that don't fit anymore go to hash partitions on disk, each
+    # partition is aggregated the same way afterwards (with another hash, so a partition too big splits again).
+    # aggregates = {"orders": ("count", None), "total": ("sum", "amount"), ...}: count (None = count(*)), sum, min, max, avg,
+    # NULLs are skipped like in SQL.
+    # Input is any iterable of record dicts (RecordStore.scan, a list..., all with the same columns for external_sort),
+    # output is a generator. Nothing touches the disk while everything fits in memory_limit.
+    # Rows of a RecordStore.scan hold OverflowValue placeholders for spilled values, pointing into the store's file:
+    # pass load_value=store.read_value and they're read as they come in, without it they're refused (ValueError).
+
+# Spilling: a SpillFile is a Pager on a temporary file (removed when the operator finishes or its generator is closed).
+# A run / a partition is a chain of LEAF pages linked through next_page_id, rows serialized with a RecordCodec (big
+# text/blob values go to overflow pages like in a RecordStore). Pages are freed as soon as they're read back, so merge
+# passes and nested partitions reuse the space of what they consume instead of growing the file.
+# Memory: the records buffered (estimated by record_size), plus one page per run being merged or partition being written.
+
+# Interaction: Uses the Pager for the temporary files and RecordSerializer/RecordCodec + overflow.py for the rows.
+
+import heapq
+import os
+import tempfile
+from constants import PAGE_SIZE
+from page import PageType, LEAF_HEADER, SLOT, NO_PAGE
+from pager import Pager
+from record_serializer import RecordSerializer
+from overflow import OverflowValue, spill_values, read_value, free_chain
+
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+# most runs merged at once (every run being merged keeps one decoded page in memory)
+MAX_FAN_IN = 256
+DEFAULT_PARTITIONS = 16
+# partitions of partitions of... a group that keeps landing in a partition with too many others after this many
+# levels is aggregated in memory anyway
+MAX_PARTITION_DEPTH = 8
+# text/blob values longer than this go to overflow pages in the spill file
+SPILL_OVERFLOW_THRESHOLD = PAGE_SIZE // 4
+# biggest serialized row that fits on an empty page next to its slot
+MAX_ROW_SIZE = PAGE_SIZE - LEAF_HEADER.size - SLOT.size
+# pages the spill file's buffer pool holds on top of the ones pinned by writers (overflow chains need a couple)
+SPILL_CACHE_PAGES = 8
+# rough Python overhead of a buffered record (dict, list entry, sort key) and of one value in it
+RECORD_OVERHEAD = 200
+VALUE_OVERHEAD = 50
+DIRECTIONS = ("asc", "desc")
+AGGREGATES = {
+    # name: (initial state, step(state, value) -> state, final(state) -> result)
+    "count": (0, lambda state, value: state if value is None else state + 1, lambda state: state),
+    "sum": (None, lambda state, value: state if value is None else value if state is None else state + value, lambda state: state),
+    "min": (None, lambda state, value: state if value is None or state is not None and state <= value else value, lambda state: state),
+    "max": (None, lambda state, value: state if value is None or state is not None and state >= value else value, lambda state: state),
+    "avg": ((0, 0), lambda state, value: state if value is None else (state[0] + value, state[1] + 1),
+            lambda state: state[0] / state[1] if state[1] else None),
+}
+
+
+# estimated bytes a record takes in memory
+def record_size(record: dict) -> int:
+    size = RECORD_OVERHEAD
+    for value in record.values():
+        size += VALUE_OVERHEAD
+        if isinstance(value, (str, bytes, bytearray)):
+            size += len(value)
+    return size
+
+
+# ------------------------------------------------------------------ sort
+
+# wraps a key part so it sorts the other way round (desc on values that can't be negated, like text)
+class _Descending:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+# key function for order_by: a tuple with a (not NULL, value) pair per column, so NULLs never get compared to values
+def sort_key(order_by):
+    columns = []
+    for column in order_by:
+        direction = "asc"
+        if not isinstance(column, str):
+            column, direction = column
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Sort direction must be one of {DIRECTIONS}, not {direction!r}")
+        columns.append((column, direction == "desc"))
+    if not columns:
+        raise ValueError("order_by needs at least one column")
+
+    def key(record):
+        parts = []
+        for column, descending in columns:
+            value = record.get(column)
+            part = (False, 0) if value is None else (True, value)
+            parts.append(_Descending(part) if descending else part)
+        return tuple(parts)
+    return key
+
+
+def external_sort(records, order_by, memory_limit: int = DEFAULT_MEMORY_LIMIT, temp_dir: str = None,
+                  columns: list[str] = None, fan_in: int = None, load_value=None):
+    # columns: what the spilled rows hold (default: the columns of the first record). Every record must have exactly
+    # these columns, spilled or not, a record that doesn't is a ValueError (spilling would drop or invent values)
+    key = sort_key(order_by)
+    if fan_in is None:
+        fan_in = memory_limit // (2 * PAGE_SIZE)
+    fan_in = max(2, min(fan_in, MAX_FAN_IN))
+    schema = set(columns) if columns else None
+    buffer, used = [], 0
+    spill, runs = None, []
+    try:
+        for record in records:
+            if schema is None:
+                columns, schema = list(record), set(record)
+            elif record.keys() != schema:
+                raise ValueError(f"Record columns {sorted(record)} don't match the sort's columns {sorted(schema)}")
+            record = _loaded(record, columns, load_value)
+            buffer.append(record)
+            used += record_size(record)
+            if used > memory_limit:
+                if spill is None:
+                    spill = SpillFile(columns, temp_dir)
+                buffer.sort(key=key)
+                runs.append(spill.write_run(buffer))
+                buffer, used = [], 0
+
+        buffer.sort(key=key)
+        if spill is None:
+            # it all fit in memory
+            yield from buffer
+            return
+        if buffer:
+            runs.append(spill.write_run(buffer))
+            buffer = []
+
+        # merge fan_in runs into one until a single merge can produce the output
+        while len(runs) > fan_in:
+            runs = [spill.write_run(heapq.merge(*[spill.read_run(run) for run in runs[start:start + fan_in]], key=key))
+                    for start in range(0, len(runs), fan_in)]
+        # heapq.merge takes equal keys from the earlier run first, which keeps the sort stable
+        yield from heapq.merge(*[spill.read_run(run) for run in runs], key=key)
+    finally:
+        if spill is not None:
+            spill.close()
+
+
+# ------------------------------------------------------------------ aggregate
+
+def hash_aggregate(records, group_by: list[str], aggregates: dict, memory_limit: int = DEFAULT_MEMORY_LIMIT,
+                   temp_dir: str = None, partitions: int = DEFAULT_PARTITIONS, load_value=None):
+    group_by = list(group_by)
+    plan = []
+    for name, (function, column) in aggregates.items():
+        if function not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate {function!r}, expected one of {sorted(AGGREGATES)}")
+        if column is None and function != "count":
+            raise ValueError(f"{function}() needs a column")
+        plan.append((name, column) + AGGREGATES[function])
+    if partitions < 2:
+        raise ValueError("hash_aggregate needs at least 2 partitions")
+    # the only columns a spilled row needs
+    columns = list(dict.fromkeys(group_by + [column for _, column, *_ in plan if column is not None]))
+
+    spill = None
+
+    def spill_file():
+        nonlocal spill
+        if spill is None:
+            # every partition being written pins one page
+            spill = SpillFile(columns, temp_dir, cache_pages=partitions + SPILL_CACHE_PAGES)
+        return spill
+
+    # only the columns the aggregation looks at get read from overflow pages
+    records = (_loaded(record, columns, load_value) for record in records)
+    try:
+        yield from _aggregate(records, group_by, plan, columns, memory_limit, partitions, spill_file, 0)
+    finally:
+        if spill is not None:
+            spill.close()
+
+
+def _aggregate(records, group_by, plan, columns, memory_limit, partitions, spill_file, level):
+    groups = {}
+    used = 0
+    writers = None
+    for record in records:
+        key = tuple(record.get(column) for column in group_by)
+        states = groups.get(key)
+        if states is None:
+            if used > memory_limit and level < MAX_PARTITION_DEPTH:
+                # the table is full: groups already in it keep aggregating, rows of new groups wait in a partition
+                if writers is None:
+                    spill = spill_file()
+                    writers = [spill.writer() for _ in range(partitions)]
+                writers[_partition(key, level, partitions)].add({column: record.get(column) for column in columns})
+                continue
+            states = groups[key] = [initial for _, _, initial, _, _ in plan]
+            used += record_size(record) + len(plan) * VALUE_OVERHEAD
+        for index, (_, column, _, step, _) in enumerate(plan):
+            # count(*) counts every row
+            states[index] = step(states[index], True if column is None else record.get(column))
+
+    for key, states in groups.items():
+        result = dict(zip(group_by, key))
+        for (name, _, _, _, final), state in zip(plan, states):
+            result[name] = final(state)
+        yield result
+    groups = None
+
+    if writers is not None:
+        # every partition is complete before the first one is read back (their writers pin pages until then)
+        spill = spill_file()
+        first_page_ids = [writer.finish() for writer in writers]
+        for first_page_id in first_page_ids:
+            yield from _aggregate(spill.read_run(first_page_id), group_by, plan, columns, memory_limit, partitions,
+                                  spill_file, level + 1)
+
+
+# which partition a group's rows go to at a given level. Python's hash is the value itself for small ints and
+# hash((level, key)) is correlated from one level to the next, so the bits get mixed (splitmix64 finalizer) with a
+# different seed per level: a partition that has to split again spreads evenly over the next level's partitions
+def _partition(key, level: int, partitions: int) -> int:
+    mixed = (hash(key) + (level + 1) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    mixed = ((mixed ^ (mixed >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    mixed = ((mixed ^ (mixed >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return (mixed ^ (mixed >> 31)) % partitions
+
+
+# record with the OverflowValue placeholders in columns replaced by load_value(placeholder) (copied, the input isn't
+# changed), a placeholder without load_value is a ValueError: it points into another file than the spill file
+def _loaded(record: dict, columns, load_value) -> dict:
+    loaded = None
+    for column in columns:
+        value = record.get(column)
+        if isinstance(value, OverflowValue):
+            if load_value is None:
+                raise ValueError(f"Column {column!r} holds an OverflowValue, pass load_value (e.g. RecordStore.read_value) to read it")
+            if loaded is None:
+                loaded = dict(record)
+            loaded[column] = load_value(value)
+    return record if loaded is None else loaded
+
+
+# ------------------------------------------------------------------ spill files
+
+class SpillFile:
+
+    def __init__(self, columns: list[str], temp_dir: str = None, cache_pages: int = SPILL_CACHE_PAGES):
+        handle, self.path = tempfile.mkstemp(prefix="simpledb-", suffix=".spill", dir=temp_dir)
+        os.close(handle)
+        self.pager = Pager(self.path, max_cache_size=cache_pages * PAGE_SIZE)
+        self.serializer = RecordSerializer()
+        self.codec = self.serializer.codec(columns, SPILL_OVERFLOW_THRESHOLD)
+
+    def writer(self) -> "RunWriter":
+        return RunWriter(self)
+
+    # write records as a new run, returns its first page id
+    def write_run(self, records) -> int:
+        writer = self.writer()
+        for record in records:
+            writer.add(record)
+        return writer.finish()
+
+    # the records of a run, in the order they were written. Every page (and overflow chain) is freed once it's been read
+    def read_run(self, first_page_id: int):
+        page_id = first_page_id
+        while page_id != NO_PAGE:
+            page = self.pager.get_page(page_id)
+            rows = [self.codec.deserialize(value) for value in page.values if value is not None]
+            page_id = page.next_page_id
+            self.pager.free_page(page.page_id)
+            for row in rows:
+                yield self._load_values(row)
+
+    def _load_values(self, row: dict) -> dict:
+        for column, value in row.items():
+            if isinstance(value, OverflowValue):
+                row[column] = read_value(self.pager, value, self.serializer.encoding)
+                free_chain(self.pager, value.first_page_id)
+        return row
+
+    # nothing in here is worth writing back, just drop the file
+    def close(self):
+        if self.pager.executor is not None:
+            self.pager.executor.shutdown(wait=True)
+        self.pager.file_handler.close()
+        os.remove(self.path)
+
+
+# appends rows to a new chain of pages, keeping the page being filled pinned
+class RunWriter:
+
+    def __init__(self, spill: SpillFile):
+        self.spill = spill
+        self.first_page_id = NO_PAGE
+        self.page = None
+
+    def add(self, record: dict):
+        spill = self.spill
+        data = spill.codec.serialize(spill_values(spill.pager, record, SPILL_OVERFLOW_THRESHOLD, spill.serializer.encoding))
+        if len(data) > MAX_ROW_SIZE:
+            raise ValueError(f"Row too big to spill ({len(data)} > {MAX_ROW_SIZE} bytes)")
+        if self.page is None or not self.page.has_space(data):
+            self._next_page()
+        self.page.add_value(data)
+
+    def _next_page(self):
+        pager = self.spill.pager
+        page = pager.allocate_new_page(PageType.LEAF)
+        pager.pin(page.page_id)
+        if self.page is None:
+            self.first_page_id = page.page_id
+        else:
+            self.page.next_page_id = page.page_id
+            pager.unpin(self.page.page_id, dirty=True)
+        self.page = page
+
+    # done writing, returns the first page id of the run (NO_PAGE if nothing was added)
+    def finish(self) -> int:
+        if self.page is not None:
+            self.spill.pager.unpin(self.page.page_id, dirty=True)
+            self.page = None
+        return self.first_page_id
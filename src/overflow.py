@@ -0,0 +1,148 @@
+# Function: Values too big to sit inside their record (longer than the store's overflow threshold) live in overflow pages.
+# Key Responsibilities:
+    # write_chain(pager, data) -> first page id: cut the value into page sized pieces, one OVERFLOW page each, linked
+    # through next_page_id.
+    # OverflowValue: what a record holds instead of the value (first page, full length, text or blob). Decoding a record
+    # only builds this small placeholder, so scans that don't look at the big column never read its pages.
+    # OverflowReader: file-like reader over a chain (read/readinto, or chunks() for the memoryview of every page),
+    # a 10MB value is streamed page by page instead of being put together in one big bytes.
+    # free_chain(pager, first_page_id): give the pages of a chain back to the pager (deleted/replaced values).
+    # spill_values(pager, record, threshold) / read_value(pager, value): a record's big values to chains and back.
+
+# In the record the column keeps its normal serial type (text/blob with the full length), the body holds a 4-byte
+# pointer to the first overflow page instead of the bytes. Which values spilled is decided by the length alone:
+# anything longer than the threshold (stored with the RecordStore) is a pointer.
+
+# Interaction: RecordStore spills big values on insert/update and hands out readers, RecordCodec encodes/decodes the pointers.
+# The sort/aggregate operators (operators.py) spill big values of the rows they write to their temporary files the same way.
+
+import io
+import struct
+from typing import NamedTuple
+from constants import PAGE_SIZE
+from page import PageType, LEAF_HEADER, SLOT, NO_PAGE
+
+OVERFLOW_POINTER = struct.Struct(">I")
+# bytes of value per overflow page (the page's single slot + header take the rest)
+OVERFLOW_CHUNK = PAGE_SIZE - LEAF_HEADER.size - SLOT.size
+
+
+class OverflowValue(NamedTuple):
+    first_page_id: int
+    # length of the whole value in bytes (encoded bytes for text)
+    length: int
+    text: bool
+
+
+# write data (bytes/bytearray/memoryview) into a new chain of overflow pages, returns the first page id
+# (compress: how the pages are stored in a compressed file, see Pager.set_page_compression)
+def write_chain(pager, data, compress=None) -> int:
+    view = memoryview(data).cast("B")
+    first_page_id = NO_PAGE
+    previous = None
+    for start in range(0, max(len(view), 1), OVERFLOW_CHUNK):
+        page = pager.allocate_new_page(PageType.OVERFLOW)
+        if compress is not None:
+            pager.set_page_compression(page.page_id, compress)
+        page.add_value(view[start:start + OVERFLOW_CHUNK])
+        pager.mark_dirty(page.page_id)
+        if previous is None:
+            first_page_id = page.page_id
+        else:
+            # the previous page may have been evicted by the allocation, get it back before linking
+            previous = pager.get_page(previous)
+            previous.next_page_id = page.page_id
+            pager.mark_dirty(previous.page_id)
+        previous = page.page_id
+    return first_page_id
+
+
+# page ids of a chain, in order
+def chain_pages(pager, first_page_id: int) -> list:
+    page_ids = []
+    page_id = first_page_id
+    while page_id != NO_PAGE:
+        page_ids.append(page_id)
+        page_id = _overflow_page(pager, page_id).next_page_id
+    return page_ids
+
+
+def free_chain(pager, first_page_id: int):
+    for page_id in chain_pages(pager, first_page_id):
+        pager.free_page(page_id)
+
+
+# the record, with every text/blob value longer than threshold bytes written to a new chain and replaced by its
+# OverflowValue (a copy if anything spilled, the record itself otherwise)
+def spill_values(pager, record: dict, threshold: int, encoding: str = "utf-8", compress=None) -> dict:
+    spilled = None
+    for column, value in record.items():
+        if isinstance(value, str):
+            data, text = value.encode(encoding), True
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            data, text = value, False
+        else:
+            continue
+        length = memoryview(data).nbytes
+        if length > threshold:
+            if spilled is None:
+                spilled = dict(record)
+            spilled[column] = OverflowValue(write_chain(pager, data, compress), length, text)
+    return record if spilled is None else spilled
+
+
+# the whole value (str/bytes) behind a placeholder, anything else is returned as is
+def read_value(pager, value, encoding: str = "utf-8"):
+    if not isinstance(value, OverflowValue):
+        return value
+    data = b"".join(OverflowReader(pager, value).chunks())
+    return data.decode(encoding) if value.text else data
+
+
+def _overflow_page(pager, page_id):
+    page = pager.get_page(page_id)
+    if page.page_type != PageType.OVERFLOW:
+        raise ValueError(f"Page {page_id} is not an overflow page")
+    return page
+
+
+# file-like reader over one overflow value: with store.open_value(record["photo"]) as reader: reader.read(65536)...
+class OverflowReader(io.RawIOBase):
+
+    def __init__(self, pager, value: OverflowValue):
+        self.pager = pager
+        self.value = value
+        self.next_page_id = value.first_page_id
+        # the page piece we're reading from and how far into it we are
+        self.chunk = memoryview(b"")
+        self.remaining = value.length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        target = memoryview(buffer).cast("B")
+        filled = 0
+        while filled < len(target) and self._load_chunk():
+            take = min(len(target) - filled, len(self.chunk))
+            target[filled:filled + take] = self.chunk[:take]
+            self.chunk = self.chunk[take:]
+            filled += take
+        return filled
+
+    # every piece as a read-only memoryview of its page image (no copies, one page at a time)
+    def chunks(self):
+        while self._load_chunk():
+            chunk, self.chunk = self.chunk, memoryview(b"")
+            yield chunk
+
+    # make sure self.chunk has bytes left, moving to the next page if needed (False at the end of the value)
+    def _load_chunk(self) -> bool:
+        while not self.chunk:
+            if self.remaining == 0 or self.next_page_id == NO_PAGE:
+                return False
+            page = _overflow_page(self.pager, self.next_page_id)
+            self.chunk = page.get_value(0)[:self.remaining]
+            self.remaining -= len(self.chunk)
+            self.next_page_id = page.next_page_id
+        return True
@@ -1,221 +1,566 @@
 from constants import PAGE_SIZE
 from enum import Enum
 import struct
+import bisect
+import itertools
+from latch import RWLatch
 
 # Enum to distinguish between leaf and internal pages
 class PageType(Enum):
     LEAF = 0
     INTERNAL = 1
+    # bookkeeping pages (tree roots, maps, lists...), same slotted layout as a leaf but never holds user records
+    META = 2
+    # one piece of a value too big for its record (see overflow.py): slotted, a single value, next_page_id links the chain
+    OVERFLOW = 3
+    # hash index bucket (see hash_index.py): slotted, slot 0 = local depth, next_page_id links its overflow pages
+    HASH_BUCKET = 4
+
+# Leaf (and meta) pages are slotted pages, the page image itself is the storage (no per-value Python objects):
+#
+#   | header | slot 0 | slot 1 | ... | -> free space <- | ... record 1 | record 0 |
+#   0        LEAF_HEADER.size                            heap_start                max_size
+#
+# header: page type (1 byte) | slot count (2 bytes) | heap start (2 bytes) | next page id (4 bytes)
+# slot:   record offset (2 bytes) | record length (2 bytes), offset 0 means the slot is deleted (the header lives at 0 so no record can)
+# records are packed from the end of the page towards the slot directory, row_id = slot number
+# next page id links pages into chains (B+tree leaf siblings...), NO_PAGE when there is nothing next
+LEAF_HEADER = struct.Struct(">BHHI")
+SLOT = struct.Struct(">HH")
+NO_PAGE = 0xFFFFFFFF
+
+# Internal pages are prefix-compressed, the part all keys but the first have in common is stored once:
+#
+#   | header | first key | prefix | child 0 | ... | child n-1 | suffix end 1 | ... | suffix end n-1 | suffix 1 | ... |
+#
+# header: page type (1 byte) | entry count (2 bytes) | first key length (2 bytes) | prefix length (2 bytes)
+# key i (i >= 1) = prefix + suffix i, suffix i ends at suffix end i (counted from the start of the suffixes)
+# the first key is apart since the B+tree leaves it empty and it would cut the prefix down to nothing
+# (the count tells real entries apart from the zero padding at the end of the page)
+INTERNAL_HEADER = struct.Struct(">BHHH")
+CHILD_POINTER = struct.Struct(">I")
+SUFFIX_END = struct.Struct(">H")
+
+
+# bytes an internal page needs for count entries: first_key_length, the key_bytes of the other keys, which all share
+# prefix_length bytes
+def internal_size(first_key_length: int, count: int, key_bytes: int, prefix_length: int) -> int:
+    if count == 0:
+        return INTERNAL_HEADER.size
+    stored_keys = key_bytes - (count - 2) * prefix_length if count > 1 else 0
+    return INTERNAL_HEADER.size + first_key_length + count * CHILD_POINTER.size + (count - 1) * SUFFIX_END.size + stored_keys
+
+
+# size of an internal page holding these (key, child_page_id) entries
+def internal_page_size(entries: list) -> int:
+    if not entries:
+        return INTERNAL_HEADER.size
+    keys = [key for key, _ in entries[1:]]
+    return internal_size(len(entries[0][0]), len(entries), sum(map(len, keys)), len(common_prefix(keys)))
+
+
+def common_prefix_length(a: bytes, b: bytes) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+# longest prefix of all keys (the smallest and the biggest one have the least in common)
+def common_prefix(keys: list) -> bytes:
+    if not keys:
+        return b""
+    low, high = min(keys), max(keys)
+    return low[:common_prefix_length(low, high)]
 
 class Page:
-    def __init__(self, page_id: int, max_size: int = PAGE_SIZE, data: bytes = None, page_type: PageType = PageType.LEAF):
-        #page instance is for storing values 
-        self.values = [] 
+    def __init__(self, page_id: int, max_size: int = PAGE_SIZE, data: bytes | memoryview = None, page_type: PageType = PageType.LEAF):
         #all page instances need to be identically sized
-        self.max_size = max_size 
+        self.max_size = max_size
         # identify a given page instance
-        self.page_id = page_id 
-        #keeping track of capacity of the page instnace
-        self.current_size = 0 
+        self.page_id = page_id
+        #keeping track of capacity of the page instnace (bytes in use: header + slots + live records for leaves)
+        self.current_size = 0
         # keep track of deleted slots (disabling fragmentation)
         self.deleted_indices = set()
         # keep track if page has been used or not
-        self.dirty = False 
+        self.dirty = False
         # track if this is a leaf page (holds actual data) or internal page (holds child pointers)
         self.page_type = page_type
-
-        if self.page_type == PageType.LEAF:
-            # for storing record values
-            self.values = []  
-        else:
-            # for storing (key, child_page_id) pairs
-            self.entries = []  
+        # readers/writer latch for threads sharing the cached page (Pager.reading / Pager.writing take it for you)
+        self.latch = RWLatch()
 
         # Give it option to pass data into fresh instance
         if data:
             self._load_from_bytes(data)
+        elif self.page_type != PageType.INTERNAL:
+            # the page image: a bytearray we own, or a read-only view of somebody else's buffer until the first change
+            self.data = bytearray(max_size)
+            self.slot_count = 0
+            self.heap_start = max_size
+            self.next_pid = NO_PAGE
+            self.current_size = LEAF_HEADER.size
+            # set once a view of self.data has been handed out, the next change copies the image first so the view never changes
+            self.exported = False
+            self._write_header()
+        else:
+            # (key, child_page_id) pairs, decoded from image only when somebody needs them as a list
+            self._entries = []
+            # the compressed on-disk image while it's up to date (searched in place), None after a change
+            self.image = None
+            self.entry_count = 0
+            self.first_key = b""
+            self.prefix = b""
+            # length of all keys but the first, prefixes included
+            self.key_bytes = 0
+            # the header is always there
+            self.current_size = INTERNAL_HEADER.size
 
     def has_space(self, value: bytes | tuple) -> bool:
         #track how much memory will we need to add value to a page
-        if self.page_type == PageType.LEAF:
-            value_memory_usage = len(value) + 4
+        if self.page_type != PageType.INTERNAL:
+            # a deleted slot gets reused, otherwise the value needs a new 4-byte slot too
+            value_memory_usage = len(value) + (0 if self.deleted_indices else SLOT.size)
         else:
-            key, _ = value
-            # 2-byte key length + key + 4-byte child pointer
-            value_memory_usage = 2 + len(key) + 4  
+            # appended key: it may cut the shared prefix down
+            return self._size_with(value[0]) <= self.max_size
         return self.current_size + value_memory_usage <= self.max_size
 
 
     def add_value(self, value: bytes | tuple) -> int:
-        # flag the page as modified
-        self.dirty = True
-
         # LEAF flow
-        if self.page_type == PageType.LEAF:
-            value_memory_usage = len(value) + 4
+        if self.page_type != PageType.INTERNAL:
             if not self.has_space(value):
                 raise ValueError("Value too big for simpledb leaf page.")
-            
+
+            # flag the page as modified
+            self.dirty = True
+            self._make_writable()
+
+            # deletes leave holes in the heap, squeeze them out if the free gap in the middle is too small
+            gap_needed = len(value) + (0 if self.deleted_indices else SLOT.size)
+            if self.heap_start - (LEAF_HEADER.size + self.slot_count * SLOT.size) < gap_needed:
+                self._compact()
+
             #if there are deleted indices lets reuse last deleted page_id
             if self.deleted_indices:
                 row_id = self.deleted_indices.pop()
-                #write into the row_id you identified
-                self.values[row_id] = value
+                self.current_size += len(value)
             else:
-                # otherwise append it to the values list
-                self.values.append(value)
-                # assign row_id with value position
-                row_id = len(self.values) - 1
-
-            self.current_size += value_memory_usage
-            return row_id   
-            
+                # otherwise add a slot at the end of the directory
+                row_id = self.slot_count
+                self.slot_count += 1
+                self.current_size += len(value) + SLOT.size
+
+            self.heap_start -= len(value)
+            self.data[self.heap_start:self.heap_start + len(value)] = value
+            SLOT.pack_into(self.data, LEAF_HEADER.size + row_id * SLOT.size, self.heap_start, len(value))
+            self._write_header()
+            return row_id
+
         elif self.page_type == PageType.INTERNAL:
+            # flag the page as modified
+            self.dirty = True
             # value is a tuple: (key, child_page_id)
             key, child_pid = value
-            entry_bytes = 4 + len(key)  # rough estimate
-            self.entries.append((key, child_pid))
-            self.current_size += entry_bytes
-            return len(self.entries) - 1
+            self.current_size = self._size_with(key)
+            self._changed_entries().append((key, child_pid))
+            if self.entry_count == 0:
+                self.first_key = key
+            else:
+                self.prefix = key if self.entry_count == 1 else key[:common_prefix_length(self.prefix, key)]
+                self.key_bytes += len(key)
+            self.entry_count += 1
+            return self.entry_count - 1
 
     #get value from the page given it's row id
     def get_value(self, row_id: int) -> bytes | tuple:
-        
+
         # LEAF flow
-        if self.page_type == PageType.LEAF:
+        if self.page_type != PageType.INTERNAL:
             #Check if this row id is even available (not deleted, not out of index)
-            if row_id >= 0 and row_id < len(self.values) and row_id not in self.deleted_indices:
-                return self.values[row_id]
+            if row_id >= 0 and row_id < self.slot_count and row_id not in self.deleted_indices:
+                # O(1): look up the slot and hand out a view of the record, nothing gets decoded or copied
+                offset, length = SLOT.unpack_from(self.data, LEAF_HEADER.size + row_id * SLOT.size)
+                self.exported = True
+                return memoryview(self.data)[offset:offset + length].toreadonly()
             else:
                 raise IndexError(f"Row id {row_id} not in {self.page_id} or deleted")
         else:
-            if row_id >= 0 and row_id < len(self.entries):
-                return self.entries[row_id]
+            if row_id >= 0 and row_id < self.entry_count:
+                if self._entries is not None:
+                    return self._entries[row_id]
+                return (self.first_key if row_id == 0 else self.prefix + self._suffix(row_id)), self.child_at(row_id)
             else:
                 raise IndexError(f"Entry id {row_id} not in internal page {self.page_id}")
-            
+
+    # (key, child_page_id) pairs of an internal page (decoded on first use, don't modify the list)
+    @property
+    def entries(self) -> list:
+        if self._entries is None:
+            # decoded in bulk: one unpack for all children, one for all suffix ends
+            count = self.entry_count
+            children = struct.unpack_from(">%dI" % count, self.image, self.children_offset)
+            ends = struct.unpack_from(">%dH" % max(count - 1, 0), self.image, self.ends_offset)
+            suffixes = bytes(self.image[self.suffixes_offset:self.suffixes_offset + (ends[-1] if ends else 0)])
+            prefix = self.prefix
+            keys = [self.first_key] if count else []
+            keys.extend(prefix + suffixes[start:end] for start, end in zip((0,) + ends, ends))
+            self._entries = list(zip(keys, children))
+        return self._entries
+
+    # position of the child whose subtree holds key (last entry with entry key <= key, -1 if there is none),
+    # a binary search right on the compressed image: key gets compared to the prefix once, then only suffixes
+    def child_index(self, key: bytes) -> int:
+        if self.image is None:
+            return bisect.bisect_right(self._entries, key, key=lambda entry: entry[0]) - 1
+        if self.entry_count == 0 or key < self.first_key:
+            return -1
+        if self.entry_count == 1:
+            return 0
+        head = key[:len(self.prefix)]
+        if head != self.prefix:
+            # every key but the first starts with the prefix, so key is before or after all of them
+            return 0 if head < self.prefix else self.entry_count - 1
+        rest = key[len(self.prefix):]
+        low, high = 1, self.entry_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._suffix(middle) <= rest:
+                low = middle + 1
+            else:
+                high = middle
+        return low - 1
+
+    # child page id of entry index
+    def child_at(self, index: int) -> int:
+        if self.image is None:
+            return self._entries[index][1]
+        return CHILD_POINTER.unpack_from(self.image, self.children_offset + index * CHILD_POINTER.size)[0]
+
+    def _suffix(self, index: int) -> bytes:
+        end_position = self.ends_offset + (index - 1) * SUFFIX_END.size
+        start = SUFFIX_END.unpack_from(self.image, end_position - SUFFIX_END.size)[0] if index > 1 else 0
+        end = SUFFIX_END.unpack_from(self.image, end_position)[0]
+        return bytes(self.image[self.suffixes_offset + start:self.suffixes_offset + end])
+
+    # page size once key is appended
+    def _size_with(self, key: bytes) -> int:
+        if self.entry_count == 0:
+            return internal_size(len(key), 1, 0, 0)
+        prefix_length = len(key) if self.entry_count == 1 else common_prefix_length(self.prefix, key)
+        return internal_size(len(self.first_key), self.entry_count + 1, self.key_bytes + len(key), prefix_length)
+
+    # the entry list for a change: the image goes stale
+    def _changed_entries(self) -> list:
+        entries = self.entries
+        self.image = None
+        self.dirty = True
+        return entries
+
+    # recompute first key, prefix and size after the entries changed anywhere
+    def _recount(self):
+        entries = self._entries
+        keys = [key for key, _ in entries[1:]]
+        self.entry_count = len(entries)
+        self.first_key = entries[0][0] if entries else b""
+        self.prefix = common_prefix(keys)
+        self.key_bytes = sum(map(len, keys))
+        self.current_size = internal_size(len(self.first_key), self.entry_count, self.key_bytes, len(self.prefix))
+
+    # every slot in row_id order, None for deleted ones (views like get_value, handy for scans and debugging)
+    @property
+    def values(self) -> list:
+        return [None if row_id in self.deleted_indices else self.get_value(row_id) for row_id in range(self.slot_count)]
+
+    # replace the value at row_id, the row id stays the same (same size values are patched in place)
+    def update_value(self, row_id: int, value: bytes):
+        if self.page_type == PageType.INTERNAL:
+            raise NotImplementedError("Update not supported for internal pages")
+        if not (row_id >= 0 and row_id < self.slot_count and row_id not in self.deleted_indices):
+            raise IndexError(f"Row id {row_id} not on {self.page_id} or deleted")
+
+        slot_position = LEAF_HEADER.size + row_id * SLOT.size
+        offset, length = SLOT.unpack_from(self.data, slot_position)
+        if self.current_size - length + len(value) > self.max_size:
+            raise ValueError("Value too big for simpledb leaf page.")
+        self.dirty = True
+        self._make_writable()
+
+        if len(value) == length:
+            self.data[offset:offset + length] = value
+            return
+
+        # different size: the old bytes become a hole and the new value goes to the top of the heap
+        SLOT.pack_into(self.data, slot_position, 0, 0)
+        self.current_size += len(value) - length
+        if self.heap_start - (LEAF_HEADER.size + self.slot_count * SLOT.size) < len(value):
+            self._compact()
+        self.heap_start -= len(value)
+        self.data[self.heap_start:self.heap_start + len(value)] = value
+        SLOT.pack_into(self.data, slot_position, self.heap_start, len(value))
+        self._write_header()
+
+    # bytes that can still be added (a new value also needs a slot unless a deleted one is free)
+    @property
+    def free_space(self) -> int:
+        return self.max_size - self.current_size
+
+    # put a value at position index and shift everything after it up by one (row ids after index change!)
+    # B+tree nodes use this to keep their entries sorted, record pages should stick to add_value
+    def insert_value_at(self, index: int, value: bytes | tuple):
+        if not 0 <= index <= self._count():
+            raise IndexError(f"Position {index} out of range for page {self.page_id}")
+        if self.page_type == PageType.INTERNAL:
+            entries = self._changed_entries()
+            entries.insert(index, value)
+            self._recount()
+            if self.current_size > self.max_size:
+                entries.pop(index)
+                self._recount()
+                raise ValueError("Value too big for simpledb page.")
+            return
+
+        # a new slot is always needed here, deleted slots only get reused by add_value
+        needed = len(value) + SLOT.size
+        if self.current_size + needed > self.max_size:
+            raise ValueError("Value too big for simpledb page.")
+        self.dirty = True
+
+        self._make_writable()
+        if self.heap_start - (LEAF_HEADER.size + self.slot_count * SLOT.size) < needed:
+            self._compact()
+        # slide the slots from index on one place to the right
+        slot_position = LEAF_HEADER.size + index * SLOT.size
+        directory_end = LEAF_HEADER.size + self.slot_count * SLOT.size
+        self.data[slot_position + SLOT.size:directory_end + SLOT.size] = self.data[slot_position:directory_end]
+        self.deleted_indices = {row_id + 1 if row_id >= index else row_id for row_id in self.deleted_indices}
+
+        self.heap_start -= len(value)
+        self.data[self.heap_start:self.heap_start + len(value)] = value
+        SLOT.pack_into(self.data, slot_position, self.heap_start, len(value))
+        self.slot_count += 1
+        self.current_size += needed
+        self._write_header()
+
+    # drop the value at position index and shift everything after it down by one (row ids after index change!)
+    def remove_value_at(self, index: int):
+        if not 0 <= index < self._count():
+            raise IndexError(f"Position {index} out of range for page {self.page_id}")
+        self.dirty = True
+
+        if self.page_type == PageType.INTERNAL:
+            self._changed_entries().pop(index)
+            self._recount()
+            return
+
+        self._make_writable()
+        slot_position = LEAF_HEADER.size + index * SLOT.size
+        directory_end = LEAF_HEADER.size + self.slot_count * SLOT.size
+        offset, length = SLOT.unpack_from(self.data, slot_position)
+        self.data[slot_position:directory_end - SLOT.size] = self.data[slot_position + SLOT.size:directory_end]
+        # the record bytes become a hole in the heap, the next compaction squeezes it out
+        if index in self.deleted_indices:
+            self.current_size -= SLOT.size
+        else:
+            self.current_size -= length + SLOT.size
+        self.deleted_indices = {row_id - 1 if row_id > index else row_id for row_id in self.deleted_indices if row_id != index}
+        self.slot_count -= 1
+        self._write_header()
+
+    # remove everything (next page id and page type stay)
+    def clear(self):
+        self.dirty = True
+        self.deleted_indices = set()
+        if self.page_type == PageType.INTERNAL:
+            self._entries = []
+            self.image = None
+            self._recount()
+            return
+        self._make_writable()
+        self.slot_count = 0
+        self.heap_start = self.max_size
+        self.current_size = LEAF_HEADER.size
+        self._write_header()
+
+    # id of the next page in a chain (leaf siblings, ...), NO_PAGE if this is the last one
+    @property
+    def next_page_id(self) -> int:
+        return self.next_pid
+
+    @next_page_id.setter
+    def next_page_id(self, page_id: int):
+        if self.page_type == PageType.INTERNAL:
+            raise NotImplementedError("Internal pages are not chained")
+        self.dirty = True
+        self._make_writable()
+        self.next_pid = page_id
+        self._write_header()
+
+    # number of slots (deleted ones included) or entries
+    def _count(self) -> int:
+        return self.slot_count if self.page_type != PageType.INTERNAL else self.entry_count
+
     #delete a value at a given row id (keep the row but make value contents null)
     def delete_value(self, row_id: int):
         # not going to support deletion for internal nodes
-        if self.page_type != PageType.LEAF:
+        if self.page_type == PageType.INTERNAL:
             raise NotImplementedError("Delete not supported for internal pages")
 
         #Check if this row id is even available (not deleted, not out of index)
-        if row_id >= 0 and row_id < len(self.values) and row_id not in self.deleted_indices:
+        if row_id >= 0 and row_id < self.slot_count and row_id not in self.deleted_indices:
             # mark this page as modified
             self.dirty = True
-            #record how much space will be freed up upon deletion
-            deleted_value_size = len(self.values[row_id]) + 4 
-            # nullify the value at row_id's location
-            self.values[row_id] = None 
+            self._make_writable()
+            slot_position = LEAF_HEADER.size + row_id * SLOT.size
+            _, deleted_value_size = SLOT.unpack_from(self.data, slot_position)
+            # null the slot, the record bytes stay in the heap until the next compaction
+            SLOT.pack_into(self.data, slot_position, 0, 0)
             # now decrement
-            self.current_size -= deleted_value_size 
+            self.current_size -= deleted_value_size
             #record that you deleted it
-            self.deleted_indices.add(row_id) 
+            self.deleted_indices.add(row_id)
+            # deleted slots at the end of the directory can go away entirely (the ones in the middle have to stay so
+            # the rows after them keep their row ids)
+            while self.slot_count and self.slot_count - 1 in self.deleted_indices:
+                self.slot_count -= 1
+                self.deleted_indices.discard(self.slot_count)
+                self.current_size -= SLOT.size
+            self._write_header()
         else:
             raise IndexError(f"Row id {row_id} not on {self.page_id} or deleted")
 
+    # Replace a view of someone else's buffer (e.g. an mmap) with a private copy.
+    # Must be called before the buffer gets overwritten, otherwise the page would see the new bytes.
+    def detach(self):
+        if self.page_type != PageType.INTERNAL:
+            if not isinstance(self.data, bytearray):
+                self.data = bytearray(self.data)
+        elif self.image is not None and not isinstance(self.image, bytes):
+            self.image = bytes(self.image)
+
+    # copy-on-write: get a bytearray we are allowed to change in place without anyone else seeing it
+    def _make_writable(self):
+        if self.exported or not isinstance(self.data, bytearray):
+            self.data = bytearray(self.data)
+            self.exported = False
+
+    def _write_header(self):
+        LEAF_HEADER.pack_into(self.data, 0, self.page_type.value, self.slot_count, self.heap_start, self.next_pid)
+
+    # move every live record to the end of the page so all free space is in one gap (row ids don't change)
+    def _compact(self):
+        live = []
+        for row_id in range(self.slot_count):
+            if row_id in self.deleted_indices:
+                continue
+            slot_position = LEAF_HEADER.size + row_id * SLOT.size
+            offset, length = SLOT.unpack_from(self.data, slot_position)
+            live.append((slot_position, bytes(self.data[offset:offset + length])))
+
+        self.heap_start = self.max_size
+        for slot_position, record in live:
+            self.heap_start -= len(record)
+            self.data[self.heap_start:self.heap_start + len(record)] = record
+            SLOT.pack_into(self.data, slot_position, self.heap_start, len(record))
+        self._write_header()
+
 
     # Serialize a given page into a bytestream that can be pushed to memory
-    def to_bytes(self) -> bytes:
-        # initialize a byte stream which we will fill with the page's values after serialization
-        byte_list = bytearray()
+    def to_bytes(self) -> bytes | memoryview:
+        # a leaf page already is its own on-disk image, hand out a read-only view of it (the next change copies first)
+        if self.page_type != PageType.INTERNAL:
+            self.exported = True
+            return memoryview(self.data).toreadonly()
 
-        # Add 1-byte page type at the beginning (0 = leaf, 1 = internal)
-        byte_list.append(self.page_type.value)
+        # INTERNAL flow: an unchanged page hands out the image it was loaded from (or encoded to last time)
+        if self.image is None:
+            #Check if the entries are more than a page in gdb (over 4KB)
+            if self.current_size > self.max_size:
+                raise ValueError("Too much content for simpledb's page size")
+            # built in bulk: one pack for all children, one for all suffix ends, one join for the suffixes
+            keys = [key for key, _ in self._entries]
+            skip = len(self.prefix)
+            suffixes = [key[skip:] for key in keys[1:]]
+            count = self.entry_count
+            image = b"".join((
+                INTERNAL_HEADER.pack(self.page_type.value, count, len(self.first_key), skip),
+                self.first_key,
+                self.prefix,
+                struct.pack(">%dI" % count, *[child_pid for _, child_pid in self._entries]),
+                struct.pack(">%dH" % len(suffixes), *itertools.accumulate(map(len, suffixes))),
+                *suffixes,
+            ))
+            self._set_offsets()
+            self.image = image + bytes(self.max_size - len(image))
+        return self.image
 
-        # LEAF flow
-        if self.page_type == PageType.LEAF:
-            # Loop through values and turn them to bytes with prefixes that specify their lengths
-            for i, value in enumerate(self.values):
-                # 0-length prefixes awarded to deleted rows (trade off decision, alternatives too complicated)
-                if i in self.deleted_indices or value is None:
-                    #send 0 to byte stream if values are null    
-                    byte_list.extend((0).to_bytes(4, 'big')) 
-                else:
-                    #record how many values are coming
-                    prefix = len(value) 
-                    #send this prefix and values to bytestream
-                    byte_list.extend(prefix.to_bytes(4, 'big'))
-                    byte_list.extend(value)
-        
-        # INTERNAL flow
-        else:
-            # Look through entries and turn them to bytes with prefixes for key length
-            for key, child_pid in self.entries:
-                key_len = len(key)
-                # Send 2 bytes for key length to bytearray
-                byte_list.extend(key_len.to_bytes(2, 'big'))  
-                byte_list.extend(key)
-                # Send 4-byte child pointer to bytearray
-                byte_list.extend(struct.pack(">I", child_pid))  
-            
-
-        # Create padding for pages that aren't full based on how much space is left out of max_size
-        padding = self.max_size - len(byte_list)
-        #Check if bytestream is more than a page in gdb (over 4KB)
-        if padding < 0: 
-            raise ValueError("Too much content for simpledb's page size")
-        #fill whatever space is left in the bytestream up to 4KB with padding
-        byte_list.extend(b'\x00' * padding) 
-        return bytes(byte_list)
-
-    # Load a page instance from a given bytestream
-    def _load_from_bytes(self, raw: bytes):
+    # where the children, suffix ends and suffixes of an internal page start
+    def _set_offsets(self):
+        self.children_offset = INTERNAL_HEADER.size + len(self.first_key) + len(self.prefix)
+        self.ends_offset = self.children_offset + self.entry_count * CHILD_POINTER.size
+        self.suffixes_offset = self.ends_offset + max(self.entry_count - 1, 0) * SUFFIX_END.size
+
+    # Load a page instance from a given bytestream (bytes or memoryview, slices of a memoryview are views so nothing gets copied)
+    def _load_from_bytes(self, raw: bytes | memoryview):
         # start an index that shows us where in the bytestream we are and set reading cutoff limit
         i = 0
         self.page_type = PageType(raw[i])
         i+=1
 
         # LEAF flow
-        if self.page_type == PageType.LEAF:
-            self.values = []
-            # loop contents of the bytestream (minimum 4 --> if next value = deleted row prefix)
-            while i + 4 <= len(raw):
-                #read prefix and assign it to length and move past it
-                length_bytes = raw[i:i+4]
-                length = int.from_bytes(length_bytes, 'big') 
-                i += 4
-
-                #if value == 0 then this is a deleted row (previous tradeoff decision)
-                if length == 0:
-                    #mark row as null and add it to deleted_indices
-                    self.values.append(None)
-                    self.deleted_indices.add(len(self.values) - 1)
-                    continue
-                # check if prefix+value is longer than bytestream (shouldn't be possible)
-                if i + length > len(raw):
-                    break  # Incomplete value — stop loading
-                
-                # identify value
-                value = raw[i:i+length]
-                # append value to page's values
-                self.values.append(value)
-                #increment size of page
-                self.current_size += length + 4
-                # move index
-                i += length
+        if self.page_type != PageType.INTERNAL:
+            # keep the buffer as is, only the header and the slot directory get looked at
+            if len(raw) < self.max_size:
+                # short image (end of file): pad a private copy up to a full page
+                self.data = bytearray(raw) + bytearray(self.max_size - len(raw))
+            else:
+                self.data = memoryview(raw)[:self.max_size]
+            self.exported = False
+            _, self.slot_count, self.heap_start, self.next_pid = LEAF_HEADER.unpack_from(self.data, 0)
+
+            slot_directory_end = LEAF_HEADER.size + self.slot_count * SLOT.size
+            if slot_directory_end > self.heap_start or self.heap_start > self.max_size:
+                raise ValueError(f"Corrupt slotted page header at page_id={self.page_id}")
+
+            self.deleted_indices = set()
+            self.current_size = slot_directory_end
+            for row_id, (offset, length) in enumerate(SLOT.iter_unpack(self.data[LEAF_HEADER.size:slot_directory_end])):
+                #offset 0 marks a deleted row
+                if offset == 0:
+                    self.deleted_indices.add(row_id)
+                else:
+                    #increment size of page
+                    self.current_size += length
         # INTERNAL flow
-        else:  
-            self.entries = []
-            while i + 2 <= len(raw):
-                key_len = int.from_bytes(raw[i:i+2], 'big')
-                i += 2
-                if i + key_len + 4 > len(raw):
-                    break
-                key = raw[i:i+key_len]
-                i += key_len
-                child_pid = struct.unpack(">I", raw[i:i+4])[0]
-                i += 4
-                self.entries.append((key, child_pid))
-                self.current_size += 4 + key_len + 2
-
-        #mark this page as unmodified as its justy loaded from disk    
+        else:
+            # keep the image, searches read it in place and the entry list only gets decoded when asked for
+            if len(raw) < self.max_size:
+                self.image = bytes(raw) + bytes(self.max_size - len(raw))
+            else:
+                self.image = memoryview(raw)[:self.max_size]
+            self._entries = None
+            _, self.entry_count, first_key_length, prefix_length = INTERNAL_HEADER.unpack_from(self.image, 0)
+            # the first key and prefix get compared a lot, keep them as real bytes even when raw is a view
+            self.first_key = bytes(self.image[INTERNAL_HEADER.size:INTERNAL_HEADER.size + first_key_length])
+            self.prefix = bytes(self.image[INTERNAL_HEADER.size + first_key_length:INTERNAL_HEADER.size + first_key_length + prefix_length])
+            self._set_offsets()
+            if self.suffixes_offset > self.max_size:
+                raise ValueError(f"Corrupt internal page header at page_id={self.page_id}")
+            suffix_bytes = SUFFIX_END.unpack_from(self.image, self.suffixes_offset - SUFFIX_END.size)[0] if self.entry_count > 1 else 0
+            if self.suffixes_offset + suffix_bytes > self.max_size:
+                raise ValueError(f"Corrupt internal page header at page_id={self.page_id}")
+            self.key_bytes = suffix_bytes + (self.entry_count - 1) * prefix_length if self.entry_count > 1 else 0
+            self.current_size = self.suffixes_offset + suffix_bytes
+
+        #mark this page as unmodified as its justy loaded from disk
         self.dirty = False
 
     # Create a page from raw bytes leveraging the init and _load_from_bytes methods
+    # raw can be any buffer, a memoryview is used as is so the page's values point straight into it (zero-copy)
     @staticmethod
-    def from_bytes(page_id: int, raw: bytes, max_size: int = PAGE_SIZE) -> "Page":
+    def from_bytes(page_id: int, raw: bytes | memoryview, max_size: int = PAGE_SIZE) -> "Page":
         if len(raw) == 0:
             raise ValueError(f"Empty page content at page_id={page_id}")
 
@@ -227,7 +572,13 @@ class Page:
         return Page(page_id=page_id, max_size=max_size, data=raw, page_type=page_type)
 
     def __repr__(self):
-        if self.page_type == PageType.LEAF:
-            return f"<LeafPage id={self.page_id} values={len(self.values)} dirty={self.dirty}>"
+        if self.page_type == PageType.META:
+            return f"<MetaPage id={self.page_id} values={self.slot_count} dirty={self.dirty}>"
+        elif self.page_type == PageType.LEAF:
+            return f"<LeafPage id={self.page_id} values={self.slot_count} dirty={self.dirty}>"
+        elif self.page_type == PageType.OVERFLOW:
+            return f"<OverflowPage id={self.page_id} next={self.next_pid} dirty={self.dirty}>"
+        elif self.page_type == PageType.HASH_BUCKET:
+            return f"<HashBucketPage id={self.page_id} values={self.slot_count} next={self.next_pid} dirty={self.dirty}>"
         else:
-            return f"<InternalPage id={self.page_id} entries={len(self.entries)} dirty={self.dirty}>"
+            return f"<InternalPage id={self.page_id} entries={self.entry_count} dirty={self.dirty}>"
@@ -1,80 +1,607 @@
+import asyncio
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from enum import Enum
+from time import perf_counter
 from constants import PAGE_SIZE
-from page import Page, PageType  # Import your Page class
-from file_handler import FileHandler
+from page import Page, PageType, NO_PAGE  # Import your Page class
+from file_handler import FileHandler, MmapFileHandler
+from compression import CompressedFileHandler, has_page_map
+from eviction import ClockPolicy
+from wal import WriteAheadLog
+from freelist import FreeList
+from superblock import Superblock, HEADER_PAGE_ID, FORMAT_VERSION, MAX_ROOT_NAME
+from mvcc import Snapshot
+
+# When do we fdatasync the file? (in WAL mode: whether commit() fsyncs the log, anything but NONE does)
+# Default: COMMIT with a WAL, NONE without one. Pass NONE with a WAL to skip the fsync on purpose (faster commits, a
+# crash or power loss can lose the last commits but never leaves a half-written one behind).
+class SyncPolicy(Enum):
+    # never, leave it to the OS (fastest, a crash can lose recent writes)
+    NONE = 0
+    # at the end of every flush_all
+    FLUSH = 1
+    # only on commit(), so many flushes (e.g. evictions during a bulk insert) share one sync
+    COMMIT = 2
 
 class Pager:
-    def __init__(self, file_path, max_cache_size=100 * PAGE_SIZE):      
-        # use file_handler to work with the file
-        self.file_handler = FileHandler(file_path)
+    def __init__(self, file_path, max_cache_size=100 * PAGE_SIZE, eviction_policy=None, use_mmap=False, sync_policy=None, wal=False, auto_checkpoint=1000, io_workers=4, metrics=None, compression=None):
+        # use file_handler to work with the file (memory mapped one hands out zero-copy views for read-heavy workloads)
+        # compression ("zlib" or a codec, see compression.py) packs the pages of a new file compressed, a file that was
+        # made that way is always opened like that
+        if compression is not None or has_page_map(file_path):
+            if use_mmap:
+                raise ValueError("Compressed files can't be memory mapped")
+            self.file_handler = CompressedFileHandler(file_path, compression)
+        elif use_mmap:
+            self.file_handler = MmapFileHandler(file_path)
+        else:
+            self.file_handler = FileHandler(file_path)
+        # the codec pages go through on their way to the file, None for plain files
+        self.compression = getattr(self.file_handler, "codec", None)
+        # optional metrics.Metrics: counters + latency histograms of page/file I/O (None = off, see metrics_snapshot)
+        self.metrics = metrics
+        self.file_handler.metrics = metrics
+        # in WAL mode pages are never written in place: they are appended to <file>-wal and checkpointed back later.
+        # Opening the log replays whatever the last run committed, so do it before looking at the file size.
+        self.wal = None
+        if sync_policy is None:
+            sync_policy = SyncPolicy.COMMIT if wal else SyncPolicy.NONE
+        if wal:
+            self.wal = WriteAheadLog(file_path + "-wal", self.file_handler, sync=sync_policy != SyncPolicy.NONE, auto_checkpoint=auto_checkpoint)
         self.max_cache_size = max_cache_size
+        # max_cache_size is in bytes, the buffer pool holds whole pages (always room for at least one)
+        self.capacity = max(1, max_cache_size // PAGE_SIZE)
+        # pluggable eviction policy (ClockPolicy, LRUKPolicy or anything with the same methods)
+        self.policy = eviction_policy if eviction_policy is not None else ClockPolicy()
         self.cache = {}
+        # page_id -> number of callers currently holding the page, pinned pages are never evicted
+        self.pin_counts = {}
+        # counters so we can size the cache
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.sync_policy = sync_policy
         # track which pages need to be written to disk due to modification
         self.dirty_pages = set()
-        # track number of pages
-        self.num_pages = self.file_handler.file_size // PAGE_SIZE  
+        # track number of pages (the file size only says how many there are until the header page is read, see below)
+        self.num_pages = self.file_handler.file_size // PAGE_SIZE
+
+        # Threads: self.lock guards the page table (cache, policy, pins, dirty set, counters). File reads on a miss happen
+        # outside of it, pages being read are in self.loading so other threads wait for that read instead of repeating it.
+        # The contents of a page are protected by its own latch (page.latch), see reading()/writing().
+        self.lock = threading.RLock()
+        self.page_loaded = threading.Condition(self.lock)
+        self.loading = set()
+
+        # asyncio front-end (get_page_async, prefetch, flush_async...): blocking I/O runs on a small thread pool,
+        # created the first time it's needed. page_id -> Future of a read that is queued or running on it
+        self.io_workers = io_workers
+        self.executor = None
+        self.pending_reads = {}
+
+        # page 0 is the header page (superblock.py): page count, root pointers, free list head, format. It stays in
+        # memory, so opening a file is this one read no matter how big the file is. A new file starts with one,
+        # files from before it existed have none (self.superblock = None)
+        if self.num_pages == 0:
+            self.superblock = Superblock()
+            self.num_pages = 1
+            self.install_page(self.superblock.new_page())
+            self.saved_superblock = None
+        else:
+            self.superblock = Superblock.read(self.get_page(HEADER_PAGE_ID))
+            if self.superblock is not None and self.superblock.page_count is not None:
+                self.num_pages = self.superblock.page_count
+            # what page 0 holds right now (None = rewrite it on the next flush, format 1 headers get upgraded that way)
+            self.saved_superblock = None
+            if self.superblock is not None and self.superblock.format_version == FORMAT_VERSION:
+                self.saved_superblock = self.superblock.values()
+        # the trunk pages of the free list are only read the first time it's used (see freelist.py)
+        self.free_list = FreeList(self)
+        # the counters are about the caller's traffic, not what opening the file read
+        self.hits = self.misses = 0
 
     # retrieve a Page instance from disk or cache given its location
     def get_page(self, page_id):
-        # return from memory if cached
-        if page_id in self.cache:
-            return self.cache[page_id]
-        
-        # Calculate byte offset in file
-        offset = page_id * PAGE_SIZE
-        file_size = self.file_handler.file_size
-
-        # If the page does NOT exist yet, create new
-        if offset >= file_size:
-            # Make a new blank leaf page
-            page = Page(page_id=page_id, page_type=PageType.LEAF)    
-        
+        with self.lock:
+            while True:
+                # return from memory if cached
+                if page_id in self.cache:
+                    self.hits += 1
+                    self.policy.record_access(page_id)
+                    if self.metrics is not None:
+                        self.metrics.count("pager.hit")
+                    return self.cache[page_id]
+                # another thread is already reading this page: wait for it instead of reading it twice
+                if page_id not in self.loading:
+                    break
+                self.page_loaded.wait()
 
-        else:
-            # else read and deserialize existing page 
-            raw_data = self.file_handler.read_bytes(offset, PAGE_SIZE)
+            self.misses += 1
+            self.loading.add(page_id)
+
+        # the read itself happens without the lock, so misses on different pages overlap (pread releases the GIL)
+        metrics = self.metrics
+        start = perf_counter() if metrics is not None else 0.0
+        try:
+            page = self._load_page(page_id)
+        except BaseException:
+            with self.lock:
+                self.loading.discard(page_id)
+                self.page_loaded.notify_all()
+            raise
 
-            # Create a Page object from the raw data
-            page = Page.from_bytes(page_id=page_id, raw=raw_data)
-        
         # Store in cache and return
-        self.cache[page_id] = page
+        with self.lock:
+            self.loading.discard(page_id)
+            self._cache_page(page)
+            self.page_loaded.notify_all()
+        if metrics is not None:
+            metrics.record("pager.miss", perf_counter() - start, PAGE_SIZE)
+        return page
+
+    # read a page from the log or the file (or make a blank one past the end of the file)
+    def _load_page(self, page_id):
+        # the log holds the newest image of anything written since the last checkpoint
+        logged = self.wal.read_page(page_id) if self.wal is not None else None
+        if logged is not None:
+            return Page.from_bytes(page_id=page_id, raw=logged)
+
+        # If the page does NOT exist yet, create new: num_pages knows where the file ends, no need to ask the OS
+        if page_id >= self.num_pages:
+            # Make a new blank leaf page
+            return Page(page_id=page_id, page_type=PageType.LEAF)
+
+        # else read and deserialize existing page
+        raw_data = self.file_handler.read_bytes(page_id * PAGE_SIZE, PAGE_SIZE)
+        # allocated but never written out (the read ran past the end of the file)
+        if not raw_data:
+            return Page(page_id=page_id, page_type=PageType.LEAF)
+        # Create a Page object from the raw data
+        if self.metrics is None:
+            return Page.from_bytes(page_id=page_id, raw=raw_data)
+        start = perf_counter()
+        page = Page.from_bytes(page_id=page_id, raw=raw_data)
+        self.metrics.record("page.decode", perf_counter() - start)
+        return page
+
+    # the copy of page_id that is newer than the main file: the cached page (peeked at, the eviction policy and the
+    # counters don't see it), then the log. None when the file is up to date (scans use this, see scan.py)
+    def newer_page(self, page_id):
+        page = self.cache.get(page_id)
+        if page is None and self.wal is not None and page_id in self.wal.index:
+            logged = self.wal.read_page(page_id)
+            if logged is not None:
+                page = Page.from_bytes(page_id=page_id, raw=logged)
         return page
 
+    # a consistent read-only view of the last commit that writers never block (WAL mode only, see mvcc.py):
+    #   with pager.snapshot() as snapshot: for rid, record in store.at_snapshot(snapshot).scan(): ...
+    def snapshot(self) -> Snapshot:
+        return Snapshot(self)
+
+    # ---------------------------------------------------------------- asyncio
+
+    # same as get_page, but a miss is read on the I/O pool so the event loop keeps running other coroutines.
+    # Any number of coroutines (and prefetch) asking for the same page share one read.
+    async def get_page_async(self, page_id):
+        with self.lock:
+            if page_id in self.cache:
+                self.hits += 1
+                self.policy.record_access(page_id)
+                if self.metrics is not None:
+                    self.metrics.count("pager.hit")
+                return self.cache[page_id]
+        return await asyncio.wrap_future(self._submit_read(page_id))
+
+    # hint: start reading these pages in the background (no waiting, cached pages and reads in flight are skipped),
+    # returns the futures of the reads it started
+    def prefetch(self, page_ids):
+        started = []
+        for page_id in page_ids:
+            with self.lock:
+                if page_id in self.cache or page_id in self.pending_reads or page_id >= self.num_pages:
+                    continue
+            started.append(self._submit_read(page_id))
+        return started
+
+    async def flush_async(self):
+        await asyncio.get_running_loop().run_in_executor(self.io_executor(), self.flush_all)
+
+    async def commit_async(self):
+        await asyncio.get_running_loop().run_in_executor(self.io_executor(), self.commit)
+
+    # the bounded pool blocking I/O runs on (also used by async scans)
+    def io_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="simpledb-io")
+            return self.executor
+
+    # Future of get_page(page_id) on the I/O pool, reusing the one already queued/running for that page
+    def _submit_read(self, page_id):
+        executor = self.io_executor()
+        with self.lock:
+            future = self.pending_reads.get(page_id)
+            if future is None:
+                future = self.pending_reads[page_id] = executor.submit(self.get_page, page_id)
+                future.add_done_callback(lambda _: self._read_done(page_id, future))
+            return future
+
+    def _read_done(self, page_id, future):
+        with self.lock:
+            if self.pending_reads.get(page_id) is future:
+                del self.pending_reads[page_id]
+
+    # pin a page and hold its latch for reading / writing while the with block runs:
+    #   with pager.reading(page_id) as page: ...     (any number of threads at once)
+    #   with pager.writing(page_id) as page: ...     (alone, and the page is marked dirty afterwards)
+    @contextmanager
+    def reading(self, page_id):
+        page = self.pin(page_id)
+        try:
+            with page.latch.read():
+                yield page
+        finally:
+            self.unpin(page_id)
+
+    @contextmanager
+    def writing(self, page_id):
+        page = self.pin(page_id)
+        try:
+            with page.latch.write():
+                yield page
+        finally:
+            self.unpin(page_id, dirty=True)
+
+    # get a page and keep it in the cache until unpin is called (use for pages you hold across several operations)
+    def pin(self, page_id):
+        while True:
+            page = self.get_page(page_id)
+            with self.lock:
+                # another thread may have evicted it between get_page and here, then just fetch it again
+                if self.cache.get(page_id) is page:
+                    self.pin_counts[page_id] = self.pin_counts.get(page_id, 0) + 1
+                    return page
+
+    def unpin(self, page_id, dirty=False):
+        with self.lock:
+            count = self.pin_counts.get(page_id, 0)
+            if count == 0:
+                raise ValueError(f"Page {page_id} is not pinned")
+            # let the caller report modifications made while the page was pinned
+            if dirty:
+                self.mark_dirty(page_id)
+            if count == 1:
+                del self.pin_counts[page_id]
+            else:
+                self.pin_counts[page_id] = count - 1
+
     def mark_dirty(self, page_id):
         # dirty pages have been modified in cache
-        self.dirty_pages.add(page_id)
+        with self.lock:
+            self.dirty_pages.add(page_id)
 
     def write_page(self, page_id):
-        # Serialize and write a page to disk if it's marked as dirty.
-        # Get the page from cache or load it from disk if not present
-        page = self.cache.get(page_id) or self.get_page(page_id)
-
-        # Only write if it's dirty
-        if page_id in self.dirty_pages:
-            serialized = page.to_bytes()
-            offset = page_id * PAGE_SIZE
+        with self.lock:
+            # Serialize and write a page to disk if it's marked as dirty.
+            # Only write if it's dirty (a dirty page is always cached: it is written out before it can be evicted)
+            if page_id in self.dirty_pages:
+                metrics = self.metrics
+                start = perf_counter() if metrics is not None else 0.0
+                page = self.cache[page_id]
+                serialized = page.to_bytes()
+                offset = page_id * PAGE_SIZE
+                # the page may still point into the mapped region we are about to overwrite
+                if self.file_handler.zero_copy:
+                    page.detach()
 
-            self.file_handler.write_bytes(offset, serialized)
+                if self.wal is not None:
+                    # not committed yet: the log keeps it, the main file only gets it through a checkpoint
+                    self.wal.append([(page_id, serialized)])
+                else:
+                    self.file_handler.write_bytes(offset, serialized)
 
-            self.dirty_pages.remove(page_id)
+                self.dirty_pages.remove(page_id)
+                page.dirty = False
+                if metrics is not None:
+                    metrics.record("pager.write_page", perf_counter() - start, PAGE_SIZE)
 
     def flush_all(self):
+        if self.metrics is None:
+            self._flush_all()
+            return
+        start = perf_counter()
+        flushed = self._flush_all()
+        self.metrics.record("pager.flush_all", perf_counter() - start, flushed * PAGE_SIZE)
+        self.metrics.count("pager.pages_flushed", flushed)
 
-        # Write all dirty pages in cache to disk
-        for page_id in list(self.dirty_pages):
-            self.write_page(page_id)
+    # write out every dirty page, returns how many there were
+    def _flush_all(self):
+        with self.lock:
+            # the free list and the header page go out with the pages they describe
+            self.free_list.save()
+            self._save_superblock()
+
+            # in WAL mode the dirty pages all go to the end of the log in a single write
+            if self.wal is not None:
+                images = self._take_dirty_images()
+                self.wal.append(images)
+                if self.sync_policy == SyncPolicy.FLUSH:
+                    self.wal.file_handler.sync()
+                return len(images)
+
+            flushed = len(self.dirty_pages)
+            # Write all dirty pages in cache to disk: in page order, one vectored write per run of neighbouring pages
+            for run in self._contiguous_runs(sorted(self.dirty_pages)):
+                pages = [self.cache[page_id] for page_id in run]
+                images = [page.to_bytes() for page in pages]
+                # the pages may still point into the mapped region we are about to overwrite
+                if self.file_handler.zero_copy:
+                    for page in pages:
+                        page.detach()
+
+                self.file_handler.write_vectored(run[0] * PAGE_SIZE, images)
+
+                for page in pages:
+                    self.dirty_pages.remove(page.page_id)
+                    page.dirty = False
+
+            if self.sync_policy == SyncPolicy.FLUSH:
+                self.file_handler.sync()
+            return flushed
+
+    # put the current page count (+ roots, free list head...) on page 0 if it differs from what's there
+    def _save_superblock(self):
+        if self.superblock is None:
+            return
+        self.superblock.page_count = self.num_pages
+        values = self.superblock.values()
+        if values == self.saved_superblock:
+            return
+        header = self.get_page(HEADER_PAGE_ID)
+        self.superblock.write_to(header)
+        self.mark_dirty(HEADER_PAGE_ID)
+        self.saved_superblock = values
+
+    # make everything written so far durable (the sync happens here under SyncPolicy.COMMIT)
+    def commit(self):
+        if self.wal is not None:
+            # one append + one fsync for the whole transaction, shared with whoever else commits at the same time
+            # (only collecting the images needs the lock, other threads keep using the pool while we wait for the log)
+            with self.lock:
+                self.free_list.save()
+                self._save_superblock()
+                images = self._take_dirty_images()
+            if images or self.wal.uncommitted:
+                self.wal.commit(images)
+            return
+
+        with self.lock:
+            self.flush_all()
+        if self.sync_policy == SyncPolicy.COMMIT:
+            self.file_handler.sync()
+
+    # copy committed pages from the log into the main file (no-op without a WAL)
+    def checkpoint(self):
+        if self.wal is not None:
+            self.wal.checkpoint()
+
+    # serialize every dirty page and mark them clean: [(page_id, image), ...] in page order
+    def _take_dirty_images(self):
+        images = []
+        for page_id in sorted(self.dirty_pages):
+            page = self.cache[page_id]
+            images.append((page_id, page.to_bytes()))
+            if self.file_handler.zero_copy:
+                page.detach()
+            page.dirty = False
+        self.dirty_pages.clear()
+        return images
+
+    # split sorted page ids into runs of consecutive ids: [1, 2, 3, 7, 8] -> [[1, 2, 3], [7, 8]]
+    @staticmethod
+    def _contiguous_runs(page_ids):
+        runs = []
+        for page_id in page_ids:
+            if runs and runs[-1][-1] == page_id - 1:
+                runs[-1].append(page_id)
+            else:
+                runs.append([page_id])
+        return runs
 
     def allocate_new_page(self, page_type):
-        # Create a new empty page and assign the next available page id
-        page_id = self.num_pages  # Next free page index
-        page = Page(page_id=page_id, page_type=page_type)
-        self.cache[page_id] = page
-        self.dirty_pages.add(page_id)
-        self.num_pages += 1
-        return page
+        with self.lock:
+            # reuse the lowest free page, only grow the file when there is none
+            page_id = self.free_list.pop()
+            if page_id is None:
+                page_id = self.num_pages  # Next free page index
+                self.num_pages += 1
+            # Create a new empty page with that id
+            page = Page(page_id=page_id, page_type=page_type)
+            self.install_page(page)
+            return page
+
+    # put a page built outside the pool in the cache as the current (dirty) version of its id, replacing any cached copy
+    def install_page(self, page):
+        with self.lock:
+            if page.page_id in self.cache:
+                if page.page_id in self.pin_counts:
+                    raise ValueError(f"Page {page.page_id} is pinned, can't replace it")
+                del self.cache[page.page_id]
+                self.policy.remove(page.page_id)
+            self._cache_page(page)
+            self.dirty_pages.add(page.page_id)
+
+    # give a page back: allocate_new_page hands it out again, truncate() cuts it off if it's at the end of the file.
+    # Whatever is in it is gone (nothing gets written, its id just goes on the free list)
+    def free_page(self, page_id):
+        with self.lock:
+            if page_id in self.pin_counts:
+                raise ValueError(f"Page {page_id} is pinned, can't free it")
+            if page_id == HEADER_PAGE_ID and self.superblock is not None or not 0 <= page_id < self.num_pages:
+                raise ValueError(f"Page {page_id} can't be freed")
+            if page_id in self.free_list:
+                raise ValueError(f"Page {page_id} is already free")
+            if page_id in self.cache:
+                # whoever still holds the page keeps a copy, not a view of a region that gets reused or cut off
+                if self.file_handler.zero_copy:
+                    self.cache[page_id].detach()
+                del self.cache[page_id]
+                self.policy.remove(page_id)
+                self.dirty_pages.discard(page_id)
+            self.free_list.push(page_id)
+            # whoever gets the page next decides how it's stored
+            self.set_page_compression(page_id, None)
+
+    # compress=False: keep page_id uncompressed in a compressed file (hot data), True/None: compress it like the rest.
+    # Nothing to do for plain files
+    def set_page_compression(self, page_id, compress):
+        if self.compression is not None:
+            self.file_handler.set_compression(page_id, compress)
+
+    # cut free pages off the end of the file, returns how many pages the file lost
+    def truncate(self):
+        # everything in the main file first (a page still in the log would come back with the next checkpoint)
+        self.commit()
+        # an open snapshot may still read the free pages at the end
+        if self.wal is not None and self.wal.snapshots:
+            return 0
+        self.checkpoint()
+        with self.lock:
+            floor = 1 if self.superblock is not None else 0
+            if self.wal is not None:
+                floor = max(floor, self.wal.max_page_id() + 1)
+            end = self.num_pages
+            while end > floor and end - 1 in self.free_list:
+                end -= 1
+            cut = self.num_pages - end
+            if cut == 0:
+                return 0
+
+            self.free_list.drop_from(end)
+            for page_id in [page_id for page_id in self.cache if page_id >= end]:
+                if page_id in self.pin_counts:
+                    raise ValueError(f"Page {page_id} is pinned, can't truncate it away")
+                # a view past the new end of a memory mapped file would crash whoever reads it (SIGBUS)
+                if self.file_handler.zero_copy:
+                    self.cache[page_id].detach()
+                del self.cache[page_id]
+                self.policy.remove(page_id)
+                self.dirty_pages.discard(page_id)
+            self.num_pages = end
+            self.file_handler.truncate(end * PAGE_SIZE)
+        # the free list on disk may still list (or live in) pages that are gone now
+        self.commit()
+        return cut
+
+    # pages whose newest version isn't in the main file yet: dirty in the buffer pool, or only in the log (committed
+    # but not checkpointed, or not committed). 0 = the main file is up to date, readers/writers of the file itself
+    # (parallel scans, the bulk loader) need that
+    def unwritten_pages(self) -> int:
+        with self.lock:
+            dirty = set(self.dirty_pages)
+        if self.wal is not None:
+            with self.wal.lock:
+                dirty.update(self.wal.versions)
+                dirty.update(self.wal.uncommitted)
+        return len(dirty)
+
+    # hand out the next page id without creating a page, for writers that put pages on disk themselves (bulk loader)
+    def reserve_page(self):
+        with self.lock:
+            page_id = self.num_pages
+            self.num_pages += 1
+            # a blank placeholder cached by an earlier get_page past the end of the file would hide what gets written there
+            if page_id in self.cache and page_id not in self.pin_counts:
+                del self.cache[page_id]
+                self.policy.remove(page_id)
+                self.dirty_pages.discard(page_id)
+            return page_id
+
+    # named root pointers kept on the header page (e.g. "users" -> the META page of that table), None if not set
+    def get_root(self, name: str):
+        if self.superblock is None:
+            return None
+        return self.superblock.roots.get(name)
+
+    # set (page_id = None: remove) a root pointer, saved with the next flush/commit
+    def set_root(self, name: str, page_id):
+        with self.lock:
+            if self.superblock is None:
+                raise ValueError("This file has no header page, it can't hold root pointers")
+            if len(name.encode("utf-8")) > MAX_ROOT_NAME:
+                raise ValueError(f"Root name {name!r} is longer than {MAX_ROOT_NAME} bytes")
+            if page_id is None:
+                self.superblock.roots.pop(name, None)
+            else:
+                self.superblock.roots[name] = page_id
+
+    # where the schema catalog lives (NO_PAGE until somebody sets it), saved with the next flush/commit
+    @property
+    def catalog_page_id(self):
+        return self.superblock.catalog_page_id if self.superblock is not None else NO_PAGE
+
+    @catalog_page_id.setter
+    def catalog_page_id(self, page_id):
+        with self.lock:
+            if self.superblock is None:
+                raise ValueError("This file has no header page, it can't hold the catalog location")
+            self.superblock.catalog_page_id = page_id
+
+    # hit/miss/eviction counters plus current occupancy of the buffer pool
+    @property
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "cached_pages": len(self.cache),
+                "pinned_pages": len(self.pin_counts),
+                "dirty_pages": len(self.dirty_pages),
+                "free_pages": len(self.free_list),
+                "capacity": self.capacity,
+            }
+
+    # metrics.snapshot() (counters, rates, latency percentiles) + the buffer pool stats under "cache"
+    def metrics_snapshot(self):
+        snapshot = self.metrics.snapshot() if self.metrics is not None else {}
+        snapshot["cache"] = self.stats
+        return snapshot
+
+    # put a freshly loaded/created page in the cache, evicting first if the pool is full
+    def _cache_page(self, page):
+        while len(self.cache) >= self.capacity:
+            self._evict_one()
+        self.cache[page.page_id] = page
+        self.policy.insert(page.page_id)
+
+    def _evict_one(self):
+        victim = self.policy.choose_victim(lambda page_id: page_id not in self.pin_counts)
+        if victim is None:
+            raise RuntimeError(f"Buffer pool is full: all {len(self.cache)} cached pages are pinned")
+
+        # write dirty victims through before dropping them (page.dirty catches edits nobody reported via mark_dirty)
+        if self.cache[victim].dirty:
+            self.mark_dirty(victim)
+        self.write_page(victim)
+
+        del self.cache[victim]
+        self.policy.remove(victim)
+        self.evictions += 1
 
     def close(self):
+        # let queued reads/prefetches finish before the file goes away
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
         # write all dirty pages to disk and close the file
-        self.flush_all()
+        self.commit()
+        if self.wal is not None:
+            self.wal.close()
         self.file_handler.close()
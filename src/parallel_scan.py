@@ -0,0 +1,123 @@
+# Function: Scans that use every core: the page range of the file is cut into pieces and a process pool scans them.
+# Decoding pages and records is pure Python (one core per process because of the GIL), so a scan only scales across processes.
+# Key Responsibilities:
+    # parallel_scan(store, predicate): every (rid, record) of a RecordStore for which predicate(record) is true.
+    # parallel_aggregate(store, initial, step, combine, predicate): fold the records per worker with step, merge the
+    # partial results with combine. Only matching rows / partial results travel back to the parent, never pages.
+# Each worker opens the file itself (read-only FileHandler) and reads its pages with a ScanCursor (big sequential reads).
+# predicate/step/combine are sent to other processes, so they have to be picklable (module level functions, not lambdas).
+
+# Interaction: Uses RecordStore (which pages hold records), ScanCursor and RecordSerializer in the workers.
+# Workers only see what is in the main file: the scan refuses (ValueError) to run while the pager has changes that
+# aren't there yet (dirty pages, log frames not checkpointed) or open snapshots (a checkpoint can't bring the main file
+# up to date under them). Commit + checkpoint first, the scan never does that for the caller.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from constants import PAGE_SIZE
+from file_handler import FileHandler
+from compression import CompressedFileHandler
+from record_serializer import RecordSerializer
+from scan import ScanCursor, DEFAULT_READAHEAD
+
+# page ranges per worker: more, smaller ranges even out workers that got slow pages
+RANGES_PER_WORKER = 4
+
+
+def parallel_scan(store, predicate=None, workers: int = None, readahead: int = DEFAULT_READAHEAD) -> list:
+    parts = _run(store, predicate, None, None, workers, readahead)
+    return [row for part in parts for row in part]
+
+
+def parallel_aggregate(store, initial, step, combine, predicate=None, workers: int = None, readahead: int = DEFAULT_READAHEAD):
+    parts = _run(store, predicate, initial, step, workers, readahead)
+    return reduce(combine, parts)
+
+
+def _run(store, predicate, initial, step, workers, readahead):
+    pager = store.pager
+    _check_main_file(pager)
+
+    workers = workers or os.cpu_count() or 1
+    num_pages = pager.num_pages
+    ranges = _split(num_pages, workers * RANGES_PER_WORKER)
+    if not ranges:
+        return [initial] if step is not None else []
+
+    # which pages of each range hold records (the store's free-space map only lives in this process)
+    tasks = []
+    for start, end in ranges:
+        record_pages = bytes(1 if store.level_of(page_id) else 0 for page_id in range(start, end))
+        tasks.append((pager.file_handler.file_path, pager.compression, store.columns, store.serializer.encoding, store.overflow_threshold,
+                      start, end, record_pages, predicate, initial, step, readahead))
+
+    # spawn rather than fork: the parent has threads running (WAL checkpointer, I/O pool), forking those isn't safe
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(_scan_range, tasks))
+
+
+# workers read the main file, so everything has to be there (not in the cache or the log)
+def _check_main_file(pager):
+    if pager.wal is not None and pager.wal.snapshots:
+        raise ValueError("Snapshots are open, the main file can't be brought up to date for a parallel scan")
+    unwritten = pager.unwritten_pages()
+    if unwritten:
+        raise ValueError(f"{unwritten} pages aren't in the main file yet, commit and checkpoint before a parallel scan")
+
+
+# cut [0, num_pages) into at most pieces ranges of (nearly) the same size
+def _split(num_pages, pieces):
+    pieces = max(1, min(pieces, num_pages))
+    size, extra = divmod(num_pages, pieces)
+    ranges = []
+    start = 0
+    for index in range(pieces):
+        end = start + size + (1 if index < extra else 0)
+        if end > start:
+            ranges.append((start, end))
+        start = end
+    return ranges
+
+
+# what ScanCursor needs from a pager: the file, its page count and no newer copies (no cache, no log)
+# (compression: the pager's codec, a compressed file is read through its page map)
+class _ReadOnlyFile:
+
+    def __init__(self, file_path, compression=None):
+        if compression is not None:
+            self.file_handler = CompressedFileHandler(file_path, compression, read_only=True)
+        else:
+            self.file_handler = FileHandler(file_path, read_only=True)
+        self.num_pages = self.file_handler.file_size // PAGE_SIZE
+
+    def newer_page(self, page_id):
+        return None
+
+
+# runs in a worker process: scan one page range, return the matching rows or the folded partial result
+def _scan_range(task):
+    file_path, compression, columns, encoding, overflow_threshold, start, end, record_pages, predicate, initial, step, readahead = task
+    source = _ReadOnlyFile(file_path, compression)
+    # spilled values stay OverflowValue placeholders, workers never read overflow pages
+    codec = RecordSerializer(encoding).codec(columns, overflow_threshold)
+    rows = []
+    accumulator = initial
+    try:
+        for page in ScanCursor(source, start, end, readahead):
+            if not record_pages[page.page_id - start]:
+                continue
+            for row_id, value in enumerate(page.values):
+                if value is None:
+                    continue
+                record = codec.deserialize(value)
+                if predicate is not None and not predicate(record):
+                    continue
+                if step is None:
+                    rows.append(((page.page_id, row_id), record))
+                else:
+                    accumulator = step(accumulator, record)
+    finally:
+        source.file_handler.close()
+    return rows if step is None else accumulator
@@ -3,16 +3,32 @@
     # serialize(record: dict) -> bytes: Takes a Python dictionary (your "row") and turns it into a byte string. You'll need to decide on a format (e.g., length-prefixed strings, fixed-size integers).
         # Use varints for header size, and serial types
     # deserialize(data: bytes) -> dict: Takes a byte string from disk and reconstructs the Python dictionary.
+    # serialize_many / deserialize_many: batch versions that go through a RecordCodec compiled once per column list.
+    # codec(columns).projection(columns, where): decode only some columns of the rows matching a filter (Projection).
+    # metrics (optional metrics.Metrics): serializer.serialize / serializer.deserialize latency and bytes, codecs share it.
 
 # Interaction: The RecordStore will use the RecordSerializer whenever it needs to write a record to disk or read one from disk.
 
 import constants
+import operator
 import struct
+from array import array
+from time import perf_counter
+from overflow import OverflowValue, OVERFLOW_POINTER
+
+# NumPy is optional, only deserialize_many(columnar="numpy") needs it
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class RecordSerializer:
 
-    def __init__(self,encoding = 'utf-8'):
+    def __init__(self,encoding = 'utf-8', metrics=None):
         self.encoding = encoding
+        self.metrics = metrics
+        # compiled RecordCodec per column list (see codec())
+        self.codecs = {}
 
 # I want to mimic record stores in SQLite meaning we have an integer --> type mapping that shows us which datatype a given bytestream should be in
 
@@ -28,6 +44,8 @@ class RecordSerializer:
 # 8	0	Value is the integer 0. (Only available for schema format 4 and higher.)
 # 9	0	Value is the integer 1. (Only available for schema format 4 and higher.)
 # 10,11	variable	Reserved for internal use. These serial type codes will never appear in a well-formed database file, but they might be used in transient and temporary database files that SQLite sometimes generates for its own use. The meanings of these codes can shift from one release of SQLite to the next.
+#   -> we use them for booleans: 10 is False and 11 is True, 0 bytes of content (so flags cost just their header byte)
+# Ints get the smallest type that holds them (0 and 1 cost no body bytes at all, then 1, 2, 3, 4, 6 or 8 bytes), see encode_int
 # N≥12 and even	(N-12)/2	Value is a BLOB that is (N-12)/2 bytes in length.
 # N≥13 and odd	(N-13)/2	Value is a string in the text encoding and (N-13)/2 bytes in length. The nul terminator is not stored.
 
@@ -60,26 +78,34 @@ class RecordSerializer:
         return bytes((chunks_list))
     
     @staticmethod
-    def decode_varint(data: bytes) -> int:
+    def decode_varint(data: bytes, offset: int = 0) -> int:
+        # start reading at offset instead of making callers slice data[cursor:] (a full copy every time)
+        # returns (value, number of bytes the varint used)
+        byte = data[offset]
+        # single 7 bit chunk, by far the common case
+        if byte < 128:
+            return byte, 1
+
         # initialize the future n (sum of all bytes)
         result_sum = 0
         # start tracker to see how many 7_bit chunks have been used
         chunk_position = 0
 
-        for i, byte in enumerate(data):
-            # get the last 7 bits from the bytes
-            value = byte % 128  
-            # add it to the future n (result_sum)
-            result_sum += value * (128 ** chunk_position)
+        for i in range(offset, len(data)):
+            byte = data[i]
+            # add the last 7 bits of the byte to the future n (result_sum), shifted into place
+            result_sum |= (byte & 127) << (7 * chunk_position)
             # if 8th position bit is 0, we just processed last 7 bit chunk and are done
-            if byte < 128:  
-                return result_sum, i + 1
+            if byte < 128:
+                return result_sum, i - offset + 1
             # adjust the 7 bit chunk that you are on
             chunk_position += 1
 
     # Now that we have the function to encode an int into as few hexadecimals as possible we can start encoding and serializing a record into a bytestream
     def serialize(self, record: dict) -> bytes:
-                    
+        metrics = self.metrics
+        start = perf_counter() if metrics is not None else 0.0
+
         header_fields = []
         body = []
 
@@ -88,9 +114,13 @@ class RecordSerializer:
                 serial_type = constants.SERIAL_RECORD_NULL
                 body_bytes = b''
 
+            # bool before int, since a bool is also an int
+            elif isinstance(value, bool):
+                serial_type = constants.SERIAL_RECORD_TRUE if value else constants.SERIAL_RECORD_FALSE
+                body_bytes = b''
+
             elif isinstance(value, int):
-                serial_type = constants.SERIAL_RECORD_INT
-                body_bytes = value.to_bytes(serial_type, 'big', signed=True)
+                serial_type, body_bytes = encode_int(value)
 
             elif isinstance(value, float):
                 serial_type = constants.SERIAL_RECORD_FLOAT
@@ -101,10 +131,9 @@ class RecordSerializer:
                 serial_type = 13 + len(encoded) * 2  # odd => text
                 body_bytes = encoded
 
-            elif isinstance(value, bool):
-                value = int(value)
-                serial_type = constants.SERIAL_RECORD_INT
-                body_bytes = value.to_bytes(serial_type, 'big', signed=True)
+            elif isinstance(value, (bytes, bytearray, memoryview)):
+                body_bytes = bytes(value)
+                serial_type = 12 + len(body_bytes) * 2  # even => blob
 
             else:
                 raise TypeError(f"No support for type: {type(value)} yet")
@@ -115,63 +144,483 @@ class RecordSerializer:
         # Header size = size of all serial type varints + varint(header_size)
         # take header fields and turn them from list to bytestream
         header_bytestream = b''.join(header_fields)
-        # Get total header size to encode
-        header_size = len(header_bytestream) + 1 #here we are assuming that we won't have more than 128 columns so header_length is always 1 byte long
-
-        full_header = self.encode_varint(header_size) + header_bytestream
 
-        return full_header + b''.join(body)
+        data = encode_header(header_bytestream) + b''.join(body)
+        if metrics is not None:
+            metrics.record("serializer.serialize", perf_counter() - start, len(data))
+        return data
     
     def deserialize(self,bytestream:bytes, columns: list[str]) -> dict:
-        # extract header size and how much to offset the data to find serial types
-        header_size, offset = self.decode_varint(bytestream)
-        # use cursor
-        cursor = offset
-        # locate serial_types
-        decoded_serial_types = []
-
-        # while cursor is less than header_size
-        while cursor < header_size:
-            serial_type, n_bytes = self.decode_varint(bytestream[cursor:])
-            decoded_serial_types.append(serial_type)
-            cursor += n_bytes
-
-        record = {}
-        body = bytestream[header_size:]
-        body_cursor = 0
-
-        for i,serial_type in enumerate(decoded_serial_types):
-            
-            if serial_type == constants.SERIAL_RECORD_NULL:
-                value = None
-            
-            # string will always be more than 13 because its 13 + len(encoded) * 2
-            elif serial_type >= 13:
-                
-                # get true length and true value
-                value_size = (serial_type - 13) // 2
-                byte_value = body[body_cursor:body_cursor+value_size]
-                value = byte_value.decode(self.encoding)
-                
-                body_cursor += value_size
-
-            elif serial_type == constants.SERIAL_RECORD_INT:
-                
-                # get true length and true value
-                value_size = constants.SERIAL_RECORD_INT
-                byte_value = body[body_cursor:body_cursor+value_size]
-                value = int.from_bytes(byte_value,'big')
-                
-                body_cursor+=value_size
-            
-            elif serial_type == constants.SERIAL_RECORD_FLOAT:
-                # get true length and true value --> float always has 8 when packed as struct.pack('>d',{float_value})
-                value_size = 8
-                byte_value = body[body_cursor:body_cursor+value_size]
-                value = struct.unpack('>d',byte_value)[0]
-
-                body_cursor +=8
-
-            record[columns[i]] = value
-
-        return record
\ No newline at end of file
+        # the compiled codec does the work (header parsing + one struct unpack for the whole body)
+        return self.codec(columns).deserialize(bytestream)
+
+    # batch versions, see RecordCodec
+    def serialize_many(self, records, columns: list[str] = None) -> list[bytes]:
+        if columns is None:
+            return [self.serialize(record) for record in records]
+        return self.codec(columns).serialize_many(records)
+
+    def deserialize_many(self, bytestreams, columns: list[str], columnar=False):
+        return self.codec(columns).deserialize_many(bytestreams, columnar)
+
+    # the codec for a column list (and overflow threshold, see RecordCodec), compiled the first time it's asked for
+    def codec(self, columns, overflow_threshold: int = None) -> "RecordCodec":
+        key = (tuple(columns), overflow_threshold)
+        codec = self.codecs.get(key)
+        if codec is None:
+            codec = self.codecs[key] = RecordCodec(columns, self.encoding, overflow_threshold, self.metrics)
+        return codec
+
+
+# Function: A record encoder/decoder compiled once for one schema (a fixed list of columns).
+# Key Responsibilities:
+    # serialize(record) / deserialize(data): same format as RecordSerializer, but values are written in column order
+    # (missing columns become NULL) instead of the dict's own order.
+    # overflow_threshold: text/blob values longer than this live in overflow pages (see overflow.py), the record holds
+    # an OverflowValue (4-byte pointer in the body) for them. None = no overflow, every value is stored inline.
+    # serialize_many(records) / deserialize_many(bytestreams, columnar): batch versions, deserialize_many can return
+    # one array per column (array.array, or NumPy arrays when columnar="numpy") instead of a dict per row.
+# The header (the serial types) decides the layout of the whole body, so for every distinct header we build one
+# struct.Struct covering all the fixed-width columns and text/blob columns ('<n>s') and cache it: decoding a row is then a
+# dict lookup + one unpack_from on a memoryview, no per-value type dispatch and no slicing copies.
+# Rows with the same fixed-width types (and same text lengths) share a header, so a handful of plans cover a table.
+
+# struct code for each fixed-width serial type (the 24 and 48 bit ints have none, they're read as bytes + int.from_bytes)
+FIXED_FORMATS = {
+    1: "b",
+    2: "h",
+    4: "i",
+    6: "q",
+    constants.SERIAL_RECORD_FLOAT: "d",
+}
+# serial types with no body bytes and the value they stand for
+CONSTANT_VALUES = {
+    constants.SERIAL_RECORD_NULL: None,
+    constants.SERIAL_RECORD_ZERO: 0,
+    constants.SERIAL_RECORD_ONE: 1,
+    constants.SERIAL_RECORD_FALSE: False,
+    constants.SERIAL_RECORD_TRUE: True,
+}
+# body size of the odd-sized ints
+ODD_INT_SIZES = {3: 3, 5: 6}
+# how many header plans a codec keeps before starting over (text lengths make headers vary)
+MAX_CACHED_PLANS = 4096
+
+# column arrays for deserialize_many(columnar=True): typecode per Python type, anything else stays a list
+ARRAY_TYPECODES = {int: "q", float: "d"}
+
+
+class RecordCodec:
+
+    def __init__(self, columns, encoding: str = "utf-8", overflow_threshold: int = None, metrics=None):
+        self.columns = tuple(columns)
+        self.encoding = encoding
+        self.overflow_threshold = overflow_threshold
+        self.metrics = metrics
+        # header bytes -> (struct covering the body, post-processing per unpacked field)
+        self.plans = {}
+        # type of a value -> function returning (serial type, body bytes), looked up once per value instead of an isinstance chain
+        self.encoders = {
+            type(None): lambda value: (constants.SERIAL_RECORD_NULL, b""),
+            int: encode_int,
+            bool: lambda value: (constants.SERIAL_RECORD_TRUE if value else constants.SERIAL_RECORD_FALSE, b""),
+            float: lambda value: (constants.SERIAL_RECORD_FLOAT, struct.pack(">d", value)),
+            str: self._encode_text,
+            bytes: self._encode_blob,
+            bytearray: self._encode_blob,
+            memoryview: self._encode_blob,
+            OverflowValue: self._encode_overflow,
+        }
+
+    # ---------------------------------------------------------------- encoding
+
+    def serialize(self, record: dict) -> bytes:
+        metrics = self.metrics
+        start = perf_counter() if metrics is not None else 0.0
+        header_fields = []
+        body = []
+        for column in self.columns:
+            value = record.get(column)
+            encoder = self.encoders.get(type(value))
+            if encoder is None:
+                raise TypeError(f"No support for type: {type(value)} yet")
+            serial_type, body_bytes = encoder(value)
+            header_fields.append(serial_type)
+            body.append(body_bytes)
+
+        header = b"".join([bytes([t]) if t < 128 else RecordSerializer.encode_varint(t) for t in header_fields])
+        data = encode_header(header) + b"".join(body)
+        if metrics is not None:
+            metrics.record("serializer.serialize", perf_counter() - start, len(data))
+        return data
+
+    def serialize_many(self, records) -> list[bytes]:
+        serialize = self.serialize
+        return [serialize(record) for record in records]
+
+    def _encode_text(self, value):
+        encoded = value.encode(self.encoding)
+        self._check_inline(len(encoded))
+        return 13 + len(encoded) * 2, encoded
+
+    def _encode_blob(self, value):
+        value = bytes(value)
+        self._check_inline(len(value))
+        return 12 + len(value) * 2, value
+
+    # a spilled value: its real serial type + a pointer to the first overflow page
+    def _encode_overflow(self, value):
+        if self.overflow_threshold is None or value.length <= self.overflow_threshold:
+            raise ValueError(f"Overflow value of {value.length} bytes is below the overflow threshold")
+        return (13 if value.text else 12) + value.length * 2, OVERFLOW_POINTER.pack(value.first_page_id)
+
+    # above the threshold the length alone says "pointer", so such a value can't be stored inline
+    def _check_inline(self, length):
+        if self.overflow_threshold is not None and length > self.overflow_threshold:
+            raise ValueError(f"Value of {length} bytes is over the overflow threshold, write it to overflow pages first")
+
+    # ---------------------------------------------------------------- decoding
+
+    def deserialize(self, bytestream) -> dict:
+        if self.metrics is None:
+            return dict(zip(self.columns, self._decode(bytestream)))
+        start = perf_counter()
+        record = dict(zip(self.columns, self._decode(bytestream)))
+        self.metrics.record("serializer.deserialize", perf_counter() - start, len(bytestream))
+        return record
+
+    # columnar=False: a list of dicts. columnar=True (or "array"): {column: array.array or list},
+    # columnar="numpy": {column: numpy array} (needs NumPy installed)
+    # (with metrics: one serializer.deserialize_many event per batch, decoding the rows is what gets timed)
+    def deserialize_many(self, bytestreams, columnar=False):
+        decode = self._decode
+        metrics = self.metrics
+        if metrics is not None:
+            bytestreams = list(bytestreams)
+            start = perf_counter()
+        if not columnar:
+            columns = self.columns
+            records = [dict(zip(columns, decode(data))) for data in bytestreams]
+            if metrics is not None:
+                metrics.record("serializer.deserialize_many", perf_counter() - start, sum(len(data) for data in bytestreams))
+            return records
+
+        rows = [decode(data) for data in bytestreams]
+        if metrics is not None:
+            metrics.record("serializer.deserialize_many", perf_counter() - start, sum(len(data) for data in bytestreams))
+        values_per_column = list(zip(*rows)) if rows else [() for _ in self.columns]
+        if columnar == "numpy":
+            if numpy is None:
+                raise ImportError("columnar='numpy' needs NumPy installed")
+            return {column: self._numpy_column(values) for column, values in zip(self.columns, values_per_column)}
+        return {column: self._array_column(values) for column, values in zip(self.columns, values_per_column)}
+
+    # row values (tuple in column order) of one record
+    def _decode(self, bytestream):
+        view = memoryview(bytestream)
+        header_size, used = RecordSerializer.decode_varint(view)
+        # the header is a few bytes, copying it out to use as the cache key is cheap
+        header = bytes(view[used:header_size])
+        plan = self.plans.get(header)
+        if plan is None:
+            plan = self._compile(header)
+        body_struct, converters = plan
+        fields = body_struct.unpack_from(view, header_size)
+        if converters is None:
+            return fields
+        return tuple([convert(field) if convert else field for convert, field in zip(converters, fields)])
+
+    # build (and cache) the plan for one header
+    def _compile(self, header: bytes):
+        formats = [">"]
+        converters = []
+        serial_types = self._serial_types(header)
+        # columns the record doesn't have (written before they were added) are NULL, like in a Projection
+        serial_types += [constants.SERIAL_RECORD_NULL] * (len(self.columns) - len(serial_types))
+        for serial_type in serial_types:
+            field_format, converter = self._field_layout(serial_type)
+            formats.append(field_format)
+            converters.append(converter)
+
+        plan = (struct.Struct("".join(formats)), converters if any(converters) else None)
+        if len(self.plans) >= MAX_CACHED_PLANS:
+            self.plans.clear()
+        self.plans[header] = plan
+        return plan
+
+    # the serial types listed in a header
+    def _serial_types(self, header: bytes) -> list:
+        serial_types = []
+        cursor = 0
+        while cursor < len(header):
+            serial_type, used = RecordSerializer.decode_varint(header, cursor)
+            serial_types.append(serial_type)
+            cursor += used
+        if len(serial_types) > len(self.columns):
+            raise ValueError(f"Record has {len(serial_types)} values but the schema only has {len(self.columns)} columns")
+        return serial_types
+
+    # (struct format of the value in the body, function turning the unpacked field into the value or None if it already is)
+    def _field_layout(self, serial_type):
+        # NULL, 0, 1 and the booleans take no body bytes: '0s' unpacks an empty bytes object that the converter replaces
+        if serial_type in CONSTANT_VALUES:
+            return "0s", _constant(CONSTANT_VALUES[serial_type])
+        if serial_type in FIXED_FORMATS:
+            return FIXED_FORMATS[serial_type], None
+        if serial_type in ODD_INT_SIZES:
+            return f"{ODD_INT_SIZES[serial_type]}s", _signed_int
+        if self._spilled(serial_type):
+            # spilled value: just the pointer, the overflow pages are only read if somebody opens the value
+            return "I", _overflow_value((serial_type - 12) // 2, serial_type % 2 == 1)
+        if serial_type >= 13 and serial_type % 2 == 1:
+            return f"{(serial_type - 13) // 2}s", self._decode_text
+        if serial_type >= 12:
+            return f"{(serial_type - 12) // 2}s", None
+        raise ValueError(f"Unknown serial type {serial_type}")
+
+    def _spilled(self, serial_type) -> bool:
+        return serial_type >= 12 and self.overflow_threshold is not None and (serial_type - 12) // 2 > self.overflow_threshold
+
+    # a Projection decoding only some columns of the rows that pass a filter (see below)
+    def projection(self, columns=None, where=None, load_value=None) -> "Projection":
+        return Projection(self, columns, where, load_value)
+
+    def _decode_text(self, raw: bytes) -> str:
+        return raw.decode(self.encoding)
+
+    @staticmethod
+    def _array_column(values):
+        # only when every value has the same array-able type, NULLs or mixed types keep the plain list
+        types = set(map(type, values))
+        if len(types) == 1:
+            typecode = ARRAY_TYPECODES.get(types.pop())
+            if typecode is not None:
+                return array(typecode, values)
+        return list(values)
+
+    @staticmethod
+    def _numpy_column(values):
+        types = set(map(type, values))
+        if len(types) == 1 and next(iter(types)) in ARRAY_TYPECODES:
+            return numpy.array(values, dtype=ARRAY_TYPECODES[next(iter(types))])
+        return numpy.array(values, dtype=object)
+
+
+# Function: Scans that only want a few columns of the rows matching a simple filter shouldn't decode whole records.
+# Key Responsibilities:
+    # Projection(codec, columns, where).apply(bytestream) -> {column: value} for the projected columns, or None when the
+    # row doesn't match.
+    # where: (column, op, value) or a list of them (all have to hold), op is one of == != < <= > >=.
+    # NULL follows SQL: it is only == None (and != anything else), every ordering comparison with it is false, and so is
+    # comparing values that can't be ordered (e.g. a text column with an int).
+# Per distinct header (cached like the codec plans) each condition is compiled against the serial type of its column:
+    # - constants (NULL, 0, 1, booleans) and text/blob equality with a value of another length are decided right there, a
+    #   row whose header already fails is rejected without looking at its body at all
+    # - text/blob comparisons run on the raw bytes in the record (UTF-8 byte order is code point order), no decoding
+    # - numbers unpack just their own field
+    # - a spilled value is read through load_value (RecordStore.read_value) only when the condition needs it
+# Rows that pass get one struct unpack that skips ('x' padding) every column that isn't projected.
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+# encodings whose byte order is the order of the strings, raw bytes can be compared directly
+ORDERED_ENCODINGS = {"utf-8", "utf8", "ascii"}
+
+
+class Projection:
+
+    def __init__(self, codec: RecordCodec, columns=None, where=None, load_value=None):
+        self.codec = codec
+        self.columns = tuple(codec.columns if columns is None else columns)
+        for column in self.columns:
+            if column not in codec.columns:
+                raise ValueError(f"Unknown column {column!r}")
+        if where is None:
+            where = []
+        elif isinstance(where, tuple):
+            where = [where]
+        for column, op, _ in where:
+            if column not in codec.columns:
+                raise ValueError(f"Unknown column {column!r}")
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator {op!r}, use one of {' '.join(OPERATORS)}")
+        self.where = list(where)
+        # OverflowValue -> the whole value (only needed when a condition is on a column that can spill)
+        self.load_value = load_value
+        # header bytes -> None (no row with this header can match) or (checks, projected struct, converters)
+        self.plans = {}
+        self.ordered_bytes = codec.encoding.lower() in ORDERED_ENCODINGS
+
+    def apply(self, bytestream):
+        view = memoryview(bytestream)
+        header_size, used = RecordSerializer.decode_varint(view)
+        header = bytes(view[used:header_size])
+        try:
+            plan = self.plans[header]
+        except KeyError:
+            plan = self._compile(header)
+        if plan is None:
+            return None
+        checks, projected, converters = plan
+        for check in checks:
+            if not check(view, header_size):
+                return None
+        fields = projected.unpack_from(view, header_size)
+        if converters is not None:
+            fields = [convert(field) if convert else field for convert, field in zip(converters, fields)]
+        return dict(zip(self.columns, fields))
+
+    # apply() over many rows, only the matching ones come back
+    def apply_many(self, bytestreams) -> list[dict]:
+        apply = self.apply
+        return [record for record in map(apply, bytestreams) if record is not None]
+
+    def _compile(self, header: bytes):
+        codec = self.codec
+        serial_types = codec._serial_types(header)
+        # columns the record doesn't have (written before they were added) are NULL
+        serial_types += [constants.SERIAL_RECORD_NULL] * (len(codec.columns) - len(serial_types))
+        layouts = [codec._field_layout(serial_type) for serial_type in serial_types]
+        offsets = []
+        offset = 0
+        for field_format, _ in layouts:
+            offsets.append(offset)
+            offset += struct.calcsize(">" + field_format)
+
+        checks = []
+        plan = None
+        for column, op, value in self.where:
+            index = codec.columns.index(column)
+            check = self._compile_check(serial_types[index], layouts[index], offsets[index], op, value)
+            if check is False:
+                break
+            if check is not True:
+                checks.append(check)
+        else:
+            # one struct over the whole body: the projected fields, padding for everything else
+            wanted = {codec.columns.index(column): position for position, column in enumerate(self.columns)}
+            formats = [">"]
+            picked = []
+            for index, (field_format, converter) in enumerate(layouts):
+                if index in wanted:
+                    formats.append(field_format)
+                    picked.append((wanted[index], converter))
+                else:
+                    formats.append(f"{struct.calcsize('>' + field_format)}x")
+            # the fields come out in body order, put them back in projection order
+            order = sorted(range(len(picked)), key=lambda field: picked[field][0])
+            projected = struct.Struct("".join(formats))
+            converters = [picked[field][1] for field in order]
+            if order != list(range(len(order))):
+                projected = _Reordered(projected, order)
+            plan = (checks, projected, converters if any(converters) else None)
+
+        if len(self.plans) >= MAX_CACHED_PLANS:
+            self.plans.clear()
+        self.plans[header] = plan
+        return plan
+
+    # True / False when the serial type alone decides, otherwise check(view, body_start) -> bool
+    def _compile_check(self, serial_type, layout, offset, op, value):
+        compare = OPERATORS[op]
+        if serial_type in CONSTANT_VALUES:
+            return _compare(compare, CONSTANT_VALUES[serial_type], value)
+        if value is None:
+            # a stored value is never NULL-equal
+            return op == "!="
+
+        field_format, converter = layout
+        if self.codec._spilled(serial_type):
+            if self.load_value is None:
+                raise ValueError("A condition on a spilled value needs load_value to read it")
+            placeholder = converter
+            load_value = self.load_value
+            pointer = struct.Struct(">" + field_format)
+            return lambda view, start: _compare(compare, load_value(placeholder(pointer.unpack_from(view, start + offset)[0])), value)
+
+        if serial_type >= 12:
+            text = serial_type % 2 == 1
+            length = (serial_type - 13) // 2 if text else (serial_type - 12) // 2
+            if text and isinstance(value, str) and (op in ("==", "!=") or self.ordered_bytes):
+                raw = value.encode(self.codec.encoding)
+            elif not text and isinstance(value, (bytes, bytearray, memoryview)):
+                raw = bytes(value)
+            else:
+                # text vs non-text value (or an encoding whose bytes don't sort like the strings): decode and compare
+                decode = converter or (lambda raw: raw)
+                return lambda view, start: _compare(compare, decode(bytes(view[start + offset:start + offset + length])), value)
+            if op in ("==", "!="):
+                if len(raw) != length:
+                    return op == "!="
+                return lambda view, start: compare(view[start + offset:start + offset + length], raw)
+            return lambda view, start: compare(bytes(view[start + offset:start + offset + length]), raw)
+
+        # numbers: unpack only this field
+        field = struct.Struct(">" + field_format)
+        if converter is None:
+            return lambda view, start: _compare(compare, field.unpack_from(view, start + offset)[0], value)
+        return lambda view, start: _compare(compare, converter(field.unpack_from(view, start + offset)[0]), value)
+
+
+# a struct whose unpacked fields get reordered (projection order differs from the column order in the body)
+class _Reordered:
+
+    def __init__(self, body_struct, order):
+        self.body_struct = body_struct
+        self.order = order
+
+    def unpack_from(self, view, offset):
+        fields = self.body_struct.unpack_from(view, offset)
+        return tuple([fields[field] for field in self.order])
+
+
+# SQL-ish comparison: NULLs only equal NULL, values that can't be compared never match
+def _compare(compare, left, right):
+    if left is None or right is None:
+        if compare is operator.eq:
+            return left is right
+        if compare is operator.ne:
+            return left is not right
+        return False
+    try:
+        return compare(left, right)
+    except TypeError:
+        return False
+
+
+# smallest serial type (and its body bytes) that holds an int, SQLite style
+def encode_int(value: int):
+    if value == 0:
+        return constants.SERIAL_RECORD_ZERO, b""
+    if value == 1:
+        return constants.SERIAL_RECORD_ONE, b""
+    for serial_type, size in INT_SIZES:
+        if -(1 << (8 * size - 1)) <= value < (1 << (8 * size - 1)):
+            return serial_type, value.to_bytes(size, "big", signed=True)
+    raise OverflowError(f"{value} doesn't fit in a 64-bit integer")
+
+# header size varint + header: the size counts its own varint too, which can make it one byte longer (wide records)
+def encode_header(header: bytes) -> bytes:
+    header_size = len(header) + 1
+    while len(RecordSerializer.encode_varint(header_size)) + len(header) != header_size:
+        header_size += 1
+    return RecordSerializer.encode_varint(header_size) + header
+
+# (serial type, body size) of the sized ints, smallest first
+INT_SIZES = ((1, 1), (2, 2), (3, 3), (4, 4), (5, 6), (6, 8))
+
+
+def _constant(value):
+    return lambda _: value
+
+def _overflow_value(length, text):
+    return lambda first_page_id: OverflowValue(first_page_id, length, text)
+
+def _signed_int(raw: bytes) -> int:
+    return int.from_bytes(raw, "big", signed=True)
@@ -0,0 +1,444 @@
+# Function: Stores serialized records (rows) in leaf pages and hands out their location (page_id, row_id) as the record id.
+# Key Responsibilities:
+    # insert(record: dict) -> (page_id, row_id): serialize the record and put it on a page that has room.
+    # fetch(rid) -> dict: read a record back.
+    # update(rid, record) -> rid: rewrite a record in place if its page still has room, otherwise move it (new rid).
+    # delete(rid): free the slot, the next insert on that page reuses it (Page.deleted_indices). A page that ends up
+    # empty goes back to the pager's free list, and so do the overflow pages of the record.
+    # vacuum(): online compaction in small slices, repacks sparse pages towards the start of the file and truncates it.
+    # scan() -> (rid, record) for every record, streamed with readahead (scan.ScanCursor). scan_async/fetch_async for asyncio.
+    # scan(columns=..., where=...) filters and projects on the serialized rows, only matching rows get decoded.
+    # at_snapshot(snapshot): read-only view of the store as of a pager snapshot (mvcc.py), writers keep going meanwhile.
+
+# Free-space map (FSM): instead of calling Page.has_space on leaf after leaf, we keep 4 bits per page telling how much room it has:
+    # 0 = not one of our record pages, 1..15 = record page with at least (level - 1) * FSM_STEP free bytes.
+    # The map lives in META pages (one bitmap value each, FSM_PAGES_PER_MAP pages per map page), the store's own META page
+    # lists the map pages (and chains to more META pages through next_page_id when it runs out of room).
+    # In memory every level has a stack of candidate pages, so picking an insert target is O(levels) whatever the file size.
+
+# Compression: in a compressed file (Pager(..., compression="zlib")) a store made with compress=False keeps its record
+# and overflow pages uncompressed (hot tables: no zlib on every read and write), the setting is kept in the META page.
+
+# Big values: text/blob values longer than the store's overflow threshold (fixed when the store is created, kept in the
+# META page next to the magic) go to overflow pages (overflow.py). fetch/scan return an OverflowValue placeholder for
+# them without reading those pages, open_value streams one, read_value loads it whole.
+
+# Interaction: Uses the RecordSerializer to turn dicts into bytes and back, and the Pager for every page.
+
+import math
+import struct
+import time
+from constants import PAGE_SIZE
+from page import Page, PageType, LEAF_HEADER, SLOT, NO_PAGE
+from record_serializer import RecordSerializer
+from scan import ScanCursor, DEFAULT_READAHEAD
+from overflow import OverflowValue, OverflowReader, free_chain, spill_values, read_value
+
+STORE_MAGIC = b"SDBRS001"
+PAGE_POINTER = struct.Struct(">I")
+
+# 4 bits per page: 16 levels, level 0 means "not a record page"
+FSM_LEVELS = 16
+FSM_STEP = PAGE_SIZE // (FSM_LEVELS - 1)
+# one map page holds one bitmap value of FSM_BYTES bytes (2 pages per byte)
+FSM_BYTES = 4000
+FSM_PAGES_PER_MAP = FSM_BYTES * 2
+# biggest record that fits on an empty page next to its slot
+MAX_RECORD_SIZE = PAGE_SIZE - LEAF_HEADER.size - SLOT.size
+# values longer than this (in bytes) go to overflow pages unless the store is created with another threshold
+DEFAULT_OVERFLOW_THRESHOLD = PAGE_SIZE // 4
+OVERFLOW_THRESHOLD = struct.Struct(">I")
+# after the overflow threshold: 0 = whatever the pager does, 1 = compressed, 2 = uncompressed
+STORE_COMPRESSION = struct.Struct(">B")
+COMPRESSION_SETTINGS = {None: 0, True: 1, False: 2}
+# how many of the most recent candidates per level vacuum looks at when it needs room on a lower page
+ROOM_SEARCH_LIMIT = 64
+
+
+# level for a record page with free_bytes of room (never 0, that is reserved for "not ours")
+def fsm_level(free_bytes: int) -> int:
+    return 1 + min(free_bytes // FSM_STEP, FSM_LEVELS - 2)
+
+# lowest level that guarantees size free bytes (can be FSM_LEVELS, i.e. only a fresh page is sure to fit it)
+def level_needed(size: int) -> int:
+    return 1 + math.ceil(size / FSM_STEP)
+
+
+class RecordStore:
+
+    def __init__(self, pager, meta_page_id: int, columns: list[str], serializer: RecordSerializer = None):
+        self.pager = pager
+        self.meta_page_id = meta_page_id
+        self.columns = list(columns)
+        # the default serializer reports to the pager's metrics (if it has any)
+        self.serializer = serializer if serializer is not None else RecordSerializer(metrics=pager.metrics)
+
+        meta = pager.get_page(meta_page_id)
+        if meta.page_type != PageType.META or meta.slot_count == 0 or bytes(meta.get_value(0)[:len(STORE_MAGIC)]) != STORE_MAGIC:
+            raise ValueError(f"Page {meta_page_id} is not a record store meta page")
+        # the overflow threshold follows the magic (stores made before overflow pages existed have none: no overflow),
+        # then the compression setting (older stores: none, they follow the pager)
+        header = meta.get_value(0)[len(STORE_MAGIC):]
+        self.overflow_threshold = OVERFLOW_THRESHOLD.unpack_from(header)[0] if len(header) else None
+        setting = STORE_COMPRESSION.unpack_from(header, OVERFLOW_THRESHOLD.size)[0] if len(header) > OVERFLOW_THRESHOLD.size else 0
+        self.compress = {value: key for key, value in COMPRESSION_SETTINGS.items()}[setting]
+        self.codec = self.serializer.codec(self.columns, self.overflow_threshold)
+
+        # follow the META chain to find every map page (slot 0 of the first page is the magic)
+        self.meta_chain = [meta_page_id]
+        self.fsm_page_ids = []
+        page, first_row = meta, 1
+        while True:
+            for row_id in range(first_row, page.slot_count):
+                self.fsm_page_ids.append(PAGE_POINTER.unpack(page.get_value(row_id))[0])
+            if page.next_page_id == NO_PAGE:
+                break
+            page, first_row = pager.get_page(page.next_page_id), 0
+            self.meta_chain.append(page.page_id)
+
+        # in-memory copy of the map + per-level stacks of candidate pages (stale entries are skipped when popped)
+        self.fsm = [bytearray(pager.get_page(page_id).get_value(0)) for page_id in self.fsm_page_ids]
+        self.candidates = [[] for _ in range(FSM_LEVELS)]
+        # next page vacuum() looks at (None = start over from the end of the file)
+        self.vacuum_position = None
+        # pages freed or moved down since the current vacuum pass started
+        self.vacuum_progress = 0
+        for map_index, bitmap in enumerate(self.fsm):
+            base = map_index * FSM_PAGES_PER_MAP
+            for byte_index, byte in enumerate(bitmap):
+                if byte:
+                    self._remember(base + 2 * byte_index, byte >> 4)
+                    self._remember(base + 2 * byte_index + 1, byte & 0x0F)
+
+    # make a new empty store and return it
+    # compress: None = like the rest of the pager's file, False = keep this table's pages uncompressed, True = compressed
+    @classmethod
+    def create(cls, pager, columns: list[str], serializer: RecordSerializer = None,
+               overflow_threshold: int = DEFAULT_OVERFLOW_THRESHOLD, compress: bool = None) -> "RecordStore":
+        if not 0 <= overflow_threshold <= MAX_RECORD_SIZE:
+            raise ValueError(f"overflow_threshold must be between 0 and {MAX_RECORD_SIZE} bytes")
+        if compress and pager.compression is None:
+            raise ValueError("compress=True needs a compressed file (Pager(..., compression=...))")
+        meta = pager.allocate_new_page(PageType.META)
+        meta.add_value(STORE_MAGIC + OVERFLOW_THRESHOLD.pack(overflow_threshold) + STORE_COMPRESSION.pack(COMPRESSION_SETTINGS[compress]))
+        return cls(pager, meta.page_id, columns, serializer)
+
+    # the store as it was at the snapshot (fetch/scan/read_value only, no writes)
+    def at_snapshot(self, snapshot) -> "RecordStore":
+        return RecordStore(snapshot, self.meta_page_id, self.columns, self.serializer)
+
+    # ---------------------------------------------------------------- records
+
+    def insert(self, record: dict) -> tuple:
+        _, data = self._encode(record)
+        return self._place(data)
+
+    # spilled values come back as OverflowValue placeholders, see open_value/read_value
+    def fetch(self, rid: tuple) -> dict:
+        page_id, row_id = rid
+        page = self._record_page(page_id)
+        return self.codec.deserialize(page.get_value(row_id))
+
+    # file-like reader streaming a spilled value page by page (read/readinto, or chunks() for memoryviews)
+    def open_value(self, value: OverflowValue) -> OverflowReader:
+        return OverflowReader(self.pager, value)
+
+    # the whole value (str/bytes) behind a placeholder, anything else is returned as is
+    def read_value(self, value):
+        return read_value(self.pager, value, self.serializer.encoding)
+
+    # write values over the overflow threshold to overflow pages, the record keeps OverflowValue placeholders
+    def _spill(self, record: dict) -> dict:
+        if self.overflow_threshold is None:
+            return record
+        return spill_values(self.pager, record, self.overflow_threshold, self.serializer.encoding, self.compress)
+
+    # (spilled record, serialized row), checked against the page size before any row changes: a record that is too
+    # big gives back the chains that were just written for it
+    def _encode(self, record: dict) -> tuple:
+        spilled = self._spill(record)
+        data = self.codec.serialize(spilled)
+        if len(data) > MAX_RECORD_SIZE:
+            for column, value in spilled.items():
+                if isinstance(value, OverflowValue) and value is not record[column]:
+                    free_chain(self.pager, value.first_page_id)
+            raise ValueError(f"Record too big for simpledb page ({len(data)} > {MAX_RECORD_SIZE} bytes)")
+        return spilled, data
+
+    # every record of the store as (rid, record), reading the file readahead pages at a time (see scan.ScanCursor)
+    # without filling the buffer pool.
+    # columns / where push the query down to the serialized rows (record_serializer.Projection): only rows matching
+    # where, e.g. [("age", ">=", 18), ("country", "==", "NL")], come back, as dicts of the projected columns only.
+    def scan(self, readahead: int = DEFAULT_READAHEAD, columns=None, where=None):
+        decode = self._decoder(columns, where)
+        for page in ScanCursor(self.pager, readahead=readahead):
+            yield from self._page_records(page, decode)
+
+    # async for rid, record in store.scan_async(): same as scan, reads happen on the pager's I/O pool
+    async def scan_async(self, readahead: int = DEFAULT_READAHEAD, columns=None, where=None):
+        decode = self._decoder(columns, where)
+        async for page in ScanCursor(self.pager, readahead=readahead):
+            for item in self._page_records(page, decode):
+                yield item
+
+    async def fetch_async(self, rid: tuple) -> dict:
+        page_id, row_id = rid
+        if self.level_of(page_id) == 0:
+            raise IndexError(f"Page {page_id} is not a record page of this store")
+        page = await self.pager.get_page_async(page_id)
+        return self.codec.deserialize(page.get_value(row_id))
+
+    # full records, or projected ones (None for rows that don't match) when the scan has columns/where
+    def _decoder(self, columns, where):
+        if columns is None and where is None:
+            return self.codec.deserialize
+        return self.codec.projection(columns, where, load_value=self.read_value).apply
+
+    def _page_records(self, page, decode):
+        if self.level_of(page.page_id) == 0:
+            return []
+        # decode the whole page before the cursor moves on, the page is a view of its read buffer
+        records = []
+        for row_id, value in enumerate(page.values):
+            if value is not None:
+                record = decode(value)
+                if record is not None:
+                    records.append(((page.page_id, row_id), record))
+        return records
+
+    # (an OverflowValue fetched earlier can be passed back as is, the value isn't rewritten)
+    def update(self, rid: tuple, record: dict) -> tuple:
+        page_id, row_id = rid
+        page = self._record_page(page_id)
+        # a copy, the page changes under the view below
+        old_value = bytes(page.get_value(row_id))
+        record, data = self._encode(record)
+
+        page = self.pager.get_page(page_id)
+        if page.free_space + len(old_value) >= len(data):
+            page.update_value(row_id, data)
+            self._after_change(page)
+            new_rid = rid
+        else:
+            # doesn't fit here anymore: move it, the old row only goes once the new one is in place
+            new_rid = self._place(data)
+            page = self.pager.get_page(page_id)
+            page.delete_value(row_id)
+            self._after_change(page)
+            self._release_if_empty(page_id)
+
+        # overflow chains of the old version that the new one doesn't point to anymore
+        kept = {value.first_page_id for value in record.values() if isinstance(value, OverflowValue)}
+        self._free_overflow(old_value, keep=kept)
+        return new_rid
+
+    def delete(self, rid: tuple):
+        page_id, row_id = rid
+        page = self._record_page(page_id)
+        self._free_overflow(page.get_value(row_id))
+        page = self.pager.get_page(page_id)
+        page.delete_value(row_id)
+        self._after_change(page)
+        self._release_if_empty(page_id)
+
+    # give the overflow pages of a record (serialized) back to the pager, except the chains starting in keep
+    def _free_overflow(self, data, keep=()):
+        if self.overflow_threshold is None:
+            return
+        for value in self.codec.deserialize(data).values():
+            if isinstance(value, OverflowValue) and value.first_page_id not in keep:
+                free_chain(self.pager, value.first_page_id)
+
+    def _release_if_empty(self, page_id):
+        if self.pager.get_page(page_id).slot_count == 0:
+            self._release(page_id)
+
+    # the page is no record page of ours anymore, the pager can hand it out again
+    def _release(self, page_id):
+        self._set_level(page_id, 0)
+        self.pager.free_page(page_id)
+
+    # ---------------------------------------------------------------- vacuum
+
+    # One slice of online compaction: call it again and again (e.g. between requests) until it returns True.
+    # It walks the record pages from the end of the file towards the start, looking at no more than max_pages of them
+    # (or running for time_budget seconds) per call:
+        # an empty page is freed
+        # when there is a free page lower in the file, the page is copied there whole (rows keep their row ids)
+        # a page that is more than half empty has its records moved onto lower pages with room, then it's freed
+    # Records that move get a new rid: on_move(old_rid, new_rid) is called for each one so indexes can follow them.
+    # Once the walk reaches the start of the file the free pages at its end are cut off (Pager.truncate). Pages that got
+    # filled up by the pass can still sit above free ones, so another pass starts while the last one got something done.
+    def vacuum(self, max_pages: int = 64, time_budget: float = None, on_move=None) -> bool:
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        if self.vacuum_position is None:
+            self.vacuum_position = self.pager.num_pages - 1
+
+        examined = 0
+        while self.vacuum_position >= 0:
+            if examined >= max_pages or (deadline is not None and time.monotonic() >= deadline):
+                return False
+            page_id = self.vacuum_position
+            self.vacuum_position -= 1
+            # other pages (maps, indexes, overflow...) are skipped without being read
+            if self.level_of(page_id) == 0:
+                continue
+            examined += 1
+            self._vacuum_page(page_id, on_move)
+
+        self.vacuum_position = None
+        self.pager.truncate()
+        progress, self.vacuum_progress = self.vacuum_progress, 0
+        return progress == 0 or len(self.pager.free_list) == 0
+
+    def _vacuum_page(self, page_id, on_move):
+        page = self.pager.get_page(page_id)
+        if page.slot_count == 0:
+            self._release(page_id)
+            self.vacuum_progress += 1
+            return
+        row_ids = [row_id for row_id in range(page.slot_count) if row_id not in page.deleted_indices]
+
+        lowest_free = self.pager.free_list.lowest()
+        if lowest_free is not None and lowest_free < page_id:
+            # move the whole page down: same image under the new id
+            image = bytes(page.to_bytes())
+            new_page_id = self._new_record_page().page_id
+            new_page = Page.from_bytes(new_page_id, image)
+            self.pager.install_page(new_page)
+            self._set_level(new_page_id, fsm_level(new_page.free_space))
+            self._release(page_id)
+            self.vacuum_progress += 1
+            for row_id in row_ids:
+                self._moved(on_move, (page_id, row_id), (new_page_id, row_id))
+            return
+
+        if page.free_space < PAGE_SIZE // 2:
+            return
+        # sparse page: squeeze its records onto lower pages that have room
+        for row_id in row_ids:
+            data = bytes(self.pager.get_page(page_id).get_value(row_id))
+            target_id = self._room_below(len(data) + SLOT.size, page_id)
+            if target_id is None:
+                break
+            target = self.pager.get_page(target_id)
+            new_row_id = target.add_value(data)
+            self._after_change(target)
+            page = self.pager.get_page(page_id)
+            page.delete_value(row_id)
+            self._after_change(page)
+            self._moved(on_move, (page_id, row_id), (target_id, new_row_id))
+            self.vacuum_progress += 1
+        self._release_if_empty(page_id)
+
+    @staticmethod
+    def _moved(on_move, old_rid, new_rid):
+        if on_move is not None:
+            on_move(old_rid, new_rid)
+
+    # a record page below limit with at least size free bytes, looking at the most recent candidates only (bounded work)
+    def _room_below(self, size, limit):
+        for level in range(level_needed(size), FSM_LEVELS):
+            for page_id in reversed(self.candidates[level][-ROOM_SEARCH_LIMIT:]):
+                if page_id < limit and self.level_of(page_id) == level:
+                    return page_id
+        return None
+
+    # ---------------------------------------------------------------- placement
+
+    # put serialized bytes on a page the map says has room (a fresh page if none does)
+    def _place(self, data: bytes) -> tuple:
+        if len(data) > MAX_RECORD_SIZE:
+            raise ValueError(f"Record too big for simpledb page ({len(data)} > {MAX_RECORD_SIZE} bytes)")
+
+        page = None
+        for level in range(level_needed(len(data) + SLOT.size), FSM_LEVELS):
+            page_id = self._candidate(level)
+            if page_id is not None:
+                page = self.pager.get_page(page_id)
+                break
+        if page is None:
+            page = self._new_record_page()
+
+        row_id = page.add_value(data)
+        self._after_change(page)
+        return page.page_id, row_id
+
+    def _new_record_page(self):
+        page = self.pager.allocate_new_page(PageType.LEAF)
+        if self.compress is not None:
+            self.pager.set_page_compression(page.page_id, self.compress)
+        return page
+
+    # top of the stack for level, dropping entries whose page has moved to another level since they were pushed
+    def _candidate(self, level):
+        stack = self.candidates[level]
+        while stack:
+            if self.level_of(stack[-1]) == level:
+                return stack[-1]
+            stack.pop()
+        return None
+
+    def _remember(self, page_id, level):
+        # level 1 pages are (nearly) full, no insert ever asks for them
+        if level >= 2:
+            self.candidates[level].append(page_id)
+
+    def _after_change(self, page):
+        self.pager.mark_dirty(page.page_id)
+        self._set_level(page.page_id, fsm_level(page.free_space))
+
+    # ---------------------------------------------------------------- free-space map
+
+    def level_of(self, page_id: int) -> int:
+        map_index, position = divmod(page_id, FSM_PAGES_PER_MAP)
+        if map_index >= len(self.fsm):
+            return 0
+        byte = self.fsm[map_index][position // 2]
+        return byte >> 4 if position % 2 == 0 else byte & 0x0F
+
+    def _set_level(self, page_id: int, level: int):
+        if self.level_of(page_id) == level:
+            return
+        map_index, position = divmod(page_id, FSM_PAGES_PER_MAP)
+        while map_index >= len(self.fsm):
+            self._add_map_page()
+
+        bitmap = self.fsm[map_index]
+        byte = bitmap[position // 2]
+        if position % 2 == 0:
+            bitmap[position // 2] = (level << 4) | (byte & 0x0F)
+        else:
+            bitmap[position // 2] = (byte & 0xF0) | level
+        self._remember(page_id, level)
+
+        # same size value, so this is a plain in-place patch of the map page
+        map_page = self.pager.get_page(self.fsm_page_ids[map_index])
+        map_page.update_value(0, bitmap)
+        self.pager.mark_dirty(map_page.page_id)
+
+    def _add_map_page(self):
+        map_page = self.pager.allocate_new_page(PageType.META)
+        map_page.add_value(bytes(FSM_BYTES))
+        pointer = PAGE_POINTER.pack(map_page.page_id)
+
+        last = self.pager.get_page(self.meta_chain[-1])
+        if not last.has_space(pointer):
+            # this META page is full of map pointers, continue the list on a new one
+            extra = self.pager.allocate_new_page(PageType.META)
+            last = self.pager.get_page(self.meta_chain[-1])
+            last.next_page_id = extra.page_id
+            self.pager.mark_dirty(last.page_id)
+            self.meta_chain.append(extra.page_id)
+            last = self.pager.get_page(extra.page_id)
+        last.add_value(pointer)
+        self.pager.mark_dirty(last.page_id)
+
+        self.fsm_page_ids.append(map_page.page_id)
+        self.fsm.append(bytearray(FSM_BYTES))
+
+    # the page behind a record id, refusing pages that don't belong to this store
+    def _record_page(self, page_id: int):
+        if self.level_of(page_id) == 0:
+            raise IndexError(f"Page {page_id} is not a record page of this store")
+        return self.pager.get_page(page_id)
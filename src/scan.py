@@ -0,0 +1,97 @@
+# Function: Sequential scans that read the file in big chunks instead of one get_page (one seek + one 4KB read) per page.
+# Key Responsibilities:
+    # ScanCursor(pager, start_page, end_page, readahead): iterate over the pages of a page range in order
+    # (for page in cursor / async for page in cursor).
+    # Pages are read readahead pages at a time with a single read into a fixed ring buffer, so memory stays constant
+    # whatever the size of the scan, and they never go through the buffer pool: a big scan doesn't evict the hot pages.
+    # Page objects are built lazily on top of the ring (Page.from_bytes only parses the header + slot directory).
+
+# Careful: a page handed out by the cursor is a view of the ring and gets overwritten once the cursor reads the next
+# chunk. Decode (or detach()) what you need before asking for more pages, RecordStore.scan does exactly that.
+
+# Interaction: Uses the Pager's FileHandler for the reads, and pager.newer_page for pages that are newer than the file
+# (a page that is cached or logged wins over what's on disk). A mvcc.Snapshot works in place of the pager: the scan then
+# sees the snapshot's versions.
+
+import asyncio
+from constants import PAGE_SIZE
+from page import Page
+
+# pages per read (32 x 4KB = 128KB per syscall)
+DEFAULT_READAHEAD = 32
+
+
+class ScanCursor:
+
+    def __init__(self, pager, start_page: int = 0, end_page: int = None, readahead: int = DEFAULT_READAHEAD):
+        if readahead < 1:
+            raise ValueError("readahead must be at least 1 page")
+        self.pager = pager
+        self.start_page = start_page
+        # None = up to the last page the pager knows about when the scan starts
+        self.end_page = end_page
+        self.readahead = readahead
+        # the ring: one chunk of readahead pages, reused for every read
+        self.ring = bytearray(readahead * PAGE_SIZE)
+        self.ring_view = memoryview(self.ring)
+        # how many reads went to the file (for stats/tests)
+        self.reads = 0
+
+    def __iter__(self):
+        return self.pages()
+
+    # yield every page of the range in page id order
+    def pages(self):
+        for chunk_start, chunk_end in self._chunks():
+            newer = self._newer_pages(chunk_start, chunk_end)
+            pages_read = self._read_chunk(chunk_start, chunk_end)
+            yield from self._chunk_pages(chunk_start, chunk_end, pages_read, newer)
+
+    # async version: the chunk reads run on the pager's I/O pool, so the event loop isn't blocked while the disk works
+    #   async for page in cursor.pages_async(): ...
+    async def pages_async(self):
+        loop = asyncio.get_running_loop()
+        executor = self.pager.io_executor()
+        for chunk_start, chunk_end in self._chunks():
+            newer = self._newer_pages(chunk_start, chunk_end)
+            pages_read = await loop.run_in_executor(executor, self._read_chunk, chunk_start, chunk_end)
+            for page in self._chunk_pages(chunk_start, chunk_end, pages_read, newer):
+                yield page
+
+    def __aiter__(self):
+        return self.pages_async()
+
+    # (first page, end page) of every read
+    def _chunks(self):
+        pager = self.pager
+        end_page = pager.num_pages if self.end_page is None else min(self.end_page, pager.num_pages)
+        pager.file_handler.advise_sequential(self.start_page * PAGE_SIZE, (end_page - self.start_page) * PAGE_SIZE)
+        for chunk_start in range(self.start_page, end_page, self.readahead):
+            yield chunk_start, min(chunk_start + self.readahead, end_page)
+
+    # read one chunk into the ring, returns how many whole pages came back
+    # (pages past the end of the file only live in the cache/log: allocated but not flushed yet)
+    def _read_chunk(self, chunk_start, chunk_end):
+        read_bytes = self.pager.file_handler.read_into(chunk_start * PAGE_SIZE, self.ring_view[:(chunk_end - chunk_start) * PAGE_SIZE])
+        self.reads += 1
+        return read_bytes // PAGE_SIZE
+
+    # page_id -> copy newer than the file (cached/logged), looked up before the chunk is read: a checkpoint that copies a
+    # logged page into the file meanwhile only makes the file catch up with what we already have
+    def _newer_pages(self, chunk_start, chunk_end):
+        newer = {}
+        for page_id in range(chunk_start, chunk_end):
+            page = self.pager.newer_page(page_id)
+            if page is not None:
+                newer[page_id] = page
+        return newer
+
+    def _chunk_pages(self, chunk_start, chunk_end, pages_read, newer):
+        for page_id in range(chunk_start, chunk_end):
+            page = newer.get(page_id)
+            if page is None:
+                index = page_id - chunk_start
+                if index >= pages_read:
+                    continue
+                page = Page.from_bytes(page_id=page_id, raw=self.ring_view[index * PAGE_SIZE:(index + 1) * PAGE_SIZE])
+            yield page
@@ -0,0 +1,99 @@
+# Function: The file's header page (page 0, the "superblock"): everything the Pager needs to open a database without
+# looking at the rest of the file.
+# Key Responsibilities:
+    # Superblock.read(page) -> Superblock | None: parse page 0 (None when the file has no header, older files).
+    # values(): the two page values it is stored as, the Pager writes them back on flush/commit when they changed.
+    # Fields: format version, page size, page count, free list head + free page count (freelist.py), schema catalog
+    # page id and named root pointers (name -> page id, e.g. the META page of a table or index).
+
+# On disk (a META page, so it's a normal slotted page going through the cache, the log and checkpoints like any other):
+    # slot 0: DB_MAGIC | SUPERBLOCK_FIELDS
+    # slot 1: root pointers, repeated (1-byte name length | name | 4-byte page id)
+# Format 1 files only had the free list fields in slot 0 (DB_MAGIC | first trunk | free count): they are read as is
+# (page count from the file size) and rewritten in the current format the first time the header is saved.
+
+# Interaction: Owned by the Pager (pager.superblock), which keeps it in memory, so page count, roots and the free list
+# head never need a page read. Saved with the pages it describes: in the same flush, or in the same WAL commit.
+
+import struct
+from constants import PAGE_SIZE
+from page import Page, PageType, NO_PAGE
+
+HEADER_PAGE_ID = 0
+DB_MAGIC = b"SDBHDR01"
+FORMAT_VERSION = 2
+# format version | page size | page count | free list head | free page count | schema catalog page id
+SUPERBLOCK_FIELDS = struct.Struct(">HIIIII")
+# format 1: first trunk | free page count
+V1_FIELDS = struct.Struct(">II")
+ROOT_NAME_LENGTH = struct.Struct(">B")
+MAX_ROOT_NAME = 255
+ROOT_POINTER = struct.Struct(">I")
+
+
+class Superblock:
+
+    def __init__(self, page_count: int = 1, free_list_head: int = NO_PAGE, free_count: int = 0,
+                 catalog_page_id: int = NO_PAGE, roots: dict = None, format_version: int = FORMAT_VERSION,
+                 page_size: int = PAGE_SIZE):
+        self.format_version = format_version
+        self.page_size = page_size
+        # None = unknown (format 1 headers), the Pager goes by the file size then
+        self.page_count = page_count
+        self.free_list_head = free_list_head
+        self.free_count = free_count
+        self.catalog_page_id = catalog_page_id
+        # name -> page id
+        self.roots = dict(roots or {})
+
+    # the header of page, None if page isn't one
+    @classmethod
+    def read(cls, page) -> "Superblock | None":
+        if page.page_type != PageType.META or page.slot_count == 0:
+            return None
+        value = page.get_value(0)
+        if bytes(value[:len(DB_MAGIC)]) != DB_MAGIC:
+            return None
+        if len(value) == len(DB_MAGIC) + V1_FIELDS.size:
+            free_list_head, free_count = V1_FIELDS.unpack_from(value, len(DB_MAGIC))
+            return cls(None, free_list_head, free_count, format_version=1)
+
+        format_version, page_size, page_count, free_list_head, free_count, catalog_page_id = \
+            SUPERBLOCK_FIELDS.unpack_from(value, len(DB_MAGIC))
+        if format_version > FORMAT_VERSION:
+            raise ValueError(f"Database file format {format_version} is newer than this simpledb ({FORMAT_VERSION})")
+        if page_size != PAGE_SIZE:
+            raise ValueError(f"Database file uses {page_size} byte pages, this simpledb uses {PAGE_SIZE}")
+
+        roots = {}
+        if page.slot_count > 1:
+            data = page.get_value(1)
+            cursor = 0
+            while cursor < len(data):
+                (length,) = ROOT_NAME_LENGTH.unpack_from(data, cursor)
+                name = bytes(data[cursor + 1:cursor + 1 + length]).decode("utf-8")
+                (roots[name],) = ROOT_POINTER.unpack_from(data, cursor + 1 + length)
+                cursor += 1 + length + ROOT_POINTER.size
+        return cls(page_count, free_list_head, free_count, catalog_page_id, roots, format_version, page_size)
+
+    def values(self) -> list[bytes]:
+        fields = SUPERBLOCK_FIELDS.pack(FORMAT_VERSION, self.page_size, self.page_count, self.free_list_head,
+                                        self.free_count, self.catalog_page_id)
+        roots = []
+        for name, page_id in sorted(self.roots.items()):
+            encoded = name.encode("utf-8")
+            roots.append(ROOT_NAME_LENGTH.pack(len(encoded)) + encoded + ROOT_POINTER.pack(page_id))
+        return [DB_MAGIC + fields, b"".join(roots)]
+
+    # put the values on the header page (replacing whatever header it had)
+    def write_to(self, page):
+        for row_id, value in enumerate(self.values()):
+            if row_id < page.slot_count:
+                page.update_value(row_id, value)
+            else:
+                page.add_value(value)
+
+    def new_page(self) -> Page:
+        page = Page(page_id=HEADER_PAGE_ID, page_type=PageType.META)
+        self.write_to(page)
+        return page
@@ -0,0 +1,388 @@
+# Function: Append-only write-ahead log (WAL) that sits next to the database file (<db>-wal).
+# Instead of rewriting 4KB pages in place (a crash halfway leaves torn pages) the Pager appends page images here,
+# a commit is just one sequential append + one fsync, and the pages are copied back into the main file later (checkpoint).
+# Key Responsibilities:
+    # append(frames): log page images that are not committed yet (dirty pages the Pager had to evict).
+    # commit(frames): log page images + a commit marker, concurrent committers share one write and one fsync (group commit).
+    # read_page(page_id): newest logged image of a page, the Pager checks here before going to the main file.
+    # checkpoint(): copy committed pages into the main file and reset the log (also runs on a background thread).
+    # recovery: on open, replay every committed transaction into the main file and drop the torn tail.
+    # versions: every commit gets a timestamp, the committed frames of a page are its versions. A snapshot
+    # (acquire_snapshot, see mvcc.py) reads the newest version at or before its timestamp (read_version), the main file
+    # when there is none. Checkpoints only copy versions up to the oldest open snapshot, so the main file never gets
+    # anything a snapshot mustn't see, and the log is only reset (old versions reclaimed) once no snapshot needs it.
+
+# Layout:
+    # header (HEADER_SIZE bytes): magic | page size | salt
+    # frames: page_id | payload length | salt | crc32  followed by payload bytes (a page image)
+    # a commit marker is a frame with page_id = COMMIT_MARKER and no payload, it commits every frame before it
+    # the salt changes every time the log is reset, so frames left over from an older log never look valid
+
+import os
+import struct
+import threading
+import zlib
+from constants import PAGE_SIZE
+from file_handler import FileHandler
+
+WAL_MAGIC = b"SDBWAL01"
+HEADER_FORMAT = struct.Struct(">8sII")
+HEADER_SIZE = HEADER_FORMAT.size
+FRAME_HEADER = struct.Struct(">IIII")
+COMMIT_MARKER = 0xFFFFFFFF
+
+
+class WriteAheadLog:
+
+    def __init__(self, file_path, db_file_handler, page_size=PAGE_SIZE, sync=True, auto_checkpoint=1000):
+        self.file_path = file_path
+        # the main database file, checkpoints copy pages into it
+        self.db_file_handler = db_file_handler
+        self.page_size = page_size
+        # fsync the log on commit (turn off only if losing the last commits on power loss is fine)
+        self.sync_on_commit = sync
+        # start a background checkpoint once this many frames are in the log (0 = only checkpoint on close/when asked)
+        self.auto_checkpoint = auto_checkpoint
+        self.file_handler = FileHandler(file_path)
+
+        # page_id -> offset of the newest frame for that page (committed or not)
+        self.index = {}
+        # page_id -> offset of the newest committed frame
+        self.committed_index = {}
+        # frames written since the last commit marker, they become committed with the next marker
+        self.uncommitted = {}
+        # page_id -> [(commit ts, offset), ...] committed frames the main file doesn't have yet, oldest first
+        self.versions = {}
+        # timestamp of the last commit (only lives in memory, snapshots don't outlive the process)
+        self.commit_ts = 0
+        # the main file holds every commit up to this timestamp
+        self.checkpointed_ts = 0
+        # timestamp -> number of open snapshots taken at it
+        self.snapshots = {}
+        # next free byte in the log
+        self.end = HEADER_SIZE
+        self.frame_count = 0
+
+        # one lock guards the indexes/offsets, the condition wakes up committers waiting on the group commit leader
+        self.lock = threading.Lock()
+        self.commit_done = threading.Condition(self.lock)
+        # queued commit batches: (ticket, frames)
+        self.pending = []
+        self.next_ticket = 0
+        self.durable_ticket = -1
+        self.leader_active = False
+        self.syncs = 0
+        # if a group write fails, every commit in that group gets the error instead of waiting forever
+        self.failed_ticket = -1
+        self.failure = None
+
+        self.checkpoint_lock = threading.Lock()
+        self.checkpoint_wanted = threading.Event()
+        self.checkpointer = None
+        self.closing = False
+
+        self._recover()
+
+    # ---------------------------------------------------------------- writing
+
+    # log pages that are not committed yet (no sync, a crash simply forgets them)
+    def append(self, frames: list):
+        if not frames:
+            return
+        data, offsets = self._encode(frames, commit=False)
+        with self.lock:
+            start = self._reserve(len(data))
+            self.file_handler.write_vectored(start, [data])
+            self.frame_count += len(frames)
+            for (page_id, _), offset in zip(frames, offsets):
+                self.index[page_id] = start + offset
+                self.uncommitted[page_id] = start + offset
+
+    # log pages and commit them together with everything appended before. Blocks until the commit is durable.
+    # Whoever finds no leader becomes the leader: it takes every queued batch, writes them in one go and syncs once.
+    def commit(self, frames: list):
+        with self.lock:
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            self.pending.append((ticket, frames))
+
+            while self.durable_ticket < ticket:
+                if ticket <= self.failed_ticket:
+                    raise IOError(f"Commit to {self.file_path} failed") from self.failure
+                if self.leader_active:
+                    self.commit_done.wait()
+                    continue
+                self._lead_group_commit()
+
+        if self.auto_checkpoint and self.frame_count >= self.auto_checkpoint:
+            self._request_checkpoint()
+
+    # called with self.lock held, drops it during the write + sync so other committers can queue up behind us
+    def _lead_group_commit(self):
+        self.leader_active = True
+        batches = self.pending
+        self.pending = []
+
+        chunks = []
+        placed = []
+        size = 0
+        for _, frames in batches:
+            data, offsets = self._encode(frames, commit=True)
+            placed.append((frames, [size + offset for offset in offsets]))
+            chunks.append(data)
+            size += len(data)
+        start = self._reserve(size)
+        # frames appended before our marker get committed by it, ones appended while we write don't
+        promoted = self.uncommitted
+        self.uncommitted = {}
+
+        self.lock.release()
+        try:
+            self.file_handler.write_vectored(start, chunks)
+            if self.sync_on_commit:
+                self.file_handler.sync()
+                self.syncs += 1
+        except OSError as e:
+            self.lock.acquire()
+            self.leader_active = False
+            self.uncommitted = {**promoted, **self.uncommitted}
+            self.failed_ticket = batches[-1][0]
+            self.failure = e
+            self.commit_done.notify_all()
+            raise
+        self.lock.acquire()
+        self.leader_active = False
+        self.frame_count += sum(len(frames) for _, frames in batches)
+
+        # everything in the log up to our last marker is committed now, as one new version for snapshots
+        self.commit_ts += 1
+        self.committed_index.update(promoted)
+        for page_id, offset in promoted.items():
+            self._add_version(page_id, offset)
+        for frames, offsets in placed:
+            for (page_id, _), offset in zip(frames, offsets):
+                self.committed_index[page_id] = start + offset
+                self._add_version(page_id, start + offset)
+                # an append that raced our write may already have logged a newer image of this page
+                if self.index.get(page_id, -1) < start + offset:
+                    self.index[page_id] = start + offset
+        self.durable_ticket = batches[-1][0]
+        self.commit_done.notify_all()
+
+    # called with self.lock held: offset is the newest image of page_id as of self.commit_ts
+    def _add_version(self, page_id, offset):
+        chain = self.versions.setdefault(page_id, [])
+        # a page logged twice in the same group (appended, then committed) keeps only the later image
+        if chain and chain[-1][0] == self.commit_ts:
+            chain[-1] = (self.commit_ts, offset)
+        else:
+            chain.append((self.commit_ts, offset))
+
+    # turn [(page_id, image), ...] into frame bytes (+ a commit marker) and the payload offsets relative to the start
+    def _encode(self, frames, commit):
+        data = bytearray()
+        offsets = []
+        for page_id, image in frames:
+            data += self._frame_header(page_id, image)
+            offsets.append(len(data))
+            data += image
+        if commit:
+            data += self._frame_header(COMMIT_MARKER, b"")
+        return data, offsets
+
+    def _frame_header(self, page_id, payload):
+        fields = struct.pack(">III", page_id, len(payload), self.salt)
+        crc = zlib.crc32(payload, zlib.crc32(fields))
+        return fields + struct.pack(">I", crc)
+
+    # called with self.lock held: claim room at the end of the log
+    def _reserve(self, size):
+        start = self.end
+        self.end += size
+        return start
+
+    # ---------------------------------------------------------------- reading
+
+    # newest logged image of page_id or None if the log doesn't have it (then the main file is up to date)
+    def read_page(self, page_id):
+        with self.lock:
+            offset = self.index.get(page_id)
+            if offset is None:
+                return None
+            # under the lock so a checkpoint can't reset the log in the middle of the read
+            return os.pread(self.file_handler.file.fileno(), self.page_size, offset)
+
+    # image of page_id as of commit ts, None if the main file has it (no version at or before ts is left in the log)
+    def read_version(self, page_id, ts):
+        with self.lock:
+            for version_ts, offset in reversed(self.versions.get(page_id, ())):
+                if version_ts <= ts:
+                    return os.pread(self.file_handler.file.fileno(), self.page_size, offset)
+            return None
+
+    # ---------------------------------------------------------------- snapshots
+
+    # start a snapshot at the last commit, returns its timestamp. Until release_snapshot, checkpoints don't copy
+    # anything newer into the main file and the log isn't reset
+    def acquire_snapshot(self) -> int:
+        with self.lock:
+            ts = self.commit_ts
+            self.snapshots[ts] = self.snapshots.get(ts, 0) + 1
+            return ts
+
+    def release_snapshot(self, ts):
+        with self.lock:
+            if self.snapshots[ts] == 1:
+                del self.snapshots[ts]
+            else:
+                self.snapshots[ts] -= 1
+            # the log may have grown past auto_checkpoint while the snapshot held it, reclaim it now
+            wanted = self.auto_checkpoint and self.frame_count >= self.auto_checkpoint
+        if wanted:
+            self._request_checkpoint()
+
+    # highest page id the log knows about (the main file may not have grown to it yet)
+    def max_page_id(self):
+        with self.lock:
+            return max(self.index, default=-1)
+
+    # ---------------------------------------------------------------- checkpoint
+
+    # copy committed pages into the main file, then reset the log if nothing else got logged meanwhile.
+    # With snapshots open only versions up to the oldest one are copied, and the log stays until they're closed
+    def checkpoint(self):
+        with self.checkpoint_lock:
+            with self.lock:
+                horizon = min(self.snapshots, default=self.commit_ts)
+                # newest version of every page at or before the horizon (older ones are superseded)
+                committed = []
+                for page_id, chain in self.versions.items():
+                    for version_ts, offset in reversed(chain):
+                        if version_ts <= horizon:
+                            committed.append((page_id, offset))
+                            break
+                committed.sort()
+                end = self.end
+                latest = self.commit_ts
+            if not committed and (end == HEADER_SIZE or horizon != latest):
+                return
+
+            # committed frames never move until the reset below, so the copy can run without blocking committers
+            fd = self.file_handler.file.fileno()
+            runs = []
+            for page_id, offset in committed:
+                image = os.pread(fd, self.page_size, offset)
+                if runs and runs[-1][0] + len(runs[-1][1]) == page_id:
+                    runs[-1][1].append(image)
+                else:
+                    runs.append((page_id, [image]))
+            for first_page_id, images in runs:
+                self.db_file_handler.write_vectored(first_page_id * self.page_size, images)
+            if runs:
+                self.db_file_handler.sync()
+
+            with self.lock:
+                # the main file has these versions now, snapshots read them from there
+                self.checkpointed_ts = max(self.checkpointed_ts, horizon)
+                for page_id, _ in committed:
+                    chain = [version for version in self.versions[page_id] if version[0] > horizon]
+                    if chain:
+                        self.versions[page_id] = chain
+                    else:
+                        del self.versions[page_id]
+                # only reset when the log holds nothing the main file doesn't have yet (a group commit writing with the
+                # lock released has already claimed its room, but isn't counted in commit_ts yet)
+                if self.end == end and not self.uncommitted and not self.leader_active and self.checkpointed_ts == self.commit_ts:
+                    self._reset()
+
+    def _request_checkpoint(self):
+        if self.checkpointer is None:
+            self.checkpointer = threading.Thread(target=self._checkpoint_loop, name="wal-checkpointer", daemon=True)
+            self.checkpointer.start()
+        self.checkpoint_wanted.set()
+
+    def _checkpoint_loop(self):
+        while True:
+            self.checkpoint_wanted.wait()
+            self.checkpoint_wanted.clear()
+            if self.closing:
+                return
+            self.checkpoint()
+
+    # called with self.lock held: empty the log and pick a new salt so stale frames can never be replayed
+    def _reset(self):
+        self.salt = (self.salt + 1) & 0xFFFFFFFF
+        self.file_handler.file.truncate(0)
+        self.file_handler.write_vectored(0, [HEADER_FORMAT.pack(WAL_MAGIC, self.page_size, self.salt)])
+        self.file_handler.sync()
+        self.index = {}
+        self.committed_index = {}
+        self.versions = {}
+        self.checkpointed_ts = self.commit_ts
+        self.end = HEADER_SIZE
+        self.frame_count = 0
+
+    # ---------------------------------------------------------------- recovery
+
+    # read the log left by the previous run, keep everything up to the last valid commit marker, replay it into the main file
+    def _recover(self):
+        fd = self.file_handler.file.fileno()
+        size = self.file_handler.file_size
+        header = os.pread(fd, HEADER_SIZE, 0)
+
+        if len(header) < HEADER_SIZE:
+            # brand new (or torn before the header made it) log
+            self.salt = int.from_bytes(os.urandom(4), "big")
+            with self.lock:
+                self._reset()
+            return
+
+        magic, page_size, self.salt = HEADER_FORMAT.unpack(header)
+        if magic != WAL_MAGIC:
+            raise ValueError(f"{self.file_path} is not a simpledb write-ahead log")
+        if page_size != self.page_size:
+            raise ValueError(f"Write-ahead log page size {page_size} doesn't match database page size {self.page_size}")
+
+        offset = HEADER_SIZE
+        valid_end = HEADER_SIZE
+        while offset + FRAME_HEADER.size <= size:
+            page_id, length, salt, crc = FRAME_HEADER.unpack(os.pread(fd, FRAME_HEADER.size, offset))
+            payload_offset = offset + FRAME_HEADER.size
+            if salt != self.salt or payload_offset + length > size:
+                break
+            payload = os.pread(fd, length, payload_offset)
+            if zlib.crc32(payload, zlib.crc32(struct.pack(">III", page_id, length, salt))) != crc:
+                # torn write, nothing after this point can be trusted
+                break
+            offset = payload_offset + length
+
+            if page_id == COMMIT_MARKER:
+                self.commit_ts += 1
+                for logged_page_id, logged_offset in self.uncommitted.items():
+                    self._add_version(logged_page_id, logged_offset)
+                self.committed_index.update(self.uncommitted)
+                self.uncommitted = {}
+                valid_end = offset
+            elif length == self.page_size:
+                self.uncommitted[page_id] = payload_offset
+            else:
+                break
+
+        # frames after the last commit marker belong to a transaction that never committed
+        self.uncommitted = {}
+        self.index = dict(self.committed_index)
+        self.end = valid_end
+        self.frame_count = len(self.index)
+        self.checkpoint()
+        # a log with only a torn tail (nothing to checkpoint) still needs to be emptied
+        if self.file_handler.file_size != HEADER_SIZE:
+            with self.lock:
+                self._reset()
+
+    def close(self):
+        if self.checkpointer is not None:
+            self.closing = True
+            self.checkpoint_wanted.set()
+            self.checkpointer.join()
+        self.checkpoint()
+        self.file_handler.close()
@@ -0,0 +1,25 @@
+from run_benchmarks import BENCHMARKS, compare, measure, run_all
+
+
+def results_of(**speeds):
+    return {"results": {name: {"ops": 1, "seconds": 1.0, "ops_per_sec": speed} for name, speed in speeds.items()}}
+
+
+def test_compare_flags_only_real_slowdowns():
+    baseline = results_of(fast=1000.0, steady=1000.0, slow=1000.0, gone=5.0)
+    results = results_of(fast=2000.0, steady=800.0, slow=600.0, new=1.0)
+    regressions, lines = compare(results, baseline, tolerance=0.3)
+    assert regressions == ["slow"]
+    report = "\n".join(lines)
+    assert "new (no baseline)" in report and "not run" in report
+
+
+def test_every_benchmark_runs():
+    results = run_all([200], repeat=1, log=lambda line: None)["results"]
+    # the sized ones run once per size
+    assert "store.scan[200]" in results and "serializer.serialize" in results
+    assert len(results) == len(BENCHMARKS)
+    assert all(result["ops"] > 0 and result["ops_per_sec"] > 0 for result in results.values())
+
+    result = measure(BENCHMARKS["varint.decode"], 100, repeat=2)
+    assert result["ops"] == 100
@@ -0,0 +1,260 @@
+import os
+import random
+import pytest
+from constants import PAGE_SIZE
+from page import PageType
+from pager import Pager
+from btree import BTree, MIN_FILL
+
+
+def key(i):
+    return b"key-%06d" % i
+
+
+def test_insert_search_and_range_scan(tmp_path):
+    pager = Pager(str(tmp_path / "tree.db"), max_cache_size=16 * PAGE_SIZE)
+    tree = BTree.create(pager)
+
+    numbers = list(range(3000))
+    random.Random(7).shuffle(numbers)
+    for i in numbers:
+        tree.insert(key(i), b"value-%d" % i + b"." * 60)
+
+    # the tree grew past a single leaf
+    assert pager.get_page(tree.root_page_id).page_type == PageType.INTERNAL
+    assert tree.search(key(1234)) == b"value-1234" + b"." * 60
+    assert tree.search(b"missing") is None
+
+    scanned = [k for k, _ in tree.range_scan(key(100), key(200))]
+    assert scanned == [key(i) for i in range(100, 200)]
+    assert len(list(tree.range_scan())) == 3000
+
+    # overwriting keeps a single entry
+    tree.insert(key(5), b"new")
+    assert tree.search(key(5)) == b"new"
+    assert len(list(tree.range_scan(key(5), key(6)))) == 1
+    pager.close()
+
+
+def test_lookups_read_log_n_pages(tmp_path):
+    pager = Pager(str(tmp_path / "depth.db"))
+    tree = BTree.create(pager)
+    for i in range(5000):
+        tree.insert(key(i), b"v" * 40)
+    meta_page_id = tree.meta_page_id
+    pager.close()
+
+    pager = Pager(str(tmp_path / "depth.db"))
+    tree = BTree(pager, meta_page_id)
+    before = pager.misses
+    assert tree.search(key(4321)) == b"v" * 40
+    # root + internal level(s) + leaf, nowhere near the ~60 leaves
+    assert pager.misses - before <= 4
+    pager.close()
+
+
+def test_delete_merges_and_keeps_order(tmp_path):
+    pager = Pager(str(tmp_path / "delete.db"), max_cache_size=16 * PAGE_SIZE)
+    tree = BTree.create(pager)
+    expected = {}
+    rng = random.Random(11)
+    for i in range(2000):
+        tree.insert(key(i), b"x" * rng.randint(1, 120))
+        expected[key(i)] = None
+
+    doomed = list(expected)
+    rng.shuffle(doomed)
+    for k in doomed[:1900]:
+        tree.delete(k)
+        del expected[k]
+
+    assert [k for k, _ in tree.range_scan()] == sorted(expected)
+    for k in expected:
+        assert tree.search(k) is not None
+    with pytest.raises(KeyError):
+        tree.delete(doomed[0])
+
+    # deleting everything collapses the tree back to a single leaf
+    for k in list(expected):
+        tree.delete(k)
+    assert list(tree.range_scan()) == []
+    assert pager.get_page(tree.root_page_id).page_type == PageType.LEAF
+    pager.close()
+
+
+def test_churn_reuses_the_pages_merges_give_up(tmp_path):
+    pager = Pager(str(tmp_path / "churn.db"), max_cache_size=16 * PAGE_SIZE)
+    tree = BTree.create(pager)
+    rng = random.Random(5)
+    sizes = []
+    for _ in range(4):
+        keys = [key(i) for i in range(5000)]
+        for k in keys:
+            tree.insert(k, b"v" * 20)
+        rng.shuffle(keys)
+        for k in keys:
+            tree.delete(k)
+        sizes.append(pager.num_pages)
+    # the first round sets the size, merged and collapsed pages come back from the free list after that
+    assert sizes == [sizes[0]] * 4
+    assert len(pager.free_list) >= sizes[0] - 10
+    pager.close()
+
+
+def test_root_survives_reopen(tmp_path):
+    path = str(tmp_path / "reopen.db")
+    pager = Pager(path)
+    tree = BTree.create(pager)
+    for i in range(1000):
+        tree.insert(key(i), b"v" * 50)
+    meta_page_id = tree.meta_page_id
+    pager.close()
+
+    pager = Pager(path)
+    tree = BTree(pager, meta_page_id)
+    assert tree.search(key(999)) == b"v" * 50
+    with pytest.raises(ValueError):
+        BTree(pager, tree.root_page_id)
+    pager.close()
+
+
+def test_oversized_entries_are_rejected(tmp_path):
+    pager = Pager(str(tmp_path / "big.db"))
+    tree = BTree.create(pager)
+    with pytest.raises(ValueError):
+        tree.insert(b"k", b"v" * PAGE_SIZE)
+    pager.close()
+
+
+def test_bulk_load_streams_sorted_input(tmp_path):
+    path = str(tmp_path / "bulk.db")
+    pager = Pager(path, max_cache_size=8 * PAGE_SIZE)
+    appends = []
+    append_bytes = pager.file_handler.append_bytes
+    pager.file_handler.append_bytes = lambda data: (appends.append(len(data)), append_bytes(data))
+    # the pages go straight to the file, whatever the pager holds has to be there first
+    pager.commit()
+
+    tree = BTree.bulk_load(pager, ((key(i), b"v%d" % i) for i in range(20000)), batch_pages=64)
+    # written in big batches, only the header and the meta page (read back by the constructor) are cached
+    assert len(appends) <= pager.num_pages // 64 + 1
+    assert sorted(pager.cache) == [0, tree.meta_page_id]
+
+    assert pager.get_page(tree.root_page_id).page_type == PageType.INTERNAL
+    assert tree.search(key(12345)) == b"v12345"
+    assert tree.search(key(20000)) is None
+    assert [k for k, _ in tree.range_scan(key(500), key(510))] == [key(i) for i in range(500, 510)]
+    assert len(list(tree.range_scan())) == 20000
+
+    # it's a normal tree afterwards
+    tree.insert(key(20000), b"new")
+    tree.delete(key(0))
+    meta_page_id = tree.meta_page_id
+    pager.close()
+
+    pager = Pager(path)
+    tree = BTree(pager, meta_page_id)
+    assert tree.search(key(20000)) == b"new"
+    assert tree.search(key(0)) is None
+    assert len(list(tree.range_scan())) == 20000
+    pager.close()
+
+
+def test_bulk_load_small_and_bad_input(tmp_path):
+    pager = Pager(str(tmp_path / "small.db"))
+    other = BTree.create(pager)
+    other.insert(b"a", b"1")
+    # nothing gets committed for us
+    with pytest.raises(ValueError):
+        BTree.bulk_load(pager, [])
+    pager.commit()
+
+    empty = BTree.bulk_load(pager, [])
+    assert list(empty.range_scan()) == []
+    # the tree made before the load is untouched
+    assert other.search(b"a") == b"1"
+
+    # a last leaf with a single entry gets evened out with the one before it
+    tree = BTree.bulk_load(pager, [(key(i), b"x" * 100) for i in range(37)])
+    assert [k for k, _ in tree.range_scan()] == [key(i) for i in range(37)]
+    root = pager.get_page(tree.root_page_id)
+    sizes = [pager.get_page(child).current_size for _, child in root.entries]
+    assert len(sizes) == 2 and min(sizes) >= MIN_FILL
+
+    with pytest.raises(ValueError):
+        BTree.bulk_load(pager, [(b"b", b""), (b"a", b"")])
+    with pytest.raises(ValueError):
+        BTree.bulk_load(pager, [(b"a", b""), (b"a", b"")])
+    pager.close()
+
+
+def test_failed_bulk_load_gives_its_pages_back(tmp_path):
+    path = str(tmp_path / "failed.db")
+    pager = Pager(path)
+    pager.commit()
+    num_pages = pager.num_pages
+
+    def out_of_order():
+        yield from ((key(i), b"v" * 100) for i in range(2000))
+        yield key(5), b"late"
+    with pytest.raises(ValueError):
+        BTree.bulk_load(pager, out_of_order(), batch_pages=8)
+    # dozens of pages were reserved and some of them written: all gone again
+    assert pager.num_pages == num_pages
+    assert os.path.getsize(path) == num_pages * PAGE_SIZE
+    tree = BTree.bulk_load(pager, ((key(i), b"v") for i in range(100)))
+    pager.close()
+
+    pager = Pager(path)
+    tree = BTree(pager, tree.meta_page_id)
+    assert len(list(tree.range_scan())) == 100
+
+    # somebody else allocated in between: the pages can't be cut off, they go to the free list
+    def interrupted():
+        yield from ((key(i), b"v" * 100) for i in range(2000))
+        pager.allocate_new_page(PageType.LEAF)
+        yield key(5), b"late"
+    num_pages = pager.num_pages
+    with pytest.raises(ValueError):
+        BTree.bulk_load(pager, interrupted(), batch_pages=8)
+    assert len(pager.free_list) == pager.num_pages - num_pages - 1
+    pager.commit()
+    # the ones the load never wrote got blank pages, every page reads back
+    for page_id in range(num_pages, pager.num_pages):
+        pager.get_page(page_id)
+    pager.close()
+    assert Pager(path).num_pages == os.path.getsize(path) // PAGE_SIZE
+
+
+def test_long_shared_prefix_keys_keep_a_high_fanout(tmp_path):
+    pager = Pager(str(tmp_path / "prefix.db"), max_cache_size=64 * PAGE_SIZE)
+    tree = BTree.create(pager)
+    regions = [b"customers/europe/netherlands/amsterdam/", b"customers/europe/netherlands/utrecht/"]
+    keys = [region + b"%010d" % i for region in regions for i in range(0, 2000)]
+    random.Random(5).shuffle(keys)
+    expected = {}
+    for i, k in enumerate(keys):
+        # big values: only a few entries per leaf, so internal nodes split a lot
+        expected[k] = b"%d" % i + b"v" * 400
+        tree.insert(k, expected[k])
+
+    # ~50 bytes per uncompressed entry: under 80 children per page, compressed entries need a third of that
+    root = pager.get_page(tree.root_page_id)
+    nodes = [pager.get_page(child) for _, child in root.entries]
+    assert all(node.page_type == PageType.INTERNAL for node in nodes)
+    assert sum(node.entry_count for node in nodes) / len(nodes) > 100
+    assert all(node.prefix.startswith(b"customers/europe/netherlands/") for node in nodes)
+
+    for k in random.Random(6).sample(keys, 3500):
+        tree.delete(k)
+        del expected[k]
+    assert list(tree.range_scan()) == sorted(expected.items())
+    for k in keys[:200]:
+        assert tree.search(k) == expected.get(k)
+
+    items = sorted(expected.items()) + [(b"z" * 40, b"")]
+    pager.commit()
+    loaded = BTree.bulk_load(pager, items)
+    assert list(loaded.range_scan(regions[1])) == [(k, v) for k, v in items if k >= regions[1]]
+    assert all(loaded.search(k) == v for k, v in items[::25])
+    pager.close()
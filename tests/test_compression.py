@@ -0,0 +1,155 @@
+import os
+import random
+import pytest
+from constants import PAGE_SIZE
+from compression import CompressedFileHandler, MAP_SUFFIX, KEEP_RAW, SLOT_UNIT
+from pager import Pager
+from record_store import RecordStore
+from btree import BTree
+from parallel_scan import parallel_scan
+
+
+def make_record(rng, i):
+    words = ["order", "shipped", "customer", "amsterdam", "invoice", "paid", "pending", "berlin"]
+    return {"id": i, "note": " ".join(rng.choice(words) for _ in range(rng.randrange(5, 40)))}
+
+
+def is_paid(record):
+    return "paid" in record["note"]
+
+
+def test_compressed_file_is_several_times_smaller(tmp_path):
+    rng = random.Random(1)
+    records = [make_record(rng, i) for i in range(5000)]
+
+    plain = Pager(str(tmp_path / "plain.db"))
+    plain_store = RecordStore.create(plain, ["id", "note"])
+    for record in records:
+        plain_store.insert(record)
+    plain.close()
+
+    path = str(tmp_path / "archive.db")
+    pager = Pager(path, max_cache_size=16 * PAGE_SIZE, compression="zlib")
+    store = RecordStore.create(pager, ["id", "note"])
+    rids = [store.insert(record) for record in records]
+    pager.close()
+    assert os.path.getsize(path) * 3 < os.path.getsize(str(tmp_path / "plain.db"))
+
+    # no need to say it again: the page map tells the pager how the file is stored
+    pager = Pager(path, max_cache_size=16 * PAGE_SIZE)
+    store = RecordStore(pager, store.meta_page_id, ["id", "note"])
+    assert pager.compression.name == "zlib"
+    assert store.fetch(rids[1234]) == records[1234]
+    assert sorted((record for _, record in store.scan()), key=lambda record: record["id"]) == records
+    assert sorted(record["id"] for _, record in parallel_scan(store, is_paid, workers=2)) == \
+        [record["id"] for record in records if is_paid(record)]
+
+    # pages shrinking and growing move between slots, vacuum cuts the file down
+    for rid in rids[:4000]:
+        store.delete(rid)
+    for rid in rids[4000:4500]:
+        store.update(rid, {"id": -1, "note": "".join(rng.choice("abcdefgh") for _ in range(300))})
+    while not store.vacuum(max_pages=1000):
+        pass
+    pager.close()
+
+    pager = Pager(path)
+    store = RecordStore(pager, store.meta_page_id, ["id", "note"])
+    ids = sorted(record["id"] for _, record in store.scan())
+    assert ids == [-1] * 500 + list(range(4500, 5000))
+    assert pager.file_handler.file_size == pager.num_pages * PAGE_SIZE
+    pager.close()
+
+
+def test_hot_tables_stay_uncompressed_and_wal_checkpoints_through_the_map(tmp_path):
+    path = str(tmp_path / "mixed.db")
+    pager = Pager(path, max_cache_size=32 * PAGE_SIZE, compression="zlib", wal=True, auto_checkpoint=0)
+    cold = RecordStore.create(pager, ["id", "blob"])
+    hot = RecordStore.create(pager, ["id", "blob"], compress=False)
+    for i in range(300):
+        # blobs past the overflow threshold follow their table's setting too
+        cold.insert({"id": i, "blob": b"c" * (2000 if i % 10 else 5000)})
+        hot.insert({"id": i, "blob": b"h" * (2000 if i % 10 else 5000)})
+    pager.commit()
+    with pager.snapshot() as snapshot:
+        pager.checkpoint()
+        assert len(list(cold.at_snapshot(snapshot).scan())) == 300
+    pager.checkpoint()
+    pager.close()
+
+    handler = CompressedFileHandler(path, "zlib", read_only=True)
+    hot_pages = [page_id for page_id in range(len(handler.entries)) if hot.level_of(page_id)]
+    raw_pages = [page_id for page_id, (_, _, size, flags) in enumerate(handler.entries) if flags & KEEP_RAW]
+    assert set(hot_pages) < set(raw_pages)
+    # the hot table's record pages + 270 one page and 30 two page blobs
+    assert len(raw_pages) == len(hot_pages) + 330
+    assert all(handler.entries[page_id][2] == PAGE_SIZE for page_id in raw_pages)
+    # everything else (as much data, for the cold table) fits in a few pages
+    assert handler.stored_size < (len(raw_pages) + 40) * PAGE_SIZE
+    handler.close()
+
+    pager = Pager(path, wal=True)
+    hot = RecordStore(pager, hot.meta_page_id, ["id", "blob"])
+    assert hot.compress is False
+    assert [record["id"] for _, record in hot.scan()] == list(range(300))
+    assert hot.read_value(hot.fetch((hot_pages[0], 0))["blob"])[:1] == b"h"
+    pager.close()
+
+
+def test_old_slots_wait_for_a_sync_and_free_slots_merge(tmp_path):
+    rng = random.Random(7)
+    handler = CompressedFileHandler(str(tmp_path / "slots.db"), "zlib")
+    empty = bytes(PAGE_SIZE)
+    noise = rng.randbytes(PAGE_SIZE)
+    # four one-unit slots, then a page that doesn't compress
+    handler.write_vectored(0, [empty] * 4 + [noise])
+    assert [entry[0] for entry in handler.entries] == [0, SLOT_UNIT, 2 * SLOT_UNIT, 3 * SLOT_UNIT, 4 * SLOT_UNIT]
+
+    # rewritten pages go somewhere else, the slots the map on disk knows stay as they are until a sync
+    handler.write_vectored(PAGE_SIZE, [noise, noise])
+    assert handler.entries[1][0] == 4 * SLOT_UNIT + PAGE_SIZE and handler.entries[2][0] > handler.entries[1][0]
+    assert handler.free == {} and handler.pending == [(SLOT_UNIT, SLOT_UNIT), (2 * SLOT_UNIT, SLOT_UNIT)]
+    handler.sync()
+    # the two neighbours are one free slot now, big enough for a page that needs two units
+    assert handler.free == {SLOT_UNIT: 2 * SLOT_UNIT}
+    half_noise = rng.randbytes(300) + bytes(PAGE_SIZE - 300)
+    handler.write_bytes(3 * PAGE_SIZE, half_noise)
+    assert handler.entries[3][:3] == (SLOT_UNIT, handler.entries[3][1], 2 * SLOT_UNIT)
+    handler.sync()
+    # the old slot of page 3 joins the space before the noise page
+    assert handler.free == {3 * SLOT_UNIT: SLOT_UNIT}
+    assert handler.read_bytes(0, 5 * PAGE_SIZE) == empty + noise + noise + half_noise + noise
+    handler.close()
+
+    handler = CompressedFileHandler(str(tmp_path / "slots.db"))
+    assert handler.free == {3 * SLOT_UNIT: SLOT_UNIT}
+    assert handler.read_bytes(3 * PAGE_SIZE, PAGE_SIZE) == half_noise
+    handler.close()
+
+
+def test_bulk_load_and_bad_settings(tmp_path):
+    path = str(tmp_path / "tree.db")
+    pager = Pager(path, compression="zlib")
+    pager.commit()
+    tree = BTree.bulk_load(pager, [(b"key-%08d" % i, b"value " * 10) for i in range(20000)])
+    pager.close()
+    pager = Pager(path)
+    tree = BTree(pager, tree.meta_page_id)
+    assert tree.search(b"key-00012345") == b"value " * 10
+    assert os.path.getsize(path) * 4 < pager.num_pages * PAGE_SIZE
+    pager.close()
+
+    with pytest.raises(ValueError):
+        Pager(path, use_mmap=True)
+    with pytest.raises(ValueError):
+        Pager(path, compression="lz77")
+    # a plain file can't be opened as a compressed one, and plain files take no per-table compression
+    plain = Pager(str(tmp_path / "plain.db"))
+    plain.close()
+    with pytest.raises(ValueError):
+        Pager(str(tmp_path / "plain.db"), compression="zlib")
+    assert not os.path.exists(str(tmp_path / "plain.db") + MAP_SUFFIX)
+    plain = Pager(str(tmp_path / "plain.db"))
+    with pytest.raises(ValueError):
+        RecordStore.create(plain, ["id"], compress=True)
+    plain.close()
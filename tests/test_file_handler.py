@@ -1,5 +1,8 @@
 import os
-from file_handler import FileHandler
+from file_handler import FileHandler, MmapFileHandler
+from page import PageType
+from pager import Pager
+from constants import PAGE_SIZE
 
 
 def test_file_handler():
@@ -34,4 +37,66 @@ def test_file_handler():
 
     # reset test
     os.remove(test_path)
-    print(f"FileHandler class tests passed")
\ No newline at end of file
+    print(f"FileHandler class tests passed")
+
+def test_mmap_file_handler(tmp_path):
+    path = str(tmp_path / "mapped.db")
+    handler = MmapFileHandler(path)
+    assert handler.file_size == 0
+    assert bytes(handler.read_bytes(0, 10)) == b''
+
+    handler.append_bytes(b'420')
+    view = handler.read_bytes(0, 3)
+    # reads are views into the mapping, not copies
+    assert isinstance(view, memoryview)
+    assert view == b'420'
+
+    # growing the file remaps it, the old view stays valid
+    handler.append_bytes(b'69')
+    assert handler.file_size == 5
+    assert handler.read_bytes(0, 9999) == b'42069'
+    assert view == b'420'
+
+    handler.write_bytes(1, b'xx')
+    assert handler.read_bytes(0, 5) == b'4xx69'
+    handler.close()
+
+
+def test_pager_with_mmap_round_trips_pages(tmp_path):
+    path = str(tmp_path / "pager_mmap.db")
+    pager = Pager(path)
+    page = pager.allocate_new_page(PageType.LEAF)
+    for value in (b'first', b'second', b'third'):
+        page.add_value(value)
+    page_id = page.page_id
+    pager.close()
+
+    pager = Pager(path, use_mmap=True)
+    page = pager.get_page(page_id)
+    assert isinstance(page.get_value(1), memoryview)
+
+    # deleting shifts the later values on disk, the cached page must not see that through its views
+    page.delete_value(0)
+    pager.mark_dirty(page_id)
+    pager.flush_all()
+    assert page.get_value(1) == b'second'
+    assert page.get_value(2) == b'third'
+    pager.close()
+
+
+def test_mmap_pages_freed_and_truncated_away_are_copied_out(tmp_path):
+    path = str(tmp_path / "shrink.db")
+    pager = Pager(path)
+    for i in range(10):
+        pager.allocate_new_page(PageType.LEAF).add_value(b"page %d" % i)
+    pager.close()
+
+    pager = Pager(path, use_mmap=True)
+    last = pager.num_pages - 1
+    page = pager.get_page(last)
+    pager.free_page(last)
+    assert pager.truncate() == 1
+    assert os.path.getsize(path) == last * PAGE_SIZE
+    # still readable: the page left the pool as a copy, not as a view past the end of the file
+    assert page.get_value(0) == b"page 9"
+    pager.close()
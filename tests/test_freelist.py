@@ -0,0 +1,67 @@
+import os
+import pytest
+from constants import PAGE_SIZE
+from page import PageType
+from pager import Pager
+from freelist import TRUNK_CAPACITY
+
+
+def test_freed_pages_are_reused_lowest_first(tmp_path):
+    pager = Pager(str(tmp_path / "reuse.db"))
+    ids = [pager.allocate_new_page(PageType.LEAF).page_id for _ in range(10)]
+    pager.free_page(ids[6])
+    pager.free_page(ids[2])
+    assert pager.stats["free_pages"] == 2
+
+    assert pager.allocate_new_page(PageType.LEAF).page_id == ids[2]
+    assert pager.allocate_new_page(PageType.META).page_id == ids[6]
+    # nothing free anymore: the file grows again
+    assert pager.allocate_new_page(PageType.LEAF).page_id == pager.num_pages - 1 == ids[-1] + 1
+
+    with pytest.raises(ValueError):
+        pager.free_page(0)
+    pinned = pager.pin(ids[0])
+    with pytest.raises(ValueError):
+        pager.free_page(pinned.page_id)
+    pager.unpin(pinned.page_id)
+    pager.close()
+
+
+def test_free_list_survives_reopen(tmp_path):
+    path = str(tmp_path / "persist.db")
+    pager = Pager(path, max_cache_size=8 * PAGE_SIZE)
+    # enough free pages to need more than one trunk page
+    ids = [pager.allocate_new_page(PageType.LEAF).page_id for _ in range(TRUNK_CAPACITY + 200)]
+    for page_id in ids[:-1]:
+        pager.free_page(page_id)
+    pager.close()
+
+    pager = Pager(path)
+    assert len(pager.free_list) == len(ids) - 1
+    assert pager.allocate_new_page(PageType.LEAF).page_id == ids[0]
+    pager.close()
+
+
+def test_truncate_cuts_free_pages_off_the_end(tmp_path):
+    for wal in (False, True):
+        path = str(tmp_path / ("truncate-%s.db" % wal))
+        pager = Pager(path, wal=wal)
+        ids = [pager.allocate_new_page(PageType.LEAF).page_id for _ in range(20)]
+        pager.get_page(ids[3]).add_value(b"keep")
+        pager.mark_dirty(ids[3])
+        for page_id in ids[4:]:
+            pager.free_page(page_id)
+        pager.free_page(ids[1])
+
+        assert pager.truncate() == 16
+        assert pager.num_pages == ids[3] + 1
+        assert os.path.getsize(path) == pager.num_pages * PAGE_SIZE
+        # the hole in the middle stays on the free list
+        assert list(pager.free_list.ids) == [ids[1]]
+        pager.close()
+
+        pager = Pager(path, wal=wal)
+        assert pager.num_pages == ids[3] + 1
+        assert pager.get_page(ids[3]).get_value(0) == b"keep"
+        assert pager.allocate_new_page(PageType.LEAF).page_id == ids[1]
+        pager.close()
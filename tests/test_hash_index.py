@@ -0,0 +1,86 @@
+import random
+import pytest
+from constants import PAGE_SIZE
+from pager import Pager
+import hash_index
+from hash_index import HashIndex
+
+
+def key(i):
+    return b"user-%07d" % i
+
+
+def rid(i):
+    return (i // 100, i % 100)
+
+
+def test_insert_search_delete_and_reopen(tmp_path, monkeypatch):
+    # small directory pages so the directory spans several of them
+    monkeypatch.setattr(hash_index, "DIRECTORY_PER_PAGE", 16)
+    path = str(tmp_path / "hash.db")
+    pager = Pager(path, max_cache_size=16 * PAGE_SIZE)
+    index = HashIndex.create(pager)
+    numbers = list(range(12000))
+    random.Random(5).shuffle(numbers)
+    for i in numbers:
+        index.insert(key(i), rid(i))
+
+    assert len(index) == 12000
+    # the directory grew past one page, buckets got split instead of rehashing
+    assert index.global_depth >= 7 and len(index.directory_page_ids) == len(index.directory) // 16
+    assert index.search(key(11111)) == rid(11111)
+    assert index.search(b"missing") is None
+
+    index.insert(key(7), (999, 1))
+    assert index.search(key(7)) == (999, 1) and len(index) == 12000
+    for i in range(0, 12000, 2):
+        index.delete(key(i))
+    with pytest.raises(KeyError):
+        index.delete(key(0))
+    meta_page_id = index.meta_page_id
+    pager.close()
+
+    pager = Pager(path, max_cache_size=16 * PAGE_SIZE)
+    index = HashIndex(pager, meta_page_id)
+    assert len(index) == 6000
+    assert index.search(key(1)) == rid(1) and index.search(key(2)) is None
+    assert sorted(k for k, _ in index.items()) == [key(i) for i in range(1, 12000, 2)]
+    pager.close()
+
+
+def test_point_lookup_reads_one_page(tmp_path):
+    path = str(tmp_path / "lookup.db")
+    pager = Pager(path)
+    index = HashIndex.create(pager)
+    for i in range(30000):
+        index.insert(key(i), rid(i))
+    meta_page_id = index.meta_page_id
+    pager.close()
+
+    pager = Pager(path, max_cache_size=4 * PAGE_SIZE)
+    index = HashIndex(pager, meta_page_id)
+    for i in random.Random(1).sample(range(30000), 200):
+        misses = pager.misses
+        assert index.search(key(i)) == rid(i)
+        assert pager.misses - misses <= 1
+    pager.close()
+
+
+def test_buckets_that_cant_split_use_overflow_pages(tmp_path, monkeypatch):
+    # every key hashes to the same value: splitting can never separate them
+    monkeypatch.setattr(hash_index, "hash_key", lambda key: 0)
+    monkeypatch.setattr(hash_index, "MAX_GLOBAL_DEPTH", 2)
+    pager = Pager(str(tmp_path / "collide.db"))
+    index = HashIndex.create(pager)
+    for i in range(1000):
+        index.insert(key(i), rid(i))
+    assert index.global_depth == 2
+    assert all(index.search(key(i)) == rid(i) for i in range(0, 1000, 37))
+
+    free_before = pager.stats["free_pages"]
+    for i in range(1000):
+        index.delete(key(i))
+    # emptied overflow pages went back to the pager
+    assert pager.stats["free_pages"] > free_before
+    assert len(index) == 0 and list(index.items()) == []
+    pager.close()
@@ -0,0 +1,54 @@
+import threading
+import time
+from latch import RWLatch
+
+
+def test_readers_share_writers_are_alone():
+    latch = RWLatch()
+    latch.acquire_read()
+    latch.acquire_read()
+    assert latch.readers == 2
+
+    wrote = threading.Event()
+
+    def writer():
+        with latch.write():
+            wrote.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(0.05)
+    # still blocked by the two readers
+    assert not wrote.is_set()
+    latch.release_read()
+    latch.release_read()
+    thread.join(timeout=5)
+    assert wrote.is_set()
+
+
+def test_waiting_writer_blocks_new_readers():
+    latch = RWLatch()
+    latch.acquire_read()
+    order = []
+
+    def writer():
+        with latch.write():
+            order.append("writer")
+
+    def reader():
+        with latch.read():
+            order.append("reader")
+
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    while latch.waiting_writers == 0:
+        time.sleep(0.001)
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    time.sleep(0.05)
+    assert order == []
+
+    latch.release_read()
+    writer_thread.join(timeout=5)
+    reader_thread.join(timeout=5)
+    assert order == ["writer", "reader"]
@@ -0,0 +1,66 @@
+from constants import PAGE_SIZE
+from metrics import Metrics, Histogram
+from page import PageType
+from pager import Pager
+from record_store import RecordStore
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for _ in range(90):
+        histogram.add(0.000001)
+    for _ in range(10):
+        histogram.add(0.001)
+    # bucket upper bounds: within a factor of two of the real value
+    assert 0.000001 <= histogram.percentile(0.5) < 0.000002
+    assert 0.001 <= histogram.percentile(0.99) <= 0.001
+    summary = histogram.summary()
+    assert summary["count"] == 100 and summary["max_us"] == 1000
+
+
+def test_pager_and_store_report_io(tmp_path):
+    path = str(tmp_path / "metrics.db")
+    pager = Pager(path)
+    store = RecordStore.create(pager, ["id", "name"])
+    rids = [store.insert({"id": i, "name": "n%d" % i}) for i in range(1000)]
+    meta_page_id = store.meta_page_id
+    pager.close()
+
+    metrics = Metrics()
+    events = []
+    metrics.add_tracer(lambda name, seconds, size: events.append(name))
+    pager = Pager(path, max_cache_size=4 * PAGE_SIZE, metrics=metrics)
+    store = RecordStore(pager, meta_page_id, ["id", "name"])
+    for rid in rids[::50]:
+        store.fetch(rid)
+    page = pager.allocate_new_page(PageType.LEAF)
+    page.add_value(b"x")
+    pager.mark_dirty(page.page_id)
+    pager.flush_all()
+
+    snapshot = pager.metrics_snapshot()
+    counters = snapshot["counters"]
+    # metrics also saw the header page being read on open, pager.misses starts counting after that
+    assert counters["pager.miss"] == pager.misses + 1 and counters["pager.hit"] == pager.hits
+    assert counters["file.read"] >= pager.misses - 1
+    assert counters["file.read.bytes"] == counters["file.read"] * PAGE_SIZE
+    assert counters["page.decode"] >= 1
+    assert counters["serializer.deserialize"] == 20
+    assert counters["pager.pages_flushed"] >= 1 and counters["file.write.bytes"] >= PAGE_SIZE
+    assert snapshot["latency"]["pager.miss"]["p99_us"] > 0
+    assert snapshot["per_second"]["pager.miss"] > 0
+    assert snapshot["cache"]["hit_rate"] == pager.stats["hit_rate"]
+    assert events.count("serializer.deserialize") == 20 and "file.read" in events
+
+    metrics.reset()
+    assert metrics.snapshot()["counters"] == {}
+    pager.close()
+
+
+def test_without_metrics_nothing_is_recorded(tmp_path):
+    pager = Pager(str(tmp_path / "off.db"))
+    store = RecordStore.create(pager, ["id"])
+    store.fetch(store.insert({"id": 1}))
+    assert pager.metrics is None and store.serializer.metrics is None
+    assert set(pager.metrics_snapshot()) == {"cache"}
+    pager.close()
@@ -0,0 +1,98 @@
+import os
+import random
+import threading
+import pytest
+from constants import PAGE_SIZE
+from pager import Pager
+from record_store import RecordStore
+from scan import ScanCursor
+from wal import HEADER_SIZE
+
+
+def test_snapshot_keeps_seeing_the_commit_it_started_at(tmp_path):
+    path = str(tmp_path / "snapshot.db")
+    pager = Pager(path, max_cache_size=8 * PAGE_SIZE, wal=True, auto_checkpoint=0)
+    store = RecordStore.create(pager, ["id", "name"])
+    rids = [store.insert({"id": i, "name": "before-%d" % i}) for i in range(500)]
+    pager.commit()
+    pages_before = pager.num_pages
+
+    snapshot = pager.snapshot()
+    old = store.at_snapshot(snapshot)
+    # writers go on: update, delete, insert (new pages too) and commit, with checkpoints in between
+    for rid in rids[:100]:
+        store.update(rid, {"id": store.fetch(rid)["id"], "name": "after"})
+    for rid in rids[100:200]:
+        store.delete(rid)
+    for i in range(500, 1500):
+        store.insert({"id": i, "name": "new-%d" % i})
+    pager.commit()
+    pager.checkpoint()
+    # the log can't be reset while the snapshot needs it, and truncating waits for it too
+    assert os.path.getsize(path + "-wal") > HEADER_SIZE
+    assert pager.truncate() == 0
+    # not committed at all
+    store.insert({"id": -1, "name": "uncommitted"})
+    pager.flush_all()
+
+    assert snapshot.num_pages == pages_before < pager.num_pages
+    assert sorted(record["id"] for _, record in old.scan()) == list(range(500))
+    assert all(record["name"].startswith("before") for _, record in old.scan())
+    assert old.fetch(rids[0])["name"] == "before-0"
+    assert [page.page_id for page in ScanCursor(snapshot)] == list(range(pages_before))
+
+    with pager.snapshot() as current:
+        ids = [record["id"] for _, record in store.at_snapshot(current).scan()]
+        assert len(ids) == 400 + 1000 and -1 not in ids
+    snapshot.close()
+    with pytest.raises(ValueError):
+        snapshot.get_page(1)
+
+    # no reader left: the checkpoint copies everything and reclaims the log
+    pager.commit()
+    pager.checkpoint()
+    assert pager.wal.versions == {} and os.path.getsize(path + "-wal") == HEADER_SIZE
+    pager.close()
+
+    with pytest.raises(ValueError):
+        Pager(str(tmp_path / "nowal.db")).snapshot()
+
+
+def test_snapshot_scans_stay_consistent_while_writers_commit(tmp_path):
+    pager = Pager(str(tmp_path / "bank.db"), max_cache_size=16 * PAGE_SIZE, wal=True, auto_checkpoint=20)
+    store = RecordStore.create(pager, ["account", "balance", "note"])
+    rids = [store.insert({"account": i, "balance": 100, "note": ""}) for i in range(300)]
+    pager.commit()
+
+    done = threading.Event()
+    errors = []
+
+    def transfer():
+        rng = random.Random(3)
+        try:
+            for _ in range(300):
+                first, second = rng.sample(range(len(rids)), 2)
+                amount = rng.randrange(1, 50)
+                for index, delta in ((first, -amount), (second, amount)):
+                    record = store.fetch(rids[index])
+                    record["balance"] += delta
+                    # growing notes move rows to other pages now and then
+                    record["note"] += "x" * rng.randrange(0, 20)
+                    rids[index] = store.update(rids[index], record)
+                pager.commit()
+        except BaseException as error:
+            errors.append(error)
+        finally:
+            done.set()
+
+    writer = threading.Thread(target=transfer)
+    writer.start()
+    scans = 0
+    while not done.is_set() or scans == 0:
+        with pager.snapshot() as snapshot:
+            balances = [record["balance"] for _, record in store.at_snapshot(snapshot).scan(columns=["balance"])]
+        assert len(balances) == 300 and sum(balances) == 300 * 100
+        scans += 1
+    writer.join()
+    assert not errors
+    pager.close()
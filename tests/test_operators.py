@@ -0,0 +1,130 @@
+import os
+import random
+import pytest
+from constants import PAGE_SIZE
+from pager import Pager
+from record_store import RecordStore
+from operators import external_sort, hash_aggregate
+
+
+def make_rows(count, seed=0):
+    rng = random.Random(seed)
+    return [{
+        "id": i,
+        "city": rng.choice(["amsterdam", "berlin", "paris", None]),
+        "age": None if rng.random() < 0.1 else rng.randrange(18, 90),
+        "score": round(rng.uniform(0, 100), 2),
+        "note": "x" * rng.randrange(0, 50),
+    } for i in range(count)]
+
+
+def spill_files(path):
+    return [name for name in os.listdir(path) if name.endswith(".spill")]
+
+
+def test_external_sort_spills_runs_and_merges(tmp_path):
+    rows = make_rows(5000)
+    # NULLs first ascending, last descending, ties keep their input order (id)
+    expected = sorted(rows, key=lambda row: (row["age"] is not None, row["age"] or 0))
+    expected = sorted(expected, key=lambda row: (row["city"] is not None, row["city"] or ""), reverse=True)
+
+    # a few KB of memory: dozens of runs, merged 4 at a time over several passes
+    result = external_sort(iter(rows), [("city", "desc"), "age"], memory_limit=32 * 1024, temp_dir=str(tmp_path), fan_in=4)
+    first = next(result)
+    assert len(spill_files(tmp_path)) == 1
+    assert [first] + list(result) == expected
+    assert spill_files(tmp_path) == []
+
+    # fits in memory: no file at all
+    assert list(external_sort(rows, ["id"], temp_dir=str(tmp_path))) == rows
+    assert spill_files(tmp_path) == []
+    with pytest.raises(ValueError):
+        list(external_sort(rows, [("id", "sideways")]))
+
+
+def test_external_sort_big_values_and_early_close(tmp_path):
+    rng = random.Random(1)
+    rows = [{"id": i, "blob": rng.randbytes(rng.randrange(0, 20000)), "text": "t%05d" % rng.randrange(100000)}
+            for i in range(200)]
+    result = external_sort(rows, ["text", "id"], memory_limit=256 * 1024, temp_dir=str(tmp_path))
+    assert list(result) == sorted(rows, key=lambda row: (row["text"], row["id"]))
+
+    result = external_sort(rows, ["id"], memory_limit=64 * 1024, temp_dir=str(tmp_path))
+    assert next(result)["id"] == 0
+    result.close()
+    assert spill_files(tmp_path) == []
+
+
+def test_external_sort_needs_the_same_columns_in_memory_and_spilled(tmp_path):
+    rows = [{"k": i % 7, "x": i} for i in range(4000)] + [{"k": 1, "y": None}]
+    for memory_limit in (1024 * 1024 * 1024, 32 * 1024):
+        with pytest.raises(ValueError):
+            list(external_sort(rows, ["k"], memory_limit=memory_limit, temp_dir=str(tmp_path)))
+        assert spill_files(tmp_path) == []
+    # a NULL is a value like any other: spelled out, the rows come back the same either way
+    rows[-1] = {"k": 1, "x": None}
+    in_memory = list(external_sort(rows, ["k"], temp_dir=str(tmp_path)))
+    spilled = list(external_sort(rows, ["k"], memory_limit=32 * 1024, temp_dir=str(tmp_path)))
+    assert spilled == in_memory == sorted(rows, key=lambda row: row["k"])
+    with pytest.raises(ValueError):
+        list(external_sort(rows, ["k"], columns=["k"], temp_dir=str(tmp_path)))
+
+
+def test_hash_aggregate_partitions_when_groups_dont_fit(tmp_path):
+    rng = random.Random(2)
+    rows = [{"user": rng.randrange(3000), "amount": None if rng.random() < 0.1 else rng.randrange(1, 500)}
+            for _ in range(30000)]
+    aggregates = {"orders": ("count", None), "paid": ("count", "amount"), "total": ("sum", "amount"),
+                  "low": ("min", "amount"), "high": ("max", "amount"), "mean": ("avg", "amount")}
+
+    expected = {}
+    for row in rows:
+        group = expected.setdefault(row["user"], {"user": row["user"], "orders": 0, "amounts": []})
+        group["orders"] += 1
+        if row["amount"] is not None:
+            group["amounts"].append(row["amount"])
+    for group in expected.values():
+        amounts = group.pop("amounts")
+        group.update(paid=len(amounts), total=sum(amounts) if amounts else None, low=min(amounts, default=None),
+                     high=max(amounts, default=None), mean=sum(amounts) / len(amounts) if amounts else None)
+
+    # room for ~100 groups and 4 partitions: partitions have to split again
+    result = hash_aggregate(iter(rows), ["user"], aggregates, memory_limit=32 * 1024, temp_dir=str(tmp_path), partitions=4)
+    groups = {}
+    for group in result:
+        assert group["user"] not in groups
+        groups[group["user"]] = group
+    assert groups == expected
+    assert spill_files(tmp_path) == []
+
+    # fits in memory
+    totals = list(hash_aggregate(rows, [], {"total": ("sum", "amount")}, temp_dir=str(tmp_path)))
+    assert totals == [{"total": sum(row["amount"] for row in rows if row["amount"] is not None)}]
+    with pytest.raises(ValueError):
+        list(hash_aggregate(rows, ["user"], {"x": ("median", "amount")}))
+
+
+def test_rows_with_spilled_values_from_a_store(tmp_path):
+    pager = Pager(str(tmp_path / "store.db"), max_cache_size=16 * PAGE_SIZE)
+    store = RecordStore.create(pager, ["id", "kind", "body"], overflow_threshold=100)
+    rng = random.Random(3)
+    expected = []
+    for i, record_id in enumerate(rng.sample(range(10000), 300)):
+        record = {"id": record_id, "kind": "k%d-" % (i % 5) + "x" * 200, "body": rng.randbytes(rng.randrange(50, 3000))}
+        store.insert(record)
+        expected.append(record)
+    rows = [record for _, record in store.scan()]
+
+    # the placeholders point into the store's file: read through the store, in memory and spilled alike
+    for memory_limit in (1024 * 1024 * 1024, 4096):
+        with pytest.raises(ValueError):
+            list(external_sort(rows, ["id"], memory_limit=memory_limit, temp_dir=str(tmp_path)))
+        result = external_sort(rows, ["id"], memory_limit=memory_limit, temp_dir=str(tmp_path), load_value=store.read_value)
+        assert [(row["id"], row["body"]) for row in result] == sorted((row["id"], row["body"]) for row in expected)
+
+        groups = hash_aggregate(rows, ["kind"], {"rows": ("count", None), "top": ("max", "id")}, memory_limit=memory_limit // 4,
+                                temp_dir=str(tmp_path), partitions=2, load_value=store.read_value)
+        assert sorted((group["kind"][:3], group["rows"], group["top"]) for group in groups) == \
+            [("k%d-" % kind, 60, max(row["id"] for row in expected[kind::5])) for kind in range(5)]
+    assert spill_files(tmp_path) == []
+    pager.close()
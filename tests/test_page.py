@@ -0,0 +1,122 @@
+import pytest
+from constants import PAGE_SIZE
+from page import Page, PageType
+
+
+def test_leaf_round_trip():
+    page = Page(page_id=3)
+    for value in (b"alpha", b"", b"gamma" * 10):
+        page.add_value(value)
+
+    raw = bytes(page.to_bytes())
+    assert len(raw) == PAGE_SIZE
+
+    loaded = Page.from_bytes(3, raw)
+    assert loaded.get_value(0) == b"alpha"
+    assert loaded.get_value(1) == b""
+    assert loaded.get_value(2) == b"gamma" * 10
+    assert loaded.current_size == page.current_size
+
+
+def test_get_value_is_a_view_of_the_page_image():
+    page = Page(page_id=0)
+    page.add_value(b"row")
+    raw = page.to_bytes()
+
+    loaded = Page.from_bytes(0, raw)
+    value = loaded.get_value(0)
+    assert isinstance(value, memoryview)
+    assert value.obj is raw.obj
+
+    # unchanged pages serialize to the buffer they were loaded from
+    assert loaded.to_bytes().obj is raw.obj
+
+
+def test_changes_never_leak_into_handed_out_views():
+    page = Page(page_id=0)
+    page.add_value(b"first")
+    image = page.to_bytes()
+    first = page.get_value(0)
+
+    page.delete_value(0)
+    page.add_value(b"other")
+
+    assert first == b"first"
+    assert Page.from_bytes(0, image).get_value(0) == b"first"
+    assert page.get_value(0) == b"other"
+
+
+def test_delete_reuses_slots_and_compacts_the_heap():
+    page = Page(page_id=0)
+    big = b"x" * 1000
+    for _ in range(4):
+        page.add_value(big)
+    assert not page.has_space(big)
+
+    page.delete_value(1)
+    page.delete_value(2)
+    with pytest.raises(IndexError):
+        page.get_value(1)
+
+    # two holes of 1000 bytes in the middle of the heap get squeezed into one gap
+    row_id = page.add_value(b"y" * 1900)
+    assert row_id in (1, 2)
+    assert page.get_value(row_id) == b"y" * 1900
+    assert page.get_value(0) == big
+    assert page.get_value(3) == big
+    assert page.values.count(None) == 1
+
+
+def test_corrupt_leaf_header_is_rejected():
+    raw = bytearray(PAGE_SIZE)
+    # 2000 slots can't fit in front of a heap that starts at byte 10
+    raw[0:5] = bytes([PageType.LEAF.value]) + (2000).to_bytes(2, "big") + (10).to_bytes(2, "big")
+    with pytest.raises(ValueError):
+        Page.from_bytes(0, bytes(raw))
+
+
+def test_internal_round_trip():
+    page = Page(page_id=1, page_type=PageType.INTERNAL)
+    page.add_value((b"apple", 4))
+    page.add_value((b"banana", 9))
+
+    loaded = Page.from_bytes(1, page.to_bytes())
+    assert loaded.page_type == PageType.INTERNAL
+    assert loaded.get_value(1) == (b"banana", 9)
+
+
+def test_internal_page_stores_the_shared_prefix_once():
+    page = Page(page_id=2, page_type=PageType.INTERNAL)
+    page.add_value((b"", 0))
+    keys = [b"customer/europe/netherlands/%06d" % (i * 7) for i in range(1, 300)]
+    for child, key in enumerate(keys, start=1):
+        assert page.has_space((key, child))
+        page.add_value((key, child))
+    # uncompressed the keys alone would take more than two pages
+    assert sum(map(len, keys)) > 2 * PAGE_SIZE
+    assert page.prefix == b"customer/europe/netherlands/00"
+    assert page.current_size <= PAGE_SIZE
+
+    loaded = Page.from_bytes(2, bytes(page.to_bytes()))
+    # encoded once, the image is kept until the next change
+    assert page.to_bytes() is page.to_bytes()
+    assert loaded.current_size == page.current_size
+    assert loaded.get_value(5) == (keys[4], 5)
+    # searched on the image without decoding the entries, same answers as a search over the entries
+    probes = [b"", b"a", b"customer/", b"customer/europe/netherlands/000013", b"customer/europe/netherlands/000014",
+              b"customer/europe/netherlands/9", b"customer/europe/z", b"zzz"] + keys
+    assert [loaded.child_index(probe) for probe in probes] == [page.child_index(probe) for probe in probes]
+    assert loaded._entries is None
+    assert loaded.entries == page.entries
+
+    # the first key isn't part of the prefix
+    loaded.remove_value_at(0)
+    loaded.insert_value_at(0, (b"c", 1000))
+    assert loaded.prefix == page.prefix and loaded.current_size == page.current_size + 1
+    again = Page.from_bytes(2, bytes(loaded.to_bytes()))
+    assert again.entries == [(b"c", 1000)] + [(key, child) for child, key in enumerate(keys, start=1)]
+    # a key without the prefix would leave the keys sharing nothing, too much for the page: refused, nothing changes
+    assert not again.has_space((b"zzz", 1001))
+    with pytest.raises(ValueError):
+        again.insert_value_at(1, (b"a", 1001))
+    assert again.prefix == page.prefix and again.entry_count == len(keys) + 1
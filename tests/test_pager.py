@@ -0,0 +1,264 @@
+import asyncio
+import threading
+import time
+import pytest
+from constants import PAGE_SIZE
+from page import PageType
+from pager import Pager, SyncPolicy
+from eviction import ClockPolicy, LRUKPolicy
+
+
+def test_cache_stays_within_max_cache_size(tmp_path):
+    pager = Pager(str(tmp_path / "pool.db"), max_cache_size=4 * PAGE_SIZE)
+
+    for _ in range(20):
+        page = pager.allocate_new_page(PageType.LEAF)
+        page.add_value(b"row %d" % page.page_id)
+
+    # 20 pages + the header page (page 0) went through 4 slots
+    assert len(pager.cache) == 4
+    assert pager.stats["evictions"] == 17
+
+    # evicted dirty pages were written through, so they read back from disk
+    for page_id in range(1, 21):
+        assert pager.get_page(page_id).get_value(0) == b"row %d" % page_id
+    pager.close()
+
+
+def test_hit_and_miss_counters(tmp_path):
+    pager = Pager(str(tmp_path / "stats.db"), max_cache_size=2 * PAGE_SIZE)
+    # (the header page, page 0, is already cached)
+    pager.get_page(1)
+    pager.get_page(1)
+    pager.get_page(2)
+    pager.get_page(3)
+
+    stats = pager.stats
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["evictions"] == 2
+    assert stats["hit_rate"] == 0.25
+    pager.close()
+
+
+def test_pinned_pages_are_never_evicted(tmp_path):
+    pager = Pager(str(tmp_path / "pin.db"), max_cache_size=2 * PAGE_SIZE)
+    hot = pager.pin(0)
+
+    for page_id in range(1, 10):
+        pager.get_page(page_id)
+    assert pager.cache[0] is hot
+
+    # once every slot is pinned there is nothing left to evict
+    pager.pin(9)
+    with pytest.raises(RuntimeError):
+        pager.get_page(10)
+
+    pager.unpin(9)
+    pager.unpin(0)
+    with pytest.raises(ValueError):
+        pager.unpin(0)
+    pager.get_page(10)
+    pager.close()
+
+
+def test_lru_k_prefers_pages_touched_once(tmp_path):
+    pager = Pager(str(tmp_path / "lruk.db"), max_cache_size=3 * PAGE_SIZE, eviction_policy=LRUKPolicy(k=2))
+    # page 0 is hot, pages 1 and 2 are only read once
+    pager.get_page(0)
+    pager.get_page(0)
+    pager.get_page(1)
+    pager.get_page(2)
+    pager.get_page(3)
+
+    assert 0 in pager.cache
+    assert 1 not in pager.cache
+    pager.close()
+
+
+def test_clock_gives_referenced_pages_a_second_chance():
+    policy = ClockPolicy()
+    for page_id in range(3):
+        policy.insert(page_id)
+    # first sweep clears every bit, so the oldest page goes first
+    assert policy.choose_victim(lambda page_id: True) == 0
+    policy.remove(0)
+    policy.record_access(1)
+    assert policy.choose_victim(lambda page_id: True) == 2
+
+
+def test_flush_all_coalesces_neighbouring_pages(tmp_path):
+    pager = Pager(str(tmp_path / "flush.db"), max_cache_size=64 * PAGE_SIZE)
+    for _ in range(10):
+        page = pager.allocate_new_page(PageType.LEAF)
+        page.add_value(b"row %d" % page.page_id)
+    pager.flush_all()
+
+    writes = []
+    write_vectored = pager.file_handler.write_vectored
+    pager.file_handler.write_vectored = lambda offset, buffers: writes.append((offset, len(buffers))) or write_vectored(offset, buffers)
+
+    for page_id in (7, 1, 2, 8, 3, 5):
+        pager.get_page(page_id).add_value(b"more")
+        pager.mark_dirty(page_id)
+    pager.flush_all()
+
+    assert writes == [(1 * PAGE_SIZE, 3), (5 * PAGE_SIZE, 1), (7 * PAGE_SIZE, 2)]
+    assert not pager.dirty_pages
+    pager.close()
+
+    pager = Pager(str(tmp_path / "flush.db"))
+    assert pager.get_page(8).get_value(1) == b"more"
+    assert pager.get_page(4).get_value(0) == b"row 4"
+    pager.close()
+
+
+def test_sync_policy_decides_when_to_sync(tmp_path):
+    for policy, expected in ((SyncPolicy.NONE, [0, 0]), (SyncPolicy.FLUSH, [1, 1]), (SyncPolicy.COMMIT, [0, 1])):
+        pager = Pager(str(tmp_path / f"sync_{policy.name}.db"), sync_policy=policy)
+        syncs = []
+        pager.file_handler.sync = lambda: syncs.append(1)
+
+        pager.allocate_new_page(PageType.LEAF)
+        pager.flush_all()
+        after_flush = len(syncs)
+        pager.commit()
+        assert [after_flush, len(syncs) - after_flush] == expected
+        pager.close()
+
+
+def test_concurrent_readers_see_the_right_pages(tmp_path):
+    path = str(tmp_path / "threads.db")
+    pager = Pager(path)
+    for _ in range(200):
+        page = pager.allocate_new_page(PageType.LEAF)
+        page.add_value(b"page-%d" % page.page_id)
+    pager.close()
+
+    # a small pool so the threads keep evicting each other's pages
+    pager = Pager(path, max_cache_size=16 * PAGE_SIZE)
+    errors = []
+
+    def reader(seed):
+        for step in range(2000):
+            page_id = 1 + (seed * 7919 + step * 31) % 200
+            with pager.reading(page_id) as page:
+                if bytes(page.get_value(0)) != b"page-%d" % page_id:
+                    errors.append(page_id)
+
+    threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(pager.cache) <= 16 and pager.pin_counts == {}
+    pager.close()
+
+
+def test_concurrent_misses_on_one_page_read_it_once(tmp_path):
+    path = str(tmp_path / "once.db")
+    pager = Pager(path)
+    page = pager.allocate_new_page(PageType.LEAF)
+    page.add_value(b"x")
+    page_id = page.page_id
+    pager.close()
+
+    pager = Pager(path)
+    reads = []
+    read_bytes = pager.file_handler.read_bytes
+
+    def slow_read(offset, size):
+        reads.append(offset)
+        time.sleep(0.05)
+        return read_bytes(offset, size)
+
+    pager.file_handler.read_bytes = slow_read
+    pages = []
+    threads = [threading.Thread(target=lambda: pages.append(pager.get_page(page_id))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(reads) == 1
+    assert all(page is pages[0] for page in pages)
+    assert pager.misses == 1 and pager.hits == 7
+    pager.close()
+
+
+def test_writers_are_serialized_by_the_page_latch(tmp_path):
+    pager = Pager(str(tmp_path / "counter.db"))
+    page_id = pager.allocate_new_page(PageType.LEAF).page_id
+    with pager.writing(page_id) as page:
+        page.add_value((0).to_bytes(4, "big"))
+
+    def bump():
+        for _ in range(500):
+            with pager.writing(page_id) as page:
+                value = int.from_bytes(page.get_value(0), "big")
+                page.update_value(0, (value + 1).to_bytes(4, "big"))
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with pager.reading(page_id) as page:
+        assert int.from_bytes(page.get_value(0), "big") == 2000
+    assert page_id in pager.dirty_pages
+    pager.close()
+
+
+def test_async_reads_share_one_read_and_keep_the_loop_free(tmp_path):
+    path = str(tmp_path / "async.db")
+    pager = Pager(path)
+    for _ in range(50):
+        page = pager.allocate_new_page(PageType.LEAF)
+        page.add_value(b"page-%d" % page.page_id)
+    pager.close()
+
+    pager = Pager(path, io_workers=2)
+    reads = []
+    read_bytes = pager.file_handler.read_bytes
+
+    def slow_read(offset, size):
+        reads.append(offset // PAGE_SIZE)
+        time.sleep(0.05)
+        return read_bytes(offset, size)
+
+    pager.file_handler.read_bytes = slow_read
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        ticking = asyncio.create_task(ticker())
+        pages = await asyncio.gather(*[pager.get_page_async(7) for _ in range(10)])
+        ticking.cancel()
+        return pages, ticks
+
+    pages, ticks = asyncio.run(main())
+    assert all(page is pages[0] for page in pages)
+    assert bytes(pages[0].get_value(0)) == b"page-7"
+    assert reads == [7]
+    # the event loop kept running while the disk was "slow"
+    assert ticks > 5
+
+    # cached (7) and nonexistent (1000) pages are skipped
+    for future in pager.prefetch([1, 2, 3, 7, 1000]):
+        future.result()
+    assert sorted(reads) == [1, 2, 3, 7]
+    hits = pager.hits
+    assert asyncio.run(pager.get_page_async(2)).page_id == 2
+    assert pager.hits == hits + 1
+
+    pager.get_page(4).add_value(b"more")
+    pager.mark_dirty(4)
+    asyncio.run(pager.commit_async())
+    assert pager.dirty_pages == set()
+    pager.close()
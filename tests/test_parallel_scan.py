@@ -0,0 +1,67 @@
+import pytest
+from pager import Pager
+from record_store import RecordStore
+from parallel_scan import parallel_scan, parallel_aggregate
+
+columns = ["id", "name", "score"]
+
+
+def row(i):
+    return {"id": i, "name": "user-%d" % i, "score": i / 2}
+
+
+# predicates/aggregates go to other processes, so they live at module level
+def is_multiple_of_7(record):
+    return record["id"] % 7 == 0
+
+
+def add_score(total, record):
+    return total + record["score"]
+
+
+def add(a, b):
+    return a + b
+
+
+def test_parallel_scan_matches_a_serial_scan(tmp_path):
+    pager = Pager(str(tmp_path / "parallel.db"), wal=True)
+    store = RecordStore.create(pager, columns)
+    rids = [store.insert(row(i)) for i in range(5000)]
+    store.delete(rids[7])
+    store.update(rids[14], {"id": 14, "name": "changed", "score": 0.0})
+    # workers read the main file: changes that are only in the cache or the log are refused, never committed for us
+    with pytest.raises(ValueError):
+        parallel_scan(store, is_multiple_of_7, workers=2)
+    pager.commit()
+    with pytest.raises(ValueError):
+        parallel_scan(store, is_multiple_of_7, workers=2)
+    pager.checkpoint()
+
+    expected = {rid: record for rid, record in store.scan() if record["id"] % 7 == 0}
+    found = parallel_scan(store, is_multiple_of_7, workers=2)
+    assert dict(found) == expected
+    assert len(found) == len(expected)
+    assert dict(found)[rids[14]]["name"] == "changed"
+
+    total = parallel_aggregate(store, 0.0, add_score, add, workers=2)
+    assert total == sum(record["score"] for _, record in store.scan())
+
+    # a snapshot keeps the checkpoint from bringing the main file up to date, the workers would see old rows
+    store.update(rids[21], {"id": 21, "name": "new", "score": 0.0})
+    pager.commit()
+    with pager.snapshot():
+        pager.checkpoint()
+        with pytest.raises(ValueError):
+            parallel_scan(store, is_multiple_of_7, workers=2)
+    pager.checkpoint()
+    assert dict(parallel_scan(store, is_multiple_of_7, workers=2))[rids[21]]["name"] == "new"
+    pager.close()
+
+
+def test_parallel_scan_of_an_empty_file(tmp_path):
+    pager = Pager(str(tmp_path / "empty.db"))
+    store = RecordStore.create(pager, columns)
+    pager.commit()
+    assert parallel_scan(store, workers=2) == []
+    assert parallel_aggregate(store, 0, add_score, add, workers=2) == 0
+    pager.close()
@@ -1,5 +1,7 @@
 from record_serializer import RecordSerializer
+from overflow import OverflowValue
 import constants
+import pytest
 
 serializer = RecordSerializer()
 
@@ -29,8 +31,9 @@ def test_serialize_deserialize_bool():
     columns = ["married"]
     data = serializer.serialize(record)
     result = serializer.deserialize(data, columns)
-    # bool serialized as int 1
-    assert result == {"married": 1}
+    # bools have their own serial types and come back as bools
+    assert result == {"married": True}
+    assert type(result["married"]) is bool
 
 def test_serialize_deserialize_null():
     record = {"nickname": None}
@@ -53,5 +56,149 @@ def test_end_to_end_serialization():
     assert result["name"] == "Gosha"
     assert result["age"] == 30
     assert abs(result["height"] - 5.9) < 1e-6
-    assert result["married"] == 1
+    assert result["married"] is True
     assert result["nickname"] is None
+
+
+def test_varint_round_trip_at_an_offset():
+    for n in (0, 127, 128, 300, 2 ** 40):
+        data = b"\xff" + RecordSerializer.encode_varint(n)
+        assert RecordSerializer.decode_varint(data, 1) == (n, len(data) - 1)
+
+
+def test_codec_matches_the_serializer():
+    columns = ["name", "age", "height", "nickname", "photo"]
+    codec = serializer.codec(columns)
+    # compiled once per column list
+    assert serializer.codec(list(columns)) is codec
+
+    record = {"name": "Gosha", "age": 30, "height": 5.9, "nickname": None, "photo": None}
+    data = serializer.serialize(record)
+    assert codec.serialize(record) == data
+    assert codec.deserialize(memoryview(data)) == record
+    # columns missing from the dict are written as NULL
+    assert codec.deserialize(codec.serialize({"age": 1})) == {"name": None, "age": 1, "height": None, "nickname": None, "photo": None}
+    # 300 columns need a 2-byte header size varint
+    wide = [f"c{i}" for i in range(300)]
+    row = {c: i for i, c in enumerate(wide)}
+    assert serializer.deserialize(serializer.codec(wide).serialize(row), wide) == row
+    assert serializer.serialize(row) == serializer.codec(wide).serialize(row)
+
+    # rows written before a column was added: decoded and projected alike, the new column is NULL
+    old_row = codec.serialize(record)
+    grown = serializer.codec(columns + ["email"])
+    expected = dict(record, email=None)
+    assert grown.deserialize(old_row) == grown.projection().apply(old_row) == expected
+    assert grown.deserialize_many([old_row], columnar=True)["email"] == [None]
+
+
+def test_deserialize_many_rows_and_columns():
+    columns = ["id", "score", "name"]
+    records = [{"id": i, "score": i / 2, "name": "n%d" % i} for i in range(100)]
+    blobs = serializer.serialize_many(records, columns)
+    assert serializer.deserialize_many(blobs, columns) == records
+
+    table = serializer.deserialize_many(blobs, columns, columnar=True)
+    assert table["id"].typecode == "q" and list(table["id"]) == list(range(100))
+    assert table["score"].typecode == "d"
+    assert table["name"][7] == "n7"
+
+    # a NULL keeps the column a plain list
+    blobs.append(serializer.codec(columns).serialize({"id": None, "score": 1.0, "name": "x"}))
+    assert serializer.deserialize_many(blobs, columns, columnar=True)["id"][-1] is None
+
+
+def test_ints_use_the_smallest_encoding():
+    columns = ["n"]
+    cases = [(0, 0), (1, 0), (-1, 1), (127, 1), (-129, 2), (2 ** 23 - 1, 3), (-2 ** 31, 4),
+             (2 ** 40, 6), (2 ** 63 - 1, 8), (-2 ** 63, 8)]
+    for value, body_size in cases:
+        data = serializer.serialize({"n": value})
+        # 1 byte header size + 1 byte serial type + body
+        assert len(data) == 2 + body_size
+        assert serializer.deserialize(data, columns) == {"n": value}
+        assert serializer.codec(columns).serialize({"n": value}) == data
+
+    with pytest.raises(OverflowError):
+        serializer.serialize({"n": 2 ** 63})
+
+
+def test_flags_cost_no_body_bytes():
+    record = {"a": True, "b": False, "c": 0, "d": 1}
+    data = serializer.serialize(record)
+    assert len(data) == 5
+    assert serializer.deserialize_many([data], list(record)) == [record]
+    assert type(serializer.deserialize(data, list(record))["b"]) is bool
+
+
+def test_blobs_and_overflow_pointers():
+    from overflow import OverflowValue
+    codec = serializer.codec(["id", "data"], overflow_threshold=8)
+    assert codec.deserialize(codec.serialize({"id": 1, "data": b"blob"})) == {"id": 1, "data": b"blob"}
+
+    spilled = OverflowValue(first_page_id=42, length=1000, text=False)
+    data = codec.serialize({"id": 1, "data": spilled})
+    # the record only holds the pointer, the length is in the serial type
+    assert len(data) < 12
+    assert codec.deserialize(data)["data"] == spilled
+    with pytest.raises(ValueError):
+        codec.serialize({"id": 1, "data": b"x" * 9})
+
+
+def test_projection_filters_on_serialized_rows():
+    serializer = RecordSerializer()
+    codec = serializer.codec(["id", "name", "score", "active", "photo", "note"])
+    rows = [{"id": i, "name": "user-%03d" % i, "score": i / 4, "active": i % 3 == 0,
+             "photo": bytes([i % 7]) * (i % 5), "note": None if i % 2 else "ünïcode"} for i in range(200)]
+    data = codec.serialize_many(rows)
+
+    def expect(keep, columns):
+        return [{column: row[column] for column in columns} for row in rows if keep(row)]
+
+    # projection order is kept even when it differs from the column order
+    projection = codec.projection(["score", "id"], [("id", ">=", 150), ("active", "==", True)])
+    assert projection.apply_many(data) == expect(lambda row: row["id"] >= 150 and row["active"], ["score", "id"])
+
+    # text compared on its raw bytes, equality rejected by length from the header alone
+    projection = codec.projection(["name"], ("name", "<", "user-010"))
+    assert projection.apply_many(data) == expect(lambda row: row["name"] < "user-010", ["name"])
+    projection = codec.projection(["id"], ("name", "==", "user-042"))
+    assert projection.apply_many(data) == [{"id": 42}]
+    assert codec.projection(["id"], ("name", "==", "short")).apply_many(data) == []
+    assert len(codec.projection(["id"], ("note", "==", "ünïcode")).apply_many(data)) == 100
+    assert len(codec.projection(["id"], ("photo", "==", b"\x02\x02")).apply_many(data)) == len(
+        [row for row in rows if row["photo"] == b"\x02\x02"])
+
+    # NULL: only == None matches, orderings and type mismatches never do
+    assert len(codec.projection(["id"], ("note", "==", None)).apply_many(data)) == 100
+    assert len(codec.projection(["id"], ("note", "!=", None)).apply_many(data)) == 100
+    assert codec.projection(["id"], ("note", ">", "a")).apply_many(data) == expect(lambda row: row["note"] is not None, ["id"])
+    assert codec.projection(["id"], ("name", ">", 5)).apply_many(data) == []
+
+    # no where: every row, projected
+    assert codec.projection(["active"]).apply(data[3]) == {"active": True}
+    with pytest.raises(ValueError):
+        codec.projection(["nope"])
+    with pytest.raises(ValueError):
+        codec.projection(None, ("id", "~", 1))
+
+
+def test_projection_reads_spilled_values_only_for_conditions():
+    codec = RecordSerializer().codec(["id", "body"], overflow_threshold=8)
+    stored = {7: "a" * 20, 8: "b" * 20}
+    data = [codec.serialize({"id": page, "body": OverflowValue(page, 20, True)}) for page in stored]
+    loaded = []
+
+    def load_value(value):
+        loaded.append(value.first_page_id)
+        return stored[value.first_page_id]
+
+    projection = codec.projection(["id", "body"], ("body", "==", "b" * 20), load_value)
+    assert projection.apply_many(data) == [{"id": 8, "body": OverflowValue(8, 20, True)}]
+    assert loaded == [7, 8]
+    # a condition on another column never touches the spilled value
+    loaded.clear()
+    assert len(codec.projection(["body"], ("id", "==", 7), load_value).apply_many(data)) == 1
+    assert loaded == []
+    with pytest.raises(ValueError):
+        codec.projection(["id"], ("body", "==", "x")).apply(data[0])
@@ -0,0 +1,232 @@
+import os
+import random
+import pytest
+from constants import PAGE_SIZE
+from pager import Pager
+from record_store import RecordStore, FSM_PAGES_PER_MAP, MAX_RECORD_SIZE
+from overflow import OverflowValue
+
+columns = ["id", "name", "score"]
+
+
+def row(i):
+    return {"id": i, "name": "user-%d" % i, "score": i / 2}
+
+
+def test_insert_fetch_update_delete(tmp_path):
+    pager = Pager(str(tmp_path / "store.db"))
+    store = RecordStore.create(pager, columns)
+
+    rids = [store.insert(row(i)) for i in range(500)]
+    assert store.fetch(rids[42]) == row(42)
+    # records are packed onto pages instead of one page each
+    assert len({page_id for page_id, _ in rids}) < 10
+
+    # same size update stays in place
+    assert store.update(rids[7], {"id": 7, "name": "user-X", "score": 1.0}) == rids[7]
+    assert store.fetch(rids[7])["name"] == "user-X"
+
+    store.delete(rids[8])
+    with pytest.raises(IndexError):
+        store.fetch(rids[8])
+    with pytest.raises(IndexError):
+        store.fetch((store.meta_page_id, 0))
+    pager.close()
+
+
+def test_deleted_slots_are_reused(tmp_path):
+    pager = Pager(str(tmp_path / "reuse.db"))
+    store = RecordStore.create(pager, columns)
+    rids = [store.insert(row(i)) for i in range(300)]
+    first_page = rids[0][0]
+    freed = [rid for rid in rids if rid[0] == first_page][:20]
+    for rid in freed:
+        store.delete(rid)
+
+    new_rids = [store.insert(row(1000 + i)) for i in range(300)]
+    # the freed slots on the first page got handed out again (the map is coarse, so the last couple may stay free)
+    assert len(set(freed) & set(new_rids)) >= 15
+    assert pager.get_page(first_page).slot_count == len([rid for rid in rids if rid[0] == first_page])
+    pager.close()
+
+
+def test_growing_records_move_to_another_page(tmp_path):
+    pager = Pager(str(tmp_path / "move.db"))
+    # keep the big value inline, it has to grow the record
+    store = RecordStore.create(pager, columns, overflow_threshold=MAX_RECORD_SIZE)
+    rids = [store.insert(row(i)) for i in range(200)]
+
+    moved = store.update(rids[0], {"id": 0, "name": "x" * 3000, "score": 0.0})
+    assert moved != rids[0]
+    assert store.fetch(moved)["name"] == "x" * 3000
+    with pytest.raises(IndexError):
+        store.fetch(rids[0])
+    pager.close()
+
+
+def test_free_space_map_survives_reopen_and_avoids_leaf_reads(tmp_path):
+    path = str(tmp_path / "fsm.db")
+    pager = Pager(path)
+    store = RecordStore.create(pager, columns)
+    rids = [store.insert(row(i)) for i in range(2000)]
+    meta_page_id = store.meta_page_id
+    pager.close()
+
+    pager = Pager(path)
+    store = RecordStore(pager, meta_page_id, columns)
+    assert store.fetch(rids[1999]) == row(1999)
+
+    misses = pager.misses
+    rid = store.insert(row(5000))
+    # only the target page is read, the map page is already cached from opening
+    assert pager.misses - misses <= 1
+    assert store.fetch(rid) == row(5000)
+    pager.close()
+
+
+def test_map_grows_past_one_map_page(tmp_path):
+    pager = Pager(str(tmp_path / "bigmap.db"), max_cache_size=8 * PAGE_SIZE)
+    store = RecordStore.create(pager, columns)
+    # pretend the file already holds other structures beyond the first map page's range
+    pager.num_pages = FSM_PAGES_PER_MAP + 10
+    rid = store.insert(row(1))
+    assert rid[0] >= FSM_PAGES_PER_MAP
+    assert len(store.fsm_page_ids) == 2
+    pager.close()
+
+    pager = Pager(str(tmp_path / "bigmap.db"))
+    store = RecordStore(pager, store.meta_page_id, columns)
+    assert store.fetch(rid) == row(1)
+    pager.close()
+
+
+def test_big_values_spill_into_overflow_pages(tmp_path):
+    path = str(tmp_path / "overflow.db")
+    pager = Pager(path, max_cache_size=16 * PAGE_SIZE)
+    store = RecordStore.create(pager, ["id", "photo", "notes"], overflow_threshold=100)
+    photo = bytes(range(256)) * 40000
+    notes = "ü" * 3000
+    rid = store.insert({"id": 1, "photo": photo, "notes": notes})
+    small = store.insert({"id": 2, "photo": b"tiny", "notes": "short"})
+    meta_page_id = store.meta_page_id
+    pager.close()
+
+    pager = Pager(path, max_cache_size=16 * PAGE_SIZE)
+    store = RecordStore(pager, meta_page_id, ["id", "photo", "notes"])
+    assert store.overflow_threshold == 100
+    assert store.fetch(small) == {"id": 2, "photo": b"tiny", "notes": "short"}
+
+    # fetching/scanning the record reads no overflow page, the big columns are placeholders
+    misses = pager.misses
+    record = store.fetch(rid)
+    assert pager.misses - misses <= 1
+    assert isinstance(record["photo"], OverflowValue) and record["photo"].length == len(photo)
+    assert dict(store.scan())[rid]["notes"] == record["notes"]
+
+    # streaming read: fixed size pieces, never the whole value at once, and the cache stays small
+    reader = store.open_value(record["photo"])
+    pieces = []
+    while True:
+        piece = reader.read(65536)
+        if not piece:
+            break
+        assert len(piece) <= 65536
+        pieces.append(piece)
+    assert b"".join(pieces) == photo
+    assert len(pager.cache) <= 16
+    assert sum(len(chunk) for chunk in store.open_value(record["photo"]).chunks()) == len(photo)
+    assert store.read_value(record["notes"]) == notes
+
+    # updates can pass the placeholder back without rewriting the value
+    num_pages = pager.num_pages
+    rid = store.update(rid, {"id": 10, "photo": record["photo"], "notes": "now short"})
+    assert pager.num_pages == num_pages
+    assert store.read_value(store.fetch(rid)["photo"]) == photo
+    pager.close()
+
+
+def test_vacuum_repacks_and_truncates_in_slices(tmp_path):
+    path = str(tmp_path / "vacuum.db")
+    pager = Pager(path, max_cache_size=32 * PAGE_SIZE)
+    store = RecordStore.create(pager, columns)
+    rids = {i: store.insert(row(i)) for i in range(6000)}
+    rng = random.Random(3)
+    for i in rng.sample(range(6000), 5000):
+        store.delete(rids.pop(i))
+    pager.commit()
+    pages_before = pager.num_pages
+
+    where = {rid: i for i, rid in rids.items()}
+
+    def on_move(old_rid, new_rid):
+        where[new_rid] = where.pop(old_rid)
+
+    slices = 1
+    while not store.vacuum(max_pages=8, on_move=on_move):
+        slices += 1
+    # bounded slices: it took several calls
+    assert slices > 3
+    assert pager.num_pages < pages_before // 2
+    assert os.path.getsize(path) == pager.num_pages * PAGE_SIZE
+
+    assert len(where) == 1000
+    for rid, i in where.items():
+        assert store.fetch(rid) == row(i)
+    assert sorted(record["id"] for _, record in store.scan()) == sorted(where.values())
+    pager.close()
+
+
+def test_deleting_frees_empty_pages_and_overflow_chains(tmp_path):
+    pager = Pager(str(tmp_path / "free.db"))
+    store = RecordStore.create(pager, ["id", "blob"], overflow_threshold=100)
+    rid = store.insert({"id": 1, "blob": b"x" * 20000})
+    assert pager.stats["free_pages"] == 0
+    # the record's page and its 5 overflow pages come back
+    store.delete(rid)
+    assert pager.stats["free_pages"] == 6
+
+    # replaced values free their old chain
+    rid = store.insert({"id": 2, "blob": b"y" * 20000})
+    assert pager.stats["free_pages"] == 0
+    store.update(rid, {"id": 2, "blob": b"small"})
+    assert pager.stats["free_pages"] == 5
+    pager.close()
+
+
+def test_records_too_big_for_a_page_change_nothing(tmp_path):
+    wide = ["id", "a", "b", "c", "d", "e", "f"]
+    pager = Pager(str(tmp_path / "too_big.db"))
+    store = RecordStore.create(pager, wide)
+    # every value stays under the spill threshold, together they don't fit on a page
+    too_big = {"id": 1, **{column: "x" * 1000 for column in wide[1:]}}
+    with pytest.raises(ValueError):
+        store.insert(too_big)
+    assert list(store.scan()) == []
+
+    rid = store.insert({"id": 1, "a": "y" * 5000, "b": "small"})
+    free_pages = pager.stats["free_pages"]
+    with pytest.raises(ValueError):
+        store.update(rid, dict(too_big, a="z" * 5000))
+    # the row and its old chain are still there, the chain written for the new "a" went back to the pager
+    assert [record["id"] for _, record in store.scan()] == [1]
+    assert store.read_value(store.fetch(rid)["a"]) == "y" * 5000
+    assert pager.stats["free_pages"] == free_pages + 2
+    pager.close()
+
+
+def test_scan_pushes_projection_and_filter_down(tmp_path):
+    pager = Pager(str(tmp_path / "pushdown.db"))
+    store = RecordStore.create(pager, ["id", "name", "score", "notes"], overflow_threshold=100)
+    rids = {}
+    for i in range(1000):
+        notes = ("long %d " % i) * 40 if i % 100 == 0 else "n"
+        rids[i] = store.insert({"id": i, "name": "user-%d" % i, "score": i / 2, "notes": notes})
+
+    rows = list(store.scan(columns=["id", "score"], where=[("score", ">=", 400), ("name", "!=", "user-900")]))
+    assert sorted(record["id"] for _, record in rows) == [i for i in range(800, 1000) if i != 900]
+    assert all(set(record) == {"id", "score"} and rid == rids[record["id"]] for rid, record in rows)
+
+    # conditions on spilled values read them through the store
+    rows = list(store.scan(columns=["id"], where=("notes", "==", "long 300 " * 40)))
+    assert rows == [(rids[300], {"id": 300})]
+    pager.close()
@@ -0,0 +1,71 @@
+import asyncio
+from constants import PAGE_SIZE
+from pager import Pager
+from record_store import RecordStore
+from scan import ScanCursor
+
+columns = ["id", "name", "score"]
+
+
+def row(i):
+    return {"id": i, "name": "user-%d" % i, "score": i / 2}
+
+
+def test_scan_reads_in_chunks_and_leaves_the_cache_alone(tmp_path):
+    path = str(tmp_path / "scan.db")
+    pager = Pager(path)
+    store = RecordStore.create(pager, columns)
+    rids = [store.insert(row(i)) for i in range(5000)]
+    meta_page_id = store.meta_page_id
+    pager.close()
+
+    pager = Pager(path, max_cache_size=8 * PAGE_SIZE)
+    store = RecordStore(pager, meta_page_id, columns)
+    hot = set(pager.cache)
+    misses = pager.misses
+
+    cursor = ScanCursor(pager, readahead=16)
+    assert [page.page_id for page in cursor] == list(range(pager.num_pages))
+    assert cursor.reads == -(-pager.num_pages // 16)
+
+    scanned = dict(store.scan(readahead=16))
+    assert scanned == {rid: row(i) for i, rid in enumerate(rids)}
+    # nothing went through the buffer pool
+    assert set(pager.cache) == hot and pager.misses == misses
+    pager.close()
+
+
+def test_scan_sees_unflushed_and_logged_changes(tmp_path):
+    for wal in (False, True):
+        pager = Pager(str(tmp_path / ("changes-%s.db" % wal)), wal=wal)
+        store = RecordStore.create(pager, columns)
+        rids = [store.insert(row(i)) for i in range(1000)]
+        pager.commit()
+
+        extra = store.insert(row(1000))
+        store.delete(rids[3])
+        store.update(rids[4], {"id": 4, "name": "new", "score": 0.0})
+
+        scanned = dict(store.scan(readahead=4))
+        assert rids[3] not in scanned
+        assert scanned[rids[4]]["name"] == "new"
+        assert scanned[extra] == row(1000)
+        assert len(scanned) == 1000
+        pager.close()
+
+
+def test_async_scan_and_fetch(tmp_path):
+    pager = Pager(str(tmp_path / "async.db"))
+    store = RecordStore.create(pager, columns)
+    rids = [store.insert(row(i)) for i in range(2000)]
+    pager.commit()
+
+    async def main():
+        scanned = {rid: record async for rid, record in store.scan_async(readahead=8)}
+        fetched = await store.fetch_async(rids[1234])
+        return scanned, fetched
+
+    scanned, fetched = asyncio.run(main())
+    assert scanned == {rid: row(i) for i, rid in enumerate(rids)}
+    assert fetched == row(1234)
+    pager.close()
@@ -0,0 +1,97 @@
+import pytest
+from constants import PAGE_SIZE
+from file_handler import FileHandler
+from freelist import TRUNK_CAPACITY
+from metrics import Metrics
+from page import Page, PageType, NO_PAGE
+from pager import Pager
+from superblock import Superblock, DB_MAGIC, FORMAT_VERSION, SUPERBLOCK_FIELDS, V1_FIELDS
+
+
+def test_header_keeps_page_count_roots_and_catalog(tmp_path):
+    for wal in (False, True):
+        path = str(tmp_path / ("roots-%s.db" % wal))
+        pager = Pager(path, wal=wal)
+        ids = [pager.allocate_new_page(PageType.LEAF).page_id for _ in range(10)]
+        pager.set_root("users", ids[2])
+        pager.set_root("users_by_email", ids[5])
+        pager.catalog_page_id = ids[0]
+        # allocated, freed again before anything was written: the file is shorter than the page count
+        pager.free_page(ids[-1])
+        pager.close()
+
+        pager = Pager(path, wal=wal)
+        assert pager.superblock.format_version == FORMAT_VERSION
+        assert pager.num_pages == ids[-1] + 1
+        assert pager.get_root("users") == ids[2] and pager.get_root("users_by_email") == ids[5]
+        assert pager.get_root("orders") is None
+        assert pager.catalog_page_id == ids[0]
+        pager.set_root("users", None)
+        pager.close()
+
+        pager = Pager(path, wal=wal)
+        assert pager.get_root("users") is None and pager.get_root("users_by_email") == ids[5]
+        # the page that was never written reads back as a blank page
+        assert pager.allocate_new_page(PageType.LEAF).page_id == ids[-1]
+        pager.close()
+
+    pager = Pager(str(tmp_path / "long.db"))
+    with pytest.raises(ValueError):
+        pager.set_root("x" * 256, 1)
+    pager.close()
+
+
+def test_open_reads_only_the_header_and_misses_skip_fstat(tmp_path, monkeypatch):
+    path = str(tmp_path / "open.db")
+    pager = Pager(path, max_cache_size=8 * PAGE_SIZE)
+    # a free list spread over several trunk pages
+    ids = [pager.allocate_new_page(PageType.LEAF).page_id for _ in range(2 * TRUNK_CAPACITY + 100)]
+    for page_id in ids[:-1]:
+        pager.free_page(page_id)
+    pager.close()
+
+    metrics = Metrics()
+    pager = Pager(path, metrics=metrics)
+    assert metrics.snapshot()["counters"]["file.read"] == 1
+    assert pager.num_pages == ids[-1] + 1
+
+    # from here on the file size is never asked for
+    monkeypatch.setattr(FileHandler, "file_size", property(lambda self: pytest.fail("file size looked up")))
+    pager.get_page(ids[-1])
+    assert pager.get_page(ids[-1] + 5).page_type == PageType.LEAF
+    # the free list is read the first time it's needed
+    assert len(pager.free_list) == len(ids) - 1
+    assert pager.allocate_new_page(PageType.LEAF).page_id == ids[0]
+    monkeypatch.undo()
+    pager.close()
+
+
+def test_format_1_headers_are_upgraded(tmp_path):
+    path = str(tmp_path / "v1.db")
+    header = Page(page_id=0, page_type=PageType.META)
+    header.add_value(DB_MAGIC + V1_FIELDS.pack(NO_PAGE, 0))
+    data = Page(page_id=1, page_type=PageType.LEAF)
+    data.add_value(b"old row")
+    with open(path, "wb") as file:
+        file.write(bytes(header.to_bytes()) + bytes(data.to_bytes()))
+
+    pager = Pager(path)
+    assert pager.superblock.format_version == 1
+    assert pager.num_pages == 2
+    assert pager.get_page(1).get_value(0) == b"old row"
+    pager.close()
+
+    pager = Pager(path)
+    assert pager.superblock.format_version == FORMAT_VERSION and pager.num_pages == 2
+    pager.close()
+
+
+def test_newer_format_or_other_page_size_is_refused(tmp_path):
+    for fields in (SUPERBLOCK_FIELDS.pack(FORMAT_VERSION + 1, PAGE_SIZE, 1, NO_PAGE, 0, NO_PAGE),
+                   SUPERBLOCK_FIELDS.pack(FORMAT_VERSION, PAGE_SIZE * 2, 1, NO_PAGE, 0, NO_PAGE)):
+        header = Page(page_id=0, page_type=PageType.META)
+        header.add_value(DB_MAGIC + fields)
+        with pytest.raises(ValueError):
+            Superblock.read(header)
+    # not a header page at all: a file from before page 0 was reserved
+    assert Superblock.read(Page(page_id=0, page_type=PageType.LEAF)) is None
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+import pytest
+from constants import PAGE_SIZE
+from file_handler import FileHandler
+from page import PageType
+from pager import Pager, SyncPolicy
+from wal import WriteAheadLog, HEADER_SIZE
+
+
+def test_committed_pages_survive_a_crash(tmp_path):
+    path = str(tmp_path / "crash.db")
+    # WAL mode fsyncs every commit unless told otherwise
+    pager = Pager(path, wal=True)
+    page = pager.allocate_new_page(PageType.LEAF)
+    page.add_value(b"committed")
+    pager.commit()
+    assert pager.wal.syncs == 1
+
+    # nothing went to the main file, the commit only appended to the log
+    assert os.path.getsize(path) == 0
+    assert pager.get_page(page.page_id).get_value(0) == b"committed"
+
+    # "crash": never close the pager, just open the files again
+    recovered = Pager(path, wal=True)
+    # the header page + ours
+    assert recovered.num_pages == 2
+    assert recovered.get_page(page.page_id).get_value(0) == b"committed"
+    # recovery checkpointed the log into the main file
+    assert os.path.getsize(path) == 2 * PAGE_SIZE
+    assert os.path.getsize(path + "-wal") == HEADER_SIZE
+    recovered.close()
+
+    unsynced = Pager(str(tmp_path / "unsynced.db"), wal=True, sync_policy=SyncPolicy.NONE)
+    unsynced.allocate_new_page(PageType.LEAF).add_value(b"maybe")
+    unsynced.commit()
+    assert unsynced.wal.syncs == 0
+    unsynced.close()
+
+
+def test_uncommitted_and_torn_frames_are_dropped(tmp_path):
+    path = str(tmp_path / "torn.db")
+    pager = Pager(path, wal=True)
+    page = pager.allocate_new_page(PageType.LEAF)
+    page.add_value(b"v1")
+    pager.commit()
+
+    page.add_value(b"v2")
+    pager.mark_dirty(page.page_id)
+    # logged but never committed
+    pager.flush_all()
+    with open(path + "-wal", "ab") as f:
+        f.write(b"\x00\x00\x00\x01garbage")
+
+    recovered = Pager(path, wal=True)
+    page = recovered.get_page(page.page_id)
+    assert page.get_value(0) == b"v1"
+    with pytest.raises(IndexError):
+        page.get_value(1)
+    recovered.close()
+
+
+def test_evicted_pages_are_read_back_from_the_log(tmp_path):
+    path = str(tmp_path / "evict.db")
+    pager = Pager(path, max_cache_size=2 * PAGE_SIZE, wal=True)
+    for _ in range(6):
+        page = pager.allocate_new_page(PageType.LEAF)
+        page.add_value(b"page %d" % page.page_id)
+    for page_id in range(1, 7):
+        assert pager.get_page(page_id).get_value(0) == b"page %d" % page_id
+    pager.close()
+
+    pager = Pager(path)
+    assert pager.get_page(6).get_value(0) == b"page 6"
+    pager.close()
+
+
+def test_group_commit_shares_one_sync(tmp_path):
+    db = FileHandler(str(tmp_path / "group.db"))
+    wal = WriteAheadLog(str(tmp_path / "group.db-wal"), db, auto_checkpoint=0)
+
+    # make the sync slow so committers pile up behind the leader
+    sync = wal.file_handler.sync
+    def slow_sync():
+        time.sleep(0.05)
+        sync()
+    wal.file_handler.sync = slow_sync
+
+    def commit(page_id):
+        wal.commit([(page_id, bytes([page_id]) * PAGE_SIZE)])
+
+    threads = [threading.Thread(target=commit, args=(page_id,)) for page_id in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(wal.committed_index) == 16
+    assert wal.syncs < 16
+    assert wal.read_page(7) == bytes([7]) * PAGE_SIZE
+
+    wal.close()
+    assert db.read_bytes(3 * PAGE_SIZE, 4) == b"\x03" * 4
+    db.close()
+
+
+def test_background_checkpoint(tmp_path):
+    path = str(tmp_path / "background.db")
+    pager = Pager(path, wal=True, auto_checkpoint=4)
+    for page_id in range(8):
+        pager.allocate_new_page(PageType.LEAF).add_value(b"page %d" % page_id)
+        pager.commit()
+
+    deadline = time.time() + 5
+    while os.path.getsize(path) < 4 * PAGE_SIZE and time.time() < deadline:
+        time.sleep(0.01)
+    assert os.path.getsize(path) >= 4 * PAGE_SIZE
+    pager.close()
+    assert os.path.getsize(path + "-wal") == HEADER_SIZE